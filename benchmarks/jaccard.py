@@ -0,0 +1,74 @@
+""" Compares the pairwise-loop and sparse jaccard implementations on synthetic catalogs
+
+Run from the repository root:
+    python -m benchmarks.jaccard --sizes 500 10000 50000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import similarity
+from benchmarks.synthetic import preprocessed_catalog
+
+def time_reference(data):
+    """ Times calculate_jaccard without writing its result
+
+    Args:
+        data (pandas.core.frame.DataFrame): Preprocessed catalog
+
+    Returns:
+        (float, numpy.ndarray): Seconds taken and the resulting similarity matrix
+    """
+
+    captured = {}
+    write_data = similarity.write_data
+    similarity.write_data = lambda sim_array, sheet: captured.update(sim=sim_array)
+    try:
+        start = time.perf_counter()
+        similarity.calculate_jaccard(data.copy())
+        elapsed = time.perf_counter() - start
+    finally:
+        similarity.write_data = write_data
+
+    return elapsed, np.asarray(captured['sim'])
+
+def time_sparse(data, block_size):
+    """ Times the sparse implementation over every row, one block of rows at a time so large catalogs fit in memory
+
+    Args:
+        data (pandas.core.frame.DataFrame): Preprocessed catalog
+        block_size (int): Number of rows calculated per sparse product
+
+    Returns:
+        float: Seconds taken
+    """
+
+    start = time.perf_counter()
+    matrix = similarity.build_attribute_matrix(data)
+    for first in range(0, matrix.shape[0], block_size):
+        similarity.jaccard_rows(matrix, slice(first, first + block_size))
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark jaccard similarity implementations')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 10000, 50000], help='catalog sizes to test')
+    parser.add_argument('--reference-max', type=int, default=1000, help='largest catalog the pairwise loop is run on in full, '
+                                                                        'larger sizes are extrapolated quadratically from this size')
+    parser.add_argument('--block-size', type=int, default=2000, help='rows per sparse product')
+    args = parser.parse_args()
+
+    print('{:>8} {:>14} {:>12} {:>10} {:>10}'.format('games', 'loop sec', 'sparse sec', 'speedup', 'max diff'))
+    for n in args.sizes:
+        data = preprocessed_catalog(n)
+
+        m = min(n, args.reference_max)
+        ref_time, ref_sim = time_reference(data.iloc[:m].reset_index(drop=True))
+        matrix = similarity.build_attribute_matrix(data.iloc[:m].reset_index(drop=True))
+        max_diff = np.abs(similarity.jaccard_rows(matrix) - ref_sim).max()
+        ref_time *= (n / m) ** 2
+        estimated = '~' if m < n else ''
+
+        sparse_time = time_sparse(data, args.block_size)
+        print('{:>8} {:>14} {:>12.2f} {:>9.0f}x {:>10.1e}'.format(n, estimated + '%.1f' % ref_time, sparse_time, ref_time / sparse_time, max_diff))
@@ -0,0 +1,82 @@
+""" Measures recommendation latency in-process and through the JSON server with concurrent clients
+
+Queries are answered with the result cache switched off, so they measure title matching and neighbor lookups. The
+in-process queries are then repeated with every result already cached, to show the latency of a cache hit.
+
+Run from the repository root, after similarity.py has written the neighbor indexes:
+    python -m benchmarks.latency
+"""
+
+import argparse
+import http.client
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import server
+from engine import RecommenderEngine, ResultCache
+
+def percentiles(latencies):
+    """ Summarizes latencies as p50 and p99 in microseconds
+    """
+
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2] * 1e6, latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6
+
+def in_process(engine, titles, metric, queries):
+    """ Sends queries straight to the engine, returning each query's latency
+    """
+
+    latencies = []
+    for i in range(queries):
+        title = random.choice(titles)
+        start = time.perf_counter()
+        engine.recommend(title, metric, 3)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def http_client(port, titles, metric, queries):
+    """ Sends queries over one keep-alive connection, returning each request's latency
+    """
+
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        conn.request('GET', '/recommend?' + urlencode({'title': random.choice(titles), 'metric': metric, 'k': 3}))
+        conn.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark recommendation latency')
+    parser.add_argument('--queries', type=int, default=20000, help='in-process queries per metric')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent HTTP clients')
+    parser.add_argument('--http-queries', type=int, default=500, help='queries per HTTP client')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = RecommenderEngine(cache_size=0) # every query is looked up, not answered from the result cache
+    print('engine load: {:.2f}s for {} games'.format(time.perf_counter() - start, len(engine.titles())))
+    titles = engine.titles()
+
+    for metric in ('cosine', 'jaccard'):
+        print('in-process {:<8} p50={:.1f}us p99={:.1f}us'.format(metric, *percentiles(in_process(engine, titles, metric, args.queries))))
+
+    httpd, stats = server.start_server(0, engine=engine)
+    try:
+        for metric in ('cosine', 'jaccard'):
+            with ThreadPoolExecutor(args.clients) as pool:
+                results = pool.map(http_client, [httpd.server_address[1]] * args.clients, [titles] * args.clients,
+                                   [metric] * args.clients, [args.http_queries] * args.clients)
+                latencies = [latency for result in results for latency in result]
+            print('http {} clients {:<8} p50={:.1f}us p99={:.1f}us'.format(args.clients, metric, *percentiles(latencies)))
+    finally:
+        httpd.shutdown()
+
+    engine.cache = ResultCache(max_size=len(titles) * 2)
+    engine.warm(titles)
+    for metric in ('cosine', 'jaccard'):
+        print('cached {:<12} p50={:.1f}us p99={:.1f}us'.format(metric, *percentiles(in_process(engine, titles, metric, args.queries))))
@@ -0,0 +1,82 @@
+""" Measures store page parsing throughput and peak memory of the full-tree and targeted extraction paths
+
+Run from the repository root:
+    python -m benchmarks.parse
+"""
+
+import argparse
+import re
+import time
+import tracemalloc
+
+import extract
+from fixture_server import FIXTURE_FILE, app_page
+
+def page_variants(template):
+    """ Builds synthetic store pages from a saved page, covering the layouts get_game_data has to handle
+
+    Args:
+        template (str): HTML of a saved Steam store page
+
+    Returns:
+        dict: Variant name to page HTML
+    """
+
+    no_reviews = re.sub(r'<span class="responsive_reviewdesc_short">.*?</span>\s*</span>', '', template, flags=re.DOTALL)
+    no_genres = template.replace('id="genresAndManufacturer"', 'id="manufacturer"')
+    few_tags = re.sub(r'(<div class="glance_tags popular_tags"[^>]*>)(.*?)(</div>)',
+                      lambda m: m.group(1) + ''.join(re.findall(r'<a[^>]*>.*?</a>', m.group(2), re.DOTALL)[:3]) + m.group(3),
+                      template, count=1, flags=re.DOTALL)
+    minified = re.sub(r'>\s+<', '><', template) # served pages are not prettified like scrape_test1.txt
+    body_end = template.index('</body>')
+    large = template[:body_end] + template[template.index('<body'):body_end] * 3 + template[body_end:] # page with 4x the markup
+
+    return {
+        'fixture': template,
+        'renamed': app_page(template, '12345'),
+        'no_reviews': no_reviews,
+        'no_genres': no_genres,
+        'few_tags': few_tags,
+        'minified': minified,
+        'large': large,
+    }
+
+def measure(parse, html, repeat):
+    """ Times a parser over one page and records the peak memory it allocates
+
+    Args:
+        parse (Callable[[str], tuple]): Parser to measure
+        html (str): Page HTML
+        repeat (int): Number of times to parse the page
+
+    Returns:
+        (float, float): Pages parsed per second and peak traced memory in MB
+    """
+
+    start = time.perf_counter()
+    for i in range(repeat):
+        parse(html)
+    pages_per_sec = repeat / (time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse(html)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+
+    return pages_per_sec, peak
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark store page parsing')
+    parser.add_argument('--repeat', type=int, default=20, help='parses per page and parser')
+    args = parser.parse_args()
+
+    with open(FIXTURE_FILE, encoding='utf-8') as fd:
+        variants = page_variants(fd.read())
+
+    print('{:<12} {:>12} {:>12} {:>10} {:>10} {:>8} {:>9}'.format('page', 'soup pg/s', 'fast pg/s', 'soup MB', 'fast MB', 'speedup', 'identical'))
+    for name, html in variants.items():
+        identical = extract.parse_soup(html) == extract.parse_fast(html)
+        soup_rate, soup_peak = measure(extract.parse_soup, html, args.repeat)
+        fast_rate, fast_peak = measure(extract.parse_fast, html, args.repeat)
+        print('{:<12} {:>12.1f} {:>12.1f} {:>10.2f} {:>10.2f} {:>7.1f}x {:>9}'.format(name, soup_rate, fast_rate, soup_peak, fast_peak,
+                                                                                    fast_rate / soup_rate, str(identical)))
@@ -0,0 +1,213 @@
+""" Times and memory-profiles every stage of the pipeline on synthetic catalogs, from page parsing to recommendations
+
+Each catalog is written to a fresh binary store in a temporary directory and run through the same functions the
+scripts use. The original row-by-row and dense implementations are quadratic or interpreter-bound, so they are
+only run up to --reference-max and --dense-max games. Results are printed as a table and written as JSON so runs
+can be compared:
+    python -m benchmarks.pipeline --sizes 1000 10000 100000 --json results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import engine
+import extract
+import preprocess
+import similarity
+import storage
+import vocabulary
+from benchmarks.synthetic import raw_catalog
+from fixture_server import FIXTURE_FILE, app_page
+
+def measure(stage, games, function, memory=True):
+    """ Runs one stage, recording its wall time and the peak memory it allocated
+
+    Args:
+        stage (str): Stage name used in the results
+        games (int): Catalog size
+        function (Callable[[], dict]): Stage to run, returning extra numbers to record or None
+        memory (bool): Trace allocations with tracemalloc, which slows down interpreter-bound stages
+
+    Returns:
+        dict: Result record
+    """
+
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    extra = function() or {}
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    if memory:
+        tracemalloc.stop()
+
+    record = {'games': games, 'stage': stage, 'seconds': round(elapsed, 4), 'peak_mb': None if peak is None else round(peak / 2 ** 20, 1)}
+    record.update(extra)
+    return record
+
+def parse_pages(count):
+    """ Parses synthetic store pages the way the scraper does
+
+    Args:
+        count (int): Number of pages
+
+    Returns:
+        dict: Microseconds per page
+    """
+
+    with open(FIXTURE_FILE, encoding='utf-8') as fd:
+        template = fd.read()
+    pages = [app_page(template, str(app_id)) for app_id in range(count)]
+
+    start = time.perf_counter()
+    for page in pages:
+        extract.parse_fast(page)
+    return {'us_per_page': round((time.perf_counter() - start) / count * 1e6, 1)}
+
+def reference_preprocess():
+    """ Runs the original row-by-row discretize and combine_columns, timing each separately
+    """
+
+    start = time.perf_counter()
+    game_dict = preprocess.discretize()
+    middle = time.perf_counter()
+    preprocess.combine_columns(game_dict)
+    return {'discretize_seconds': round(middle - start, 4), 'combine_columns_seconds': round(time.perf_counter() - middle, 4)}
+
+def neighbors(metric, matrix, n, k, block_size):
+    """ Builds and writes one metric's top-k neighbor index
+
+    Args:
+        metric (str): 'cosine' or 'jaccard'
+        matrix (scipy.sparse.csr_matrix): Feature matrix of the metric
+        n (int): Number of games
+        k (int): Number of neighbors kept per game
+        block_size (int): Rows scored at once
+    """
+
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    for start, (block_indices, block_scores) in zip(range(0, n, block_size), similarity.map_blocks({metric: matrix}, metric, n, k, block_size)):
+        indices[start:start + block_size], scores[start:start + block_size] = block_indices, block_scores
+    similarity.write_neighbors(metric, indices, scores)
+
+def query_latency(recommender, titles, metric, queries):
+    """ Measures single-title recommendation latency
+
+    Returns:
+        dict: p50 and p99 latency in microseconds
+    """
+
+    latencies = []
+    for title in random.choices(titles, k=queries):
+        start = time.perf_counter()
+        recommender.recommend(title, metric, 3)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {'queries': queries, 'p50_us': round(latencies[len(latencies) // 2] * 1e6, 1),
+            'p99_us': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6, 1)}
+
+def run_catalog(n, args):
+    """ Runs every stage on a synthetic catalog of n games
+
+    Args:
+        n (int): Number of games
+        args (argparse.Namespace): Command line options
+
+    Returns:
+        list[dict]: Result record of each stage
+    """
+
+    results = []
+    memory = not args.no_memory
+
+    def run(stage, function):
+        results.append(measure(stage, n, function, memory))
+        print('{:>8} {:<22} {:>10.3f}s {:>10} {}'.format(n, stage, results[-1]['seconds'],
+              '' if results[-1]['peak_mb'] is None else '%.1fMB' % results[-1]['peak_mb'],
+              ' '.join('{}={}'.format(key, value) for key, value in results[-1].items() if key not in ('games', 'stage', 'seconds', 'peak_mb'))))
+
+    run('parse', lambda: parse_pages(min(n, args.pages)))
+
+    os.makedirs(storage.DATA_DIR)
+    store = storage.BinaryStore(storage.DATA_DIR) # open_store() finds it, so every stage reads and writes here
+    store.write_table('Raw Data', raw_catalog(n, args.seed).set_index('Title').rename_axis(None))
+
+    if n <= args.reference_max:
+        run('discretize+combine', reference_preprocess)
+    state = {}
+    run('preprocess', lambda: state.update(data=preprocess.preprocess()))
+    preprocess.write_table(state['data'])
+    titles = state['data'].index.tolist()
+
+    run('vocabulary', lambda: state.update(vocab=vocabulary.build_vocabulary(state['data'])))
+    vocab = state['vocab']
+
+    if n <= args.dense_max:
+        preprocessed_data = store.read_table('Preprocessed Data')
+        run('calculate_cosine', lambda: similarity.calculate_cosine(preprocessed_data['CombinedData']))
+        run('calculate_jaccard', lambda: similarity.calculate_jaccard_sparse(preprocessed_data))
+    if n <= args.loop_max:
+        run('calculate_jaccard_loop', lambda: similarity.calculate_jaccard(store.read_table('Preprocessed Data')))
+
+    k = min(args.k, n - 1)
+    run('cosine_neighbors', lambda: neighbors('cosine', vocab.count_matrix(), n, k, args.block_size))
+    run('jaccard_neighbors', lambda: neighbors('jaccard', vocab.attribute_matrix(), n, k, args.block_size))
+    similarity.write_neighbor_games(titles, vocab.digests(), np.zeros(n, dtype=bool))
+
+    run('engine_load', lambda: state.update(engine=engine.RecommenderEngine(store, cache_size=0))) # queries are looked up, not cache hits
+    for metric in ('cosine', 'jaccard'):
+        run('recommend_' + metric, lambda: query_latency(state['engine'], titles, metric, args.queries))
+    batch = random.choices(titles, k=min(n, 1000))
+    run('recommend_batch', lambda: {'titles': len(batch), 'k': 3, 'results': len(state['engine'].recommend_batch(batch, 'cosine', 3))})
+
+    state['engine'].cache = engine.ResultCache(max_size=n)
+    state['engine'].warm(titles, ['cosine'])
+    run('recommend_cached', lambda: query_latency(state['engine'], titles, 'cosine', args.queries)) # every query a cache hit
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic catalogs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='catalog sizes to test')
+    parser.add_argument('--reference-max', type=int, default=10000, help='largest catalog the row-by-row preprocessing is run on')
+    parser.add_argument('--dense-max', type=int, default=10000, help='largest catalog the dense n x n matrices are built for')
+    parser.add_argument('--loop-max', type=int, default=1000, help='largest catalog the pairwise jaccard loop is run on')
+    parser.add_argument('--pages', type=int, default=200, help='store pages parsed per catalog')
+    parser.add_argument('--queries', type=int, default=10000, help='recommendations timed per metric')
+    parser.add_argument('--block-size', type=int, default=1000, help='rows scored at once')
+    parser.add_argument('-k', type=int, default=10, help='neighbors kept per game')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc, whose overhead inflates interpreter-bound timings')
+    parser.add_argument('--json', default=None, help='file to write the results to')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    fixture = os.path.abspath(FIXTURE_FILE)
+    cwd = os.getcwd()
+    results = []
+    print('{:>8} {:<22} {:>11} {:>10}'.format('games', 'stage', 'time', 'peak'))
+    for n in args.sizes:
+        workdir = tempfile.mkdtemp(prefix='pipeline_bench_')
+        try:
+            shutil.copy(fixture, workdir)
+            os.chdir(workdir)
+            results.extend(run_catalog(n, args))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir)
+
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'cores': os.cpu_count(), 'results': results}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fd:
+            json.dump(report, fd, indent=2)
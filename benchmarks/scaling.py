@@ -0,0 +1,59 @@
+""" Measures how top-k neighbor computation scales from 1 to N cores with threads and with processes
+
+Run from the repository root:
+    python -m benchmarks.scaling --games 20000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import time
+
+import similarity
+import vocabulary
+from benchmarks.synthetic import preprocessed_catalog
+
+def time_neighbors(matrices, n, k, block_size, workers, processes):
+    """ Times the top-k pass of both metrics without writing the results
+
+    Args:
+        matrices (dict): Feature matrices from similarity.feature_matrices
+        n (int): Number of games
+        k (int): Number of neighbors kept for each game
+        block_size (int): Rows scored at once
+        workers (int): Number of threads or processes
+        processes (bool): Use a process pool instead of threads
+
+    Returns:
+        (float, int): Seconds taken and a checksum of the neighbor indices, equal for every worker count
+    """
+
+    checksum = 0
+    start = time.perf_counter()
+    for metric in matrices:
+        for indices, scores in similarity.map_blocks(matrices, metric, n, k, block_size, workers, processes):
+            checksum += int(indices.sum())
+    return time.perf_counter() - start, checksum
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark multi-core blockwise similarity')
+    parser.add_argument('--games', type=int, default=20000, help='synthetic catalog size')
+    parser.add_argument('--workers', type=int, nargs='+', default=None, help='worker counts to test, default 1, 2, 4, ... up to the core count')
+    parser.add_argument('--block-size', type=int, default=500, help='rows per block')
+    parser.add_argument('-k', type=int, default=10, help='neighbors kept per game')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({2 ** i for i in range(cores.bit_length())} | {cores})
+    matrices = similarity.feature_matrices(vocabulary.build_vocabulary(preprocessed_catalog(args.games)))
+    print('games={} cores={} block_size={}'.format(args.games, cores, args.block_size))
+
+    print('{:>10} {:>8} {:>10} {:>9}'.format('pool', 'workers', 'seconds', 'speedup'))
+    for processes in (False, True):
+        baseline = None
+        expected = None
+        for workers in worker_counts:
+            elapsed, checksum = time_neighbors(matrices, args.games, args.k, args.block_size, workers, processes)
+            baseline = baseline or elapsed
+            expected = expected or checksum
+            assert checksum == expected, 'results depend on the worker count'
+            print('{:>10} {:>8} {:>10.2f} {:>8.2f}x'.format('processes' if processes else 'threads', workers, elapsed, baseline / elapsed))
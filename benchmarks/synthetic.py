@@ -0,0 +1,82 @@
+""" Synthetic game catalogs with the same columns as the Raw Data and Preprocessed Data tables
+"""
+
+import numpy as np
+import pandas as pd
+
+GENRES = ['Action', 'Adventure', 'RPG', 'Strategy', 'Simulation', 'Indie', 'Casual', 'Sports', 'Racing', 'Massively Multiplayer',
+          'Free to Play', 'Early Access', 'Violent', 'Gore', 'Nudity', 'Sexual Content', 'Education', 'Design & Illustration']
+GENRE_COLUMNS = ['Genre1', 'Genre2', 'Genre3']
+TAG_COLUMNS = ['Tag' + str(i) for i in range(1, 21)]
+
+def sample_attributes(rng, n, num_tags):
+    """ Picks genres and tags for each game, with a few popular tags and a long tail like on Steam
+
+    Args:
+        rng (numpy.random.Generator): Random number generator
+        n (int): Number of games
+        num_tags (int): Number of distinct tags
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): n x 3 genres and n x 20 tags, with None for missing values
+    """
+
+    tag_names = np.array(['Tag %d' % i for i in range(num_tags)], dtype=object)
+    weights = 1.0 / np.arange(1, num_tags + 1) # Zipf-like popularity
+    weights /= weights.sum()
+
+    genres = np.full((n, 3), None, dtype=object)
+    tags = np.full((n, 20), None, dtype=object)
+    genre_counts = rng.integers(1, 4, size=n)
+    tag_counts = rng.integers(5, 21, size=n)
+
+    for i in range(n):
+        genres[i, :genre_counts[i]] = rng.choice(GENRES, size=genre_counts[i], replace=False)
+        tags[i, :tag_counts[i]] = tag_names[rng.choice(num_tags, size=tag_counts[i], replace=False, p=weights)]
+
+    return genres, tags
+
+def raw_catalog(n, seed=0, num_tags=400):
+    """ Generates a table shaped like the Raw Data table written by scrape_steam.py
+
+    Args:
+        n (int): Number of games
+        seed (int): Random seed, the same seed always gives the same catalog
+        num_tags (int): Number of distinct tags
+
+    Returns:
+        pandas.core.frame.DataFrame: Table with a Title column followed by the Raw Data columns
+    """
+
+    rng = np.random.default_rng(seed)
+    genres, tags = sample_attributes(rng, n, num_tags)
+
+    df = pd.DataFrame(np.hstack([genres, tags]), columns=GENRE_COLUMNS + TAG_COLUMNS)
+    df.insert(0, 'Title', ['Game %d' % i for i in range(n)])
+    df['PosPercent'] = [str(p) + '%' for p in rng.integers(20, 101, size=n)]
+    df['TotalReviews'] = ['{:,}'.format(r) for r in rng.lognormal(8, 1.5, size=n).astype(int) + 1]
+    return df
+
+def preprocessed_catalog(n, seed=0, num_tags=400):
+    """ Generates a table shaped like the Preprocessed Data table written by preprocess.py
+
+    Args:
+        n (int): Number of games
+        seed (int): Random seed, the same seed always gives the same catalog
+        num_tags (int): Number of distinct tags
+
+    Returns:
+        pandas.core.frame.DataFrame: Table with a Title column followed by the Preprocessed Data columns
+    """
+
+    rng = np.random.default_rng(seed)
+    genres, tags = sample_attributes(rng, n, num_tags)
+
+    df = pd.DataFrame(np.hstack([genres, tags]), columns=GENRE_COLUMNS + TAG_COLUMNS)
+    df.insert(0, 'Title', ['Game %d' % i for i in range(n)])
+    df['PosPercentDiscrete'] = rng.integers(1, 6, size=n)
+    df['TotalReviewsDiscrete'] = rng.integers(1, 6, size=n)
+
+    combined = df.iloc[:, 1:].astype(str).where(df.iloc[:, 1:].notna(), '')
+    df['CombinedData'] = combined.apply(lambda row: ' '.join(v.replace('-', '').replace(' ', '') for v in row if v).lower(), axis=1)
+    return df
@@ -0,0 +1,247 @@
+import heapq
+import json
+import os
+import time
+
+class Checkpoint:
+    """ Append-only log of a scrape run, one JSON record per line
+
+    Records are written as soon as each search page or game finishes, so a crashed run can resume without
+    keeping scraped games in memory. There are four kinds of records:
+        {"page": 3, "app_ids": [...]}                      search page 3 was fetched
+        {"app_id": "1174180", "key": [3, 0], "data": ...}  a game was scraped, key is its (page, position)
+        {"failed": "1174180", "error": "..."}              a game ran out of retries
+        {"failed_page": 3, "error": "..."}                 search page 3 ran out of retries
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Checkpoint file, created if it does not exist
+        """
+
+        self.path = path
+        self._fd = None
+
+    def records(self):
+        """ Reads every complete record in the checkpoint, skipping a line cut off by a crash
+
+        Yields:
+            dict: Checkpoint records in the order they were written
+        """
+
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, encoding='utf-8') as fd:
+            for line in fd:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError: # partially written final line
+                    continue
+
+    def load_progress(self):
+        """ Finds which search pages and games a previous run already completed
+
+        Returns:
+            (dict, set): Search page number to its app ids, and set of app ids already scraped
+        """
+
+        pages = {}
+        completed = set()
+        for record in self.records():
+            if 'page' in record:
+                pages[record['page']] = record['app_ids']
+            elif 'app_id' in record:
+                completed.add(record['app_id'])
+
+        return pages, completed
+
+    def failed_ids(self):
+        """ Finds games that ran out of retries and were not scraped by a later attempt
+
+        Returns:
+            set: App ids that are missing from the checkpoint
+        """
+
+        failed = set()
+        for record in self.records():
+            if 'failed' in record:
+                failed.add(record['failed'])
+            elif 'app_id' in record:
+                failed.discard(record['app_id'])
+
+        return failed
+
+    def failed_pages(self):
+        """ Finds search pages that ran out of retries and were not fetched by a later attempt
+
+        Returns:
+            set: Page numbers whose games are missing from the checkpoint
+        """
+
+        failed = set()
+        for record in self.records():
+            if 'failed_page' in record:
+                failed.add(record['failed_page'])
+            elif 'page' in record:
+                failed.discard(record['page'])
+
+        return failed
+
+    def _write(self, record):
+        if self._fd is None:
+            torn = False
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, 'rb') as fd:
+                    fd.seek(-1, os.SEEK_END)
+                    torn = fd.read(1) != b'\n' # a crash cut off the last record
+            self._fd = open(self.path, 'a', encoding='utf-8')
+            if torn:
+                self._fd.write('\n')
+        self._fd.write(json.dumps(record) + '\n')
+        self._fd.flush() # a record is durable once the line is written
+
+    def add_page(self, page, app_ids):
+        """ Records that a search page was fetched
+
+        Args:
+            page (int): Search page number
+            app_ids (list[str]): App ids listed on the page
+        """
+
+        self._write({'page': page, 'app_ids': app_ids})
+
+    def add_game(self, app_id, key, data):
+        """ Records a scraped game
+
+        Args:
+            app_id (str): Steam app id
+            key ((int, int)): Search page and position of the game, used to restore search order
+            data ((str, list[str], list[str] str, str)): Output of get_game_data
+        """
+
+        self._write({'app_id': app_id, 'key': list(key), 'data': data})
+
+    def add_failure(self, app_id, error):
+        """ Records a game that could not be scraped, it is tried again when the run is resumed
+
+        Args:
+            app_id (str): Steam app id
+            error (str): Description of the last error
+        """
+
+        self._write({'failed': app_id, 'error': error})
+
+    def add_page_failure(self, page, error):
+        """ Records a search page that could not be fetched, it is fetched again when the run is resumed
+
+        Args:
+            page (int): Search page number
+            error (str): Description of the last error
+        """
+
+        self._write({'failed_page': page, 'error': error})
+
+    def games(self):
+        """ Reads the scraped games back in search order, one at a time
+
+        Only the position of each game's latest record in the file is kept in memory, not its data, so the games
+        can be streamed into the output without holding the whole catalog.
+
+        Yields:
+            (str, (str, list[str], list[str] str, str)): App id and game data, one entry per app id
+        """
+
+        if not os.path.exists(self.path):
+            return
+
+        latest = {} # app id -> (key, file offset of its latest record)
+        with open(self.path, 'rb') as fd:
+            offset = 0
+            for line in fd:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError: # partially written final line
+                    record = {}
+                if 'app_id' in record:
+                    latest[record['app_id']] = (tuple(record['key']), offset)
+                offset += len(line)
+
+            for key, offset in sorted(latest.values()):
+                fd.seek(offset)
+                record = json.loads(fd.readline())
+                yield record['app_id'], record['data']
+
+    def close(self):
+        """ Closes the checkpoint file
+        """
+
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+
+class RetryQueue:
+    """ Bounded queue of failed work items that become ready again after an exponential backoff
+    """
+
+    def __init__(self, maxlen=1000, base_delay=1.0, max_delay=60.0, max_attempts=5):
+        """
+        Args:
+            maxlen (int): Maximum number of items waiting to be retried
+            base_delay (float): Seconds to wait after the first failure, doubled after each further failure
+            max_delay (float): Longest wait between attempts
+            max_attempts (int): Attempts after which an item is given up on
+        """
+
+        self.maxlen = maxlen
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._heap = [] # (ready time, sequence number, item, attempts)
+        self._count = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item, attempts):
+        """ Schedules an item to be tried again
+
+        Args:
+            item (tuple): Work item that failed
+            attempts (int): Number of times the item has been tried so far
+
+        Returns:
+            bool: False if the item has used up its attempts or the queue is full
+        """
+
+        if attempts >= self.max_attempts or len(self._heap) >= self.maxlen:
+            return False
+
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._count, item, attempts))
+        self._count += 1
+        return True
+
+    def pop_ready(self):
+        """ Takes the next item whose backoff has passed
+
+        Returns:
+            (tuple, int): Work item and attempts so far, or None if nothing is ready
+        """
+
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            _, _, item, attempts = heapq.heappop(self._heap)
+            return item, attempts
+        return None
+
+    def next_delay(self):
+        """ Gets the time until the next item is ready
+
+        Returns:
+            float: Seconds to wait, or None if the queue is empty
+        """
+
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
@@ -0,0 +1,626 @@
+import argparse
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import instrument
+from title_index import TitleIndex
+
+# storage, similarity, vocabulary and facets pull in pandas and scikit-learn, which take over a second to import, so
+# they are imported where they are first needed. An engine started from a snapshot answers queries without them.
+
+METRICS = {'cosine': 'Cosine Similarity', 'jaccard': 'Jaccard Similarity'} # metric -> dense matrix it is calculated from
+SNAPSHOT_FILE = 'engine_snapshot.pickle'
+SNAPSHOT_FORMAT = 1 # bumped whenever the engine state changes shape, older snapshots are ignored
+
+class ResultCache:
+    """ Bounded LRU cache of recommendation results, emptied whenever the data version it was filled from changes
+    """
+
+    def __init__(self, max_size=10000, ttl=None):
+        """
+        Args:
+            max_size (int): Number of results kept, the least recently used is evicted first, 0 disables caching
+            ttl (float): Seconds a result is kept, None keeps it until it is evicted or the data changes
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (result, expiry time)
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def get(self, key, version):
+        """ Looks up a result
+
+        Args:
+            key (tuple): Query, e.g. (title, metric, k)
+            version (str): Version of the data the caller is serving, a different one than the cache holds empties it
+
+        Returns:
+            Cached result, or None if there is none
+        """
+
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, version, result):
+        """ Stores a result, unless the data has changed since it was calculated
+
+        Args:
+            key (tuple): Query, e.g. (title, metric, k)
+            version (str): Version of the data the result was calculated from
+            result: Result to store
+        """
+
+        if self.max_size <= 0:
+            return
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if version != self._version: # calculated from data that has since been reloaded
+                return
+            self._entries[key] = (result, expiry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """ Gets the number of hits, misses, evictions, expirations and invalidations so far
+
+        Returns:
+            dict: Counts, the current size and the hit rate
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else None, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'invalidations': self.invalidations}
+
+class RecommenderEngine:
+    """ Keeps game titles, lookups and neighbor indexes in memory so each recommendation is a single row lookup
+    """
+
+    def __init__(self, store=None, k=10, cache_size=10000, cache_ttl=None, snapshot=None):
+        """
+        Args:
+            store (storage.BinaryStore): Store to load from, defaults to storage.open_store()
+            k (int): Neighbors kept per game when the index has to be built from dense similarity matrices
+            cache_size (int): Number of recommendation results cached, 0 disables the cache
+            cache_ttl (float): Seconds a cached result is kept, None keeps it until the data changes
+            snapshot (str): Snapshot file to start from instead of the store, see write_snapshot, the store is used if
+                it is missing. Call refresh() to check it is still current.
+        """
+
+        self._store = store
+        self.k = k
+        self._lock = threading.Lock()
+        self.cache = ResultCache(cache_size, cache_ttl)
+        if snapshot is None or not self.load_snapshot(snapshot):
+            self.load()
+
+    @property
+    def store(self):
+        """ Artifact store the engine loads from, opened on first use
+        """
+
+        if self._store is None:
+            import storage
+            self._store = storage.open_store()
+        return self._store
+
+    @instrument.timed('engine.load')
+    def load(self):
+        """ Loads (or reloads) every artifact the engine serves from, replacing the current data in one step
+        """
+
+        import similarity
+        import storage
+
+        data_titles = self.store.read_table('Preprocessed Data', columns=['Title'])['Title'].tolist()
+        try:
+            games = self.store.read_table(storage.NEIGHBOR_GAMES) # rows of the neighbor indexes, None for removed games
+            titles = [None if removed else title for title, removed in zip(games['Title'].tolist(), games['Removed'].tolist())]
+        except KeyError: # neighbor indexes written before their rows were tracked follow the Preprocessed Data rows
+            titles = data_titles
+        data_rows = {title: i for i, title in enumerate(data_titles)}
+
+        neighbors = {}
+        for metric, sheet in METRICS.items():
+            index_name, score_name = storage.NEIGHBORS[metric]
+            try:
+                neighbors[metric] = (np.asarray(self.store.read_array(index_name)), np.asarray(self.store.read_array(score_name)))
+            except KeyError: # data written before the top-k index existed, build it once from the dense matrix
+                sim = self.store.read_matrix(sheet)
+                neighbors[metric] = similarity.build_top_k(lambda rows: sim[rows], len(titles), self.k)
+
+        # row index 0 corresponds to 1st game, 1 for 2nd game, etc.
+        self.state = {
+            'game_lookup': titles,
+            'index_lookup': {title: i for i, title in enumerate(titles) if title is not None},
+            'data_rows': np.array([data_rows.get(title, -1) for title in titles]), # Preprocessed Data row of each game, -1 if removed
+            'title_index': TitleIndex(titles), # normalized and fuzzy matching for titles not found exactly
+            'neighbors': neighbors,
+            'features': {}, # metric -> game x attribute matrix, only loaded when more neighbors are asked for than are stored
+            'facets': None, # genre, tag and rating bitsets, only loaded when a filter is used
+            'version': self.store.version(),
+        } # swapped as a whole, so concurrent queries never see a half-loaded engine, cached results of the old data are dropped on the next lookup
+
+    def refresh(self):
+        """ Reloads the engine if the stored data has been rewritten since it was loaded
+
+        Returns:
+            bool: True if the data was reloaded
+        """
+
+        if self.store.version() == self.state['version']:
+            return False
+        self.load()
+        return True
+
+    def write_snapshot(self, path=SNAPSHOT_FILE):
+        """ Saves the titles, lookups and neighbor indexes in one file, so a front-end can start without reading the store
+
+        Args:
+            path (str): Snapshot file
+        """
+
+        state = {key: value for key, value in self.state.items() if key not in ('features', 'facets')} # loaded on demand
+        state['neighbors'] = {metric: (np.array(indices), np.array(scores)) for metric, (indices, scores) in state['neighbors'].items()} # not memory-mapped
+        with open(path + '.tmp', 'wb') as fd:
+            pickle.dump({'format': SNAPSHOT_FORMAT, 'state': state}, fd, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path) # readers never see a half-written snapshot
+
+    @instrument.timed('engine.load_snapshot')
+    def load_snapshot(self, path=SNAPSHOT_FILE):
+        """ Loads the engine from a snapshot written by write_snapshot
+
+        Args:
+            path (str): Snapshot file
+
+        Returns:
+            bool: True if it was loaded, False if it is missing or from an older version of the engine
+        """
+
+        try:
+            with open(path, 'rb') as fd:
+                snapshot = pickle.load(fd)
+        except Exception: # missing, truncated, or pickled by code that has since changed, e.g. ImportError or AttributeError
+            return False
+        if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT or not isinstance(snapshot.get('state'), dict):
+            return False
+
+        self.state = dict(snapshot['state'], features={}, facets=None)
+        return True
+
+    def titles(self):
+        """ Gets the title of every game, in row order, leaving out removed games
+
+        Returns:
+            list[str]: Game titles
+        """
+
+        return [title for title in self.state['game_lookup'] if title is not None]
+
+    def num_games(self):
+        """ Counts the games that can be recommended, leaving out removed games
+        """
+
+        return len(self.state['index_lookup'])
+
+    def find_row(self, title):
+        """ Finds a game's row, matching the stored title exactly or else by normalized and fuzzy title matching
+
+        Args:
+            title (str): Title typed by the user
+
+        Returns:
+            int: Row index of the game, or None if no title is close enough
+        """
+
+        state = self.state
+        index = state['index_lookup'].get(title)
+        if index is None:
+            index = state['title_index'].resolve(title)
+        return index
+
+    def resolve(self, title):
+        """ Finds the stored title a user most likely meant
+
+        Args:
+            title (str): Title typed by the user
+
+        Returns:
+            str: Stored title, or None if no title is close enough
+        """
+
+        index = self.find_row(title)
+        return None if index is None else self.state['game_lookup'][index]
+
+    def suggest(self, query, limit=10):
+        """ Gets type-ahead title suggestions for partial user input
+
+        Args:
+            query (str): Partial title
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            list[str]: Suggested titles, prefix matches first
+        """
+
+        return self.state['title_index'].suggest(query, limit)
+
+    def recommend(self, title, metric='cosine', k=3, where=None):
+        """ Finds the games most similar to a game
+
+        Args:
+            title (str): Title of the game, typos, case and ™ / ® differences are tolerated
+            metric (str): 'cosine' or 'jaccard'
+            k (int): Number of games to return, games beyond the stored neighbors are scored from the attribute matrix
+            where (str): Filter the games must match, e.g. 'RPG, rating>=4', see facets.FacetIndex.mask
+
+        Raises:
+            KeyError: If the title is not in the data
+            ValueError: If k is below 1 or the filter can't be evaluated
+
+        Returns:
+            list[(str, float)]: Titles and similarity scores of the most similar games, best first
+        """
+
+        state = self.state
+        key = (title, metric, k, where)
+        games = self.cache.get(key, state['version']) # repeated queries skip title matching and scoring
+        if games is not None:
+            return list(games)
+        if k < 1:
+            raise ValueError('k must be at least 1')
+
+        index = self.find_row(title) # row corresponding to the input game title
+        if index is None:
+            raise KeyError(title)
+        indices, scores = state['neighbors'][metric]
+        if where is not None:
+            games = self.recommend_filtered(index, metric, k, where)
+        elif k <= indices.shape[1]:
+            games = [(state['game_lookup'][i], float(score)) for i, score in zip(indices[index][:k].tolist(), scores[index][:k].tolist())
+                     if i >= 0 and state['game_lookup'][i] is not None] # lists are padded with -1 or removed games when there are fewer games than k
+        else:
+            games = self.recommend_batch([state['game_lookup'][index]], metric, k)[0]
+
+        self.cache.put(key, state['version'], tuple(games))
+        return games
+
+    def facet_index(self):
+        """ Gets the genre, tag and rating bitsets of every game, loading them on first use
+
+        Returns:
+            facets.FacetIndex: Bitsets in neighbor index row order, removed games match no facet
+        """
+
+        import facets
+        import vocabulary
+
+        state = self.state
+        with self._lock:
+            if state['facets'] is None:
+                state['facets'] = facets.load_facets(vocabulary.load_vocabulary(self.store), self.store).take(state['data_rows'])
+        return state['facets']
+
+    def allowed(self, where=None):
+        """ Flags the games a filter lets through
+
+        Args:
+            where (str): Filter expression, None lets every game through
+
+        Returns:
+            numpy.ndarray: True for each row whose game matches, never for removed games
+        """
+
+        allowed = self.state['data_rows'] >= 0
+        if where is not None:
+            allowed &= self.facet_index().matching(where)
+        return allowed
+
+    def recommend_filtered(self, index, metric, k, where):
+        """ Finds the games most similar to a game among the games matching a filter
+
+        The filter is applied before top-k selection. When k of the stored neighbors match, they are the answer.
+        Otherwise only the matching games are scored, so a selective filter makes the query cheaper, not slower.
+
+        Args:
+            index (int): Row of the game
+            metric (str): 'cosine' or 'jaccard'
+            k (int): Number of games to return
+            where (str): Filter expression, see facets.FacetIndex.mask
+
+        Returns:
+            list[(str, float)]: Titles and similarity scores of up to k matching games, best first
+        """
+
+        import similarity
+
+        state = self.state
+        allowed = self.allowed(where)
+        allowed[index] = False
+
+        indices, scores = state['neighbors'][metric]
+        stored = indices[index]
+        matches = np.nonzero((stored >= 0) & allowed[np.maximum(stored, 0)])[0]
+        if len(matches) >= k: # the stored neighbors are the best games overall, so also the best matching ones
+            rows, top_scores = stored[matches[:k]], scores[index][matches[:k]]
+        else:
+            columns = np.nonzero(allowed)[0]
+            rows, top_scores = similarity.select_top_k_columns(similarity.score_columns(self.features(metric), index, columns, metric), columns, k)
+        return [(state['game_lookup'][i], float(score)) for i, score in zip(rows.tolist(), top_scores.tolist())]
+
+    def recommend_profile(self, liked, disliked=(), metric='cosine', k=3, dislike_weight=1.0, where=None):
+        """ Finds the games most similar to a set of liked games and least similar to a set of disliked ones
+
+        The inputs are folded into profile vectors, so a profile costs a single sparse product however many titles it
+        has. For cosine each game is scored by its mean similarity to the liked games, minus dislike_weight times its
+        mean similarity to the disliked games, which is one product with their weighted sum of attribute vectors.
+        Jaccard is not linear, so the liked games and the disliked games are each averaged into a vector of the share
+        of them that have each attribute, and each game is scored by its weighted jaccard similarity to the liked
+        vector, minus dislike_weight times its weighted jaccard similarity to the disliked vector. For a single liked
+        game that is its plain jaccard similarity.
+
+        Args:
+            liked (list[str]): Titles of games the user liked
+            disliked (list[str]): Titles of games the user disliked
+            metric (str): 'cosine' or 'jaccard'
+            k (int): Number of games to return
+            dislike_weight (float): How much the disliked games count against the liked ones
+            where (str): Filter the games must match, only matching games are scored, see facets.FacetIndex.mask
+
+        Raises:
+            KeyError: If one of the titles is not in the data
+            ValueError: If no liked titles are given, the titles are not lists of strings, dislike_weight is not finite,
+                k is below 1 or the filter can't be evaluated
+
+        Returns:
+            list[(str, float)]: Titles and profile scores of the best matching games, best first, never one of the inputs,
+                empty if the liked and disliked games cancel each other out
+        """
+
+        import similarity
+
+        if isinstance(liked, str) or isinstance(disliked, str): # would be split into one title per character
+            raise ValueError('liked and disliked must be lists of titles')
+        if not liked:
+            raise ValueError('a profile needs at least one liked title')
+        if not all(isinstance(title, str) for title in list(liked) + list(disliked)):
+            raise ValueError('titles must be strings')
+        if not np.isfinite(dislike_weight):
+            raise ValueError('dislike_weight must be a finite number')
+        if k < 1:
+            raise ValueError('k must be at least 1')
+
+        state = self.state
+        key = ('profile', tuple(liked), tuple(disliked), metric, k, dislike_weight, where)
+        games = self.cache.get(key, state['version'])
+        if games is not None:
+            return list(games)
+
+        weights = np.zeros(len(state['game_lookup']))
+        inputs = []
+        for titles, weight in ((liked, 1.0), (disliked, -dislike_weight)):
+            for title in titles:
+                row = self.find_row(title)
+                if row is None:
+                    raise KeyError(title)
+                weights[row] += weight / len(titles) # a game both liked and disliked cancels out
+                inputs.append(row)
+
+        rows = np.nonzero(weights)[0]
+        if len(rows) == 0: # nothing left to score against
+            return []
+
+        allowed = self.allowed(where)
+        allowed[inputs] = False # the games the profile was made from are never recommended
+        columns = np.nonzero(allowed)[0]
+
+        matrix = self.features(metric)
+        if metric == 'cosine':
+            scores = matrix[columns] @ (matrix[rows].T @ weights[rows]) # mean of the cosine rows, as one query vector
+        else:
+            sides = np.stack([np.maximum(weights[rows], 0), np.maximum(-weights[rows], 0)], axis=1) # liked, disliked
+            totals = sides.sum(axis=0)
+            profiles = matrix[rows].T @ np.divide(sides, totals, out=np.zeros_like(sides), where=totals > 0) # attribute shares, at most 1
+            compared = matrix[columns]
+            shared = compared @ profiles # sum over attributes of min(share, has attribute)
+            union = np.asarray(compared.sum(axis=1)) + profiles.sum(axis=0) - shared # sum over attributes of max(share, has attribute)
+            scores = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0) @ (totals * [1, -1])
+
+        indices, top_scores = similarity.select_top_k_columns(scores, columns, k)
+        games = [(state['game_lookup'][i], score) for i, score in zip(indices.tolist(), top_scores.tolist())]
+        self.cache.put(key, state['version'], tuple(games))
+        return games
+
+    def warm(self, titles, metrics=METRICS, k=3):
+        """ Fills the result cache ahead of time, e.g. with the most queried titles at startup
+
+        Args:
+            titles (list[str]): Titles to look up, titles that are not in the data are skipped
+            metrics (Iterable[str]): Metrics to look up each title with
+            k (int): Number of games the front-end asks for
+
+        Returns:
+            int: Number of results cached
+        """
+
+        cached = 0
+        for title in titles:
+            for metric in metrics:
+                try:
+                    self.recommend(title, metric, k)
+                    cached += 1
+                except KeyError:
+                    break
+        return cached
+
+    @instrument.timed('engine.features')
+    def features(self, metric):
+        """ Gets the game x attribute matrix a metric is calculated from, loading it on first use
+
+        Args:
+            metric (str): 'cosine' or 'jaccard'
+
+        Returns:
+            scipy.sparse.csr_matrix: Normalized count matrix for cosine, binary attribute matrix for jaccard
+        """
+
+        import vocabulary
+
+        state = self.state
+        with self._lock:
+            if metric not in state['features']:
+                vocab = vocabulary.load_vocabulary(self.store).take(state['data_rows']) # in neighbor index row order
+                state['features'][metric] = vocab.count_matrix() if metric == 'cosine' else vocab.attribute_matrix()
+        return state['features'][metric]
+
+    def score_rows(self, metric, rows):
+        """ Calculates the similarity between selected games and every game
+
+        Args:
+            metric (str): 'cosine' or 'jaccard'
+            rows (numpy.ndarray): Row indices of the games
+
+        Returns:
+            numpy.ndarray: One row of scores per selected game
+        """
+
+        import similarity
+
+        if metric == 'cosine':
+            scores = similarity.cosine_rows(self.features(metric), rows)
+        else:
+            scores = similarity.jaccard_rows(self.features(metric), rows)
+        scores[:, self.state['data_rows'] < 0] = -np.inf # removed games are never recommended
+        return scores
+
+    @instrument.timed('engine.recommend_batch')
+    def recommend_batch(self, titles, metric='cosine', k=3, block_size=1000):
+        """ Finds the games most similar to each of many games at once
+
+        When k is no more than the number of stored neighbors, the results are gathered from the neighbor index in
+        one step. Otherwise similarity rows are scored block by block and the top k of each row are picked with a
+        partial selection, which never sorts a whole row.
+
+        Args:
+            titles (list[str]): Titles of the games
+            metric (str): 'cosine' or 'jaccard'
+            k (int): Number of games to return for each title
+            block_size (int): Number of rows scored at once when k is larger than the neighbor index
+
+        Raises:
+            ValueError: If k is below 1
+
+        Returns:
+            list[list[(str, float)]]: Titles and scores of the most similar games for each title, best first,
+                or None for titles that are not in the data
+        """
+
+        if k < 1:
+            raise ValueError('k must be at least 1')
+
+        state = self.state
+        rows = [self.find_row(title) for title in titles]
+        known = np.array([row for row in rows if row is not None], dtype=np.int64)
+        indices, scores = state['neighbors'][metric]
+
+        if k <= indices.shape[1]:
+            top_indices, top_scores = indices[known, :k], scores[known, :k]
+        else:
+            import similarity
+
+            k = max(min(k, self.num_games() - 1), 0) # every other game, removed games are never recommended
+            top_indices = np.empty((len(known), k), dtype=np.int32)
+            top_scores = np.empty((len(known), k), dtype=np.float32)
+            for start in range(0, len(known) if k else 0, block_size):
+                block = known[start:start + block_size]
+                top_indices[start:start + block_size], top_scores[start:start + block_size] = similarity.select_top_k(self.score_rows(metric, block), block, k)
+
+        game_lookup = state['game_lookup']
+        results = iter(zip(top_indices.tolist(), top_scores.tolist()))
+        batch = []
+        for row in rows:
+            if row is None:
+                batch.append(None)
+            else:
+                neighbor_rows, neighbor_scores = next(results)
+                batch.append([(game_lookup[i], score) for i, score in zip(neighbor_rows, neighbor_scores)
+                              if i >= 0 and game_lookup[i] is not None]) # stored lists are padded with -1 or removed games when there are fewer games than k
+        return batch
+
+def precompute_rails(engine, metric='cosine', k=10, batch_size=10000):
+    """ Finds the k most similar games for every game in the catalog, e.g. for nightly "similar games" rails
+
+    Args:
+        engine (RecommenderEngine): Loaded engine
+        metric (str): 'cosine' or 'jaccard'
+        k (int): Number of games in each rail
+        batch_size (int): Number of games looked up per batch call
+
+    Yields:
+        (str, list[(str, float)]): Each game's title and its rail, best first
+    """
+
+    titles = engine.titles()
+    for start in range(0, len(titles), batch_size):
+        batch = titles[start:start + batch_size]
+        yield from zip(batch, engine.recommend_batch(batch, metric, k))
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """ Gets the engine shared by every front-end in this process, loading it on first use
+
+    Returns:
+        RecommenderEngine: Shared engine
+    """
+
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RecommenderEngine()
+    return _engine
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write "similar games" rails for the whole catalog as JSON lines')
+    parser.add_argument('--metric', choices=list(METRICS), default='cosine')
+    parser.add_argument('-k', type=int, default=10, help='games in each rail')
+    args = parser.parse_args()
+
+    for title, rail in precompute_rails(get_engine(), args.metric, args.k):
+        sys.stdout.write(json.dumps({'title': title, 'rail': [{'title': game, 'score': score} for game, score in rail]}) + '\n')
@@ -0,0 +1,166 @@
+import re
+
+from bs4 import BeautifulSoup
+
+PARSER_VERSION = 1 # bump whenever parse_fast or parse_soup return different data, so pages cached by scrape_steam are parsed again
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+# start tags of the only elements get_game_data reads, in the form Steam serves them
+TITLE_START = re.compile(r'<([a-zA-Z][\w-]*)[^>]*?\sitemprop\s*=\s*["\']?name["\'\s/>]')
+GENRES_START = re.compile(r'<([a-zA-Z][\w-]*)[^>]*?\sid\s*=\s*["\']?genresAndManufacturer["\'\s/>]')
+TAGS_START = re.compile(r'<(div)[^>]*?\sclass\s*=\s*["\']glance_tags popular_tags["\']')
+REVIEW_START = re.compile(r'<(span)[^>]*?\sclass\s*=\s*["\']responsive_reviewdesc_short["\']')
+
+class FragmentError(Exception):
+    """ Raised when an element's end tag cannot be found, so the page has to be parsed in full
+    """
+
+def element_html(html, start_pattern):
+    """ Cuts the first element matching start_pattern out of a page, including everything nested inside it
+
+    Args:
+        html (str): HTML of a whole page
+        start_pattern (re.Pattern): Pattern matching the element's start tag, group 1 is the tag name
+
+    Raises:
+        FragmentError: If the element is not closed
+
+    Returns:
+        str: HTML of the element, or None if the page does not contain it
+    """
+
+    match = start_pattern.search(html)
+    if match is None:
+        return None
+
+    name = match.group(1).lower()
+    start = match.start()
+    open_end = html.find('>', match.end() - 1)
+    if name in VOID_TAGS or html[open_end - 1] == '/': # element has no contents
+        return html[start:open_end + 1]
+
+    depth = 0
+    for tag in re.compile(r'<(/?)' + re.escape(name) + r'\b[^>]*>', re.IGNORECASE).finditer(html, start):
+        if tag.group(1): # end tag
+            depth -= 1
+            if depth == 0:
+                return html[start:tag.end()]
+        elif not tag.group(0).endswith('/>'):
+            depth += 1
+
+    raise FragmentError(name)
+
+def parse_element(html, start_pattern, name, attrs):
+    """ Parses a single element of a page
+
+    Args:
+        html (str): HTML of a whole page
+        start_pattern (re.Pattern): Pattern matching the element's start tag
+        name (str): Tag name given to BeautifulSoup.find on a full parse, None for any tag
+        attrs (dict): Attributes given to BeautifulSoup.find on a full parse
+
+    Returns:
+        bs4.element.Tag: Parsed element, or None if the page does not contain it
+    """
+
+    fragment = element_html(html, start_pattern)
+    if fragment is None:
+        return None
+    return BeautifulSoup(fragment, 'html.parser').find(name, attrs)
+
+def game_data_from_nodes(title, genres_block, tags, review_desc):
+    """ Reads game attributes out of the parsed elements of a store page
+
+    Args:
+        title (bs4.element.Tag): Element with itemprop="name"
+        genres_block (bs4.element.Tag): Element with id="genresAndManufacturer"
+        tags (bs4.element.Tag): div with the popular tags
+        review_desc (bs4.element.Tag): span with the all time review summary
+
+    Returns:
+        (str, list[str], list[str] str, str): Tuple of attributes for a single video game
+    """
+
+    # get game title
+    if title == None: # if title not found, set to empty string
+        title = ''
+    else: # else get title text
+        title = title.get_text()
+
+    # get genres
+    genre_list = ['' for i in range(3)]
+    i = 0
+
+    if genres_block != None: # error checking if any NoneTypes are returned
+        if genres_block.find("span") != None:
+            genres = genres_block.find("span").find_all("a")
+
+            for genre in genres:
+                if i == 3: # allowing three genres at most
+                    break
+                genre_list[i] = genre.get_text()
+                i += 1
+
+    # get user-defined tags (20 per game, ignore the 1st '' tag and the 21st '+' tag)
+    tag_list = ['' for i in range(20)]
+    i = 0
+
+    if tags != None:
+        for tag in tags:
+            if i == 20: # only 20 tags maximum
+                break
+            tag_ = tag.get_text().strip()
+            if tag_ != '+' and tag_ != '':
+                tag_list[i] = tag_
+                i += 1
+
+    # get percentage of positive reviews and total user reviews
+    if review_desc == None: # no review description, set to empty string
+        pos_pct = ''
+        tot_rev = ''
+    else:
+        review_desc = review_desc.get_text().strip()
+        pos_idx = review_desc.index('%')
+        rev_idx_start = review_desc.index('of ') + 3
+        rev_idx_end = review_desc.index(')')
+
+        pos_pct = review_desc[1:pos_idx+1] # extract percentage of positive reviews
+        tot_rev = review_desc[rev_idx_start:rev_idx_end] # extract total user reviews
+
+    return title, genre_list, tag_list, pos_pct, tot_rev
+
+def parse_soup(html):
+    """ Extracts game attributes by building a tree of the whole page
+
+    Args:
+        html (str): HTML of a Steam store page for a single video game
+
+    Returns:
+        (str, list[str], list[str] str, str): Tuple of attributes for a single video game
+    """
+
+    soup = BeautifulSoup(html, 'html.parser')
+    return game_data_from_nodes(soup.find(itemprop="name"), soup.find(id="genresAndManufacturer"),
+                                soup.find("div", {"class":"glance_tags popular_tags"}), soup.find("span", {"class":"responsive_reviewdesc_short"}))
+
+def parse_fast(html):
+    """ Extracts game attributes by parsing only the title, genres, tags and review elements of the page
+
+    The elements are located with a text scan and each one is parsed on its own, which skips building a tree
+    for the thousands of other lines on a store page. Falls back to parse_soup if an element is not closed.
+
+    Args:
+        html (str): HTML of a Steam store page for a single video game
+
+    Returns:
+        (str, list[str], list[str] str, str): Tuple of attributes for a single video game, identical to parse_soup
+    """
+
+    try:
+        return game_data_from_nodes(parse_element(html, TITLE_START, None, {'itemprop': 'name'}),
+                                    parse_element(html, GENRES_START, None, {'id': 'genresAndManufacturer'}),
+                                    parse_element(html, TAGS_START, "div", {"class":"glance_tags popular_tags"}),
+                                    parse_element(html, REVIEW_START, "span", {"class":"responsive_reviewdesc_short"}))
+    except FragmentError:
+        return parse_soup(html)
@@ -0,0 +1,232 @@
+import argparse
+import operator
+import re
+
+import numpy as np
+
+import storage
+import vocabulary
+
+RATING_ALIASES = {'rating': 'PosPercentDiscrete', 'reviews': 'TotalReviewsDiscrete'} # short names usable in filters
+RATINGS = range(1, 6)
+COMPARISONS = {'>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt, '=': operator.eq}
+TERM = re.compile(r'^(\w+)\s*(>=|<=|>|<|=)\s*(\d+)$') # e.g. rating>=4
+
+class FacetIndex:
+    """ Inverted index from every genre, tag and rating bucket to a bitset of the games that have it
+
+    Row i of the bitsets belongs to attribute i of the vocabulary the index was built from, with one bit per game
+    packed eight to a byte. Filters are evaluated with bitwise AND/OR/NOT over whole rows, so even a filter on
+    several common tags touches only a few bytes per game.
+    """
+
+    def __init__(self, keys, bits, num_games):
+        """
+        Args:
+            keys (list[str]): Facet of each bitset row, a genre or tag like 'RPG' or a rating like 'PosPercentDiscrete=5'
+            bits (numpy.ndarray): Packed bitsets, one row per facet and one bit per game
+            num_games (int): Number of games, the bitsets are padded to a whole byte
+        """
+
+        self.keys = list(keys)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.num_games = num_games
+        self._rows = {key.lower(): row for row, key in enumerate(self.keys)} # facets are matched without case
+        self._all = np.packbits(np.ones(num_games, dtype=bool))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def facet(self, key):
+        """ Gets the bitset of one facet
+
+        Args:
+            key (str): Genre or tag, e.g. 'RPG', or a rating bucket, e.g. 'PosPercentDiscrete=5'
+
+        Returns:
+            numpy.ndarray: Packed bitset of the games that have the facet, empty if no game has it
+        """
+
+        row = self._rows.get(key.lower())
+        if row is None:
+            return np.zeros(self.bits.shape[1], dtype=np.uint8)
+        return self.bits[row]
+
+    def term(self, text):
+        """ Evaluates one filter term: a genre or tag, a rating comparison like 'rating>=4', optionally negated with '!'
+
+        Args:
+            text (str): Filter term
+
+        Raises:
+            ValueError: If the term names a genre or tag no game has, which is most likely a typo
+
+        Returns:
+            numpy.ndarray: Packed bitset of the matching games
+        """
+
+        text = text.strip()
+        if text.startswith('!'):
+            return ~self.term(text[1:]) & self._all
+
+        match = TERM.match(text)
+        if match is None:
+            if text.lower() not in self._rows:
+                raise ValueError('unknown genre or tag: ' + text)
+            return self.facet(text)
+
+        column, op, value = match.groups()
+        column = RATING_ALIASES.get(column.lower(), column)
+        if column not in vocabulary.RATING_COLUMNS:
+            raise ValueError('unknown rating: ' + column + ', use ' + ', '.join(list(RATING_ALIASES) + vocabulary.RATING_COLUMNS))
+
+        result = np.zeros(self.bits.shape[1], dtype=np.uint8)
+        for rating in RATINGS: # a comparison is the OR of the 1-5 buckets it covers
+            if COMPARISONS[op](rating, int(value)):
+                result |= self.facet(column + '=' + str(rating))
+        return result
+
+    def all_games(self):
+        """ Gets a bitset with every game's bit set, and none of the padding bits
+        """
+
+        return self._all.copy()
+
+    def mask(self, expression):
+        """ Evaluates a filter expression, e.g. 'RPG|Action RPG, rating>=4, reviews>=4, !Horror'
+
+        Terms separated by ',' must all match, and terms separated by '|' within them are alternatives.
+
+        Args:
+            expression (str): Filter expression
+
+        Raises:
+            ValueError: If a term can't be evaluated
+
+        Returns:
+            numpy.ndarray: Packed bitset of the matching games
+        """
+
+        result = self.all_games()
+        for clause in expression.split(','):
+            if not clause.strip():
+                continue
+            alternatives = np.zeros(self.bits.shape[1], dtype=np.uint8)
+            for text in clause.split('|'):
+                alternatives |= self.term(text)
+            result &= alternatives
+        return result
+
+    def matching(self, expression):
+        """ Evaluates a filter expression into one flag per game
+
+        Args:
+            expression (str): Filter expression, see mask
+
+        Returns:
+            numpy.ndarray: True for each game that matches
+        """
+
+        return np.unpackbits(self.mask(expression), count=self.num_games).astype(bool)
+
+    def count(self, expression):
+        """ Counts the games matching a filter expression
+        """
+
+        return int(np.unpackbits(self.mask(expression)).sum())
+
+    def take(self, rows):
+        """ Picks games by row, e.g. to put them in the order of a neighbor index
+
+        Args:
+            rows (numpy.ndarray): Row of each game to keep, -1 gives a game without facets
+
+        Returns:
+            FacetIndex: Index with the same facets and one game per entry of rows
+        """
+
+        rows = np.asarray(rows, dtype=np.int64)
+        games = np.unpackbits(self.bits, axis=1, count=self.num_games)[:, np.maximum(rows, 0)]
+        games[:, rows < 0] = 0
+        return FacetIndex(self.keys, np.packbits(games, axis=1), len(rows))
+
+    def write(self, store=None):
+        """ Writes the bitsets to the artifact store, their facets are the rows of the stored vocabulary
+
+        Args:
+            store (storage.BinaryStore): Store to write to, defaults to storage.open_store()
+        """
+
+        (store or storage.open_store()).write_array(storage.FACETS, self.bits)
+
+def facet_keys(vocab):
+    """ Names every attribute of a vocabulary the way filters refer to it
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Attribute vocabulary
+
+    Returns:
+        list[str]: 'RPG' for genres and tags, 'PosPercentDiscrete=5' for ratings
+    """
+
+    return [text if kind == 'Attribute' else kind + '=' + text for kind, text in zip(vocab.kinds, vocab.texts)]
+
+def build_facets(vocab):
+    """ Builds the bitset of every attribute straight from the games' attribute ids
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Attribute ids of each game
+
+    Returns:
+        FacetIndex: Index with one bitset row per attribute of the vocabulary
+    """
+
+    games = np.repeat(np.arange(vocab.num_games), np.diff(vocab.indptr)) # game of each id
+    bits = np.zeros((len(vocab), (vocab.num_games + 7) // 8), dtype=np.uint8)
+    np.bitwise_or.at(bits, (vocab.ids, games >> 3), (128 >> (games & 7)).astype(np.uint8)) # packbits order, first game is the high bit
+    return FacetIndex(facet_keys(vocab), bits, vocab.num_games)
+
+def read_facets(vocab, store=None):
+    """ Reads the bitsets written by preprocess.py
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Stored vocabulary, whose attributes the bitset rows belong to
+        store (storage.BinaryStore): Store to read from, defaults to storage.open_store()
+
+    Raises:
+        KeyError: If the bitsets have not been written
+
+    Returns:
+        FacetIndex: Index of the stored games
+    """
+
+    bits = np.asarray((store or storage.open_store()).read_array(storage.FACETS, mmap=False), dtype=np.uint8)
+    return FacetIndex(facet_keys(vocab), bits.reshape(len(vocab), -1), vocab.num_games)
+
+def load_facets(vocab, store=None):
+    """ Reads the stored bitsets, or builds them from the vocabulary if they were written before facets existed
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Stored vocabulary
+        store (storage.BinaryStore): Store to read from, defaults to storage.open_store()
+
+    Returns:
+        FacetIndex: Index of the stored games
+    """
+
+    try:
+        index = read_facets(vocab, store)
+    except (KeyError, ValueError): # ValueError if the vocabulary was rewritten with a different number of attributes
+        return build_facets(vocab)
+    if index.bits.shape[1] != (vocab.num_games + 7) // 8:
+        return build_facets(vocab)
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Count the games matching a filter, e.g. "RPG|Action RPG, rating>=4, !Horror"')
+    parser.add_argument('expression')
+    args = parser.parse_args()
+
+    store = storage.open_store()
+    index = load_facets(vocabulary.load_vocabulary(store), store)
+    print(index.count(args.expression), 'of', index.num_games, 'games match')
@@ -0,0 +1,89 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import instrument
+
+def make_session(pool_size=10):
+    """ Creates a requests Session that keeps connections alive and shares them between threads
+
+    Args:
+        pool_size (int): Maximum number of pooled connections kept open per host
+
+    Returns:
+        requests.Session: Session with a connection pool large enough for pool_size concurrent requests
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class HostRateLimiter:
+    """ Token bucket rate limiter that spaces out requests to each host separately
+    """
+
+    def __init__(self, rate=None, burst=1):
+        """
+        Args:
+            rate (float): Requests per second allowed for each host, None disables limiting
+            burst (int): Number of requests that may be sent back to back before waiting
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {} # host -> (tokens, time of last refill)
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """ Blocks until a request to the host of url is allowed
+
+        Args:
+            url (str): URL that is about to be requested
+        """
+
+        if self.rate is None:
+            return
+
+        host = urlsplit(url).netloc
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate) # refill since last request
+
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+
+                self._buckets[host] = (tokens, now)
+                delay = (1 - tokens) / self.rate # time until the next token is available
+
+            time.sleep(delay)
+
+def fetch(url, session=None, limiter=None, timeout=30):
+    """ Downloads a single page, respecting the host rate limit
+
+    Args:
+        url (str): URL to download
+        session (requests.Session): Pooled session to reuse connections from, None uses a one-off connection
+        limiter (HostRateLimiter): Rate limiter shared by all fetching threads
+        timeout (float): Seconds to wait for the server before giving up
+
+    Returns:
+        str: Body of the response
+    """
+
+    if limiter is not None:
+        limiter.wait(url)
+
+    with instrument.span('fetch'):
+        r = (session or requests).get(url, timeout=timeout)
+        r.raise_for_status()
+    instrument.count('pages_fetched')
+    instrument.count('bytes_fetched', len(r.content))
+    return r.text
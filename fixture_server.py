@@ -0,0 +1,146 @@
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURE_FILE = 'scrape_test1.txt'
+TITLE_PATTERN = re.compile(r'(<span itemprop="name">\s*)([^<]*?)(\s*</span>)')
+
+def search_page(page, games_per_page):
+    """ Builds a fake Steam search results page listing a block of app ids
+
+    Args:
+        page (int): Page number of the search results, app ids on page N follow on from page N-1
+        games_per_page (int): Number of games listed on each page
+
+    Returns:
+        str: HTML with the same search_result_container structure as the real store
+    """
+
+    rows = ''
+    for app_id in range((page - 1) * games_per_page + 1, page * games_per_page + 1):
+        rows += '<a class="search_result_row ds_collapse_flag" data-ds-appid="{0}" href="/app/{0}/">Game {0}</a>\n'.format(app_id)
+
+    return '<html><body><div id="search_result_container">\n' + rows + '</div></body></html>'
+
+def app_page(template, app_id):
+    """ Builds a fake store page for a game by renaming the game in a saved store page
+
+    Args:
+        template (str): HTML of a saved Steam store page, e.g. scrape_test1.txt
+        app_id (str): App id of the game, used to give every game a unique title
+
+    Returns:
+        str: HTML of the store page with its title replaced
+    """
+
+    return TITLE_PATTERN.sub(lambda m: m.group(1) + 'Fixture Game ' + app_id + m.group(3), template, count=1)
+
+def make_handler(template, games_per_page, latency):
+    """ Creates a request handler class that serves search pages and app pages from memory
+
+    Args:
+        template (str): HTML of a saved Steam store page
+        games_per_page (int): Number of games listed on each search page
+        latency (float): Seconds to sleep before answering, to mimic network round trips
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass for ThreadingHTTPServer
+    """
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' # keep connections alive so pooled clients can reuse them
+        disable_nagle_algorithm = True # headers and body are written separately, don't wait for an ACK in between
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path.rstrip('/') == '/search':
+                page = int(parse_qs(parts.query).get('page', ['1'])[0])
+                body = search_page(page, games_per_page)
+            elif parts.path.startswith('/app/'):
+                body = app_page(template, parts.path.split('/')[2])
+            else:
+                self.send_error(404)
+                return
+
+            if latency:
+                time.sleep(latency)
+
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args): # keep benchmark output readable
+            pass
+
+    return FixtureHandler
+
+def start_server(port=0, games_per_page=25, latency=0.0, fixture=FIXTURE_FILE):
+    """ Starts a local stand-in for the Steam store on a background thread
+
+    Args:
+        port (int): Port to listen on, 0 picks a free port
+        games_per_page (int): Number of games listed on each search page
+        latency (float): Seconds to sleep before answering each request
+        fixture (str): Saved store page served for every game
+
+    Returns:
+        (ThreadingHTTPServer, str): Running server and its base URL, call server.shutdown() to stop it
+    """
+
+    with open(fixture, encoding='utf-8') as fd:
+        template = fd.read()
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(template, games_per_page, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:' + str(server.server_address[1])
+
+def measure_throughput(pages, workers, latency):
+    """ Scrapes the fixture server with a given number of workers and reports pages per second
+
+    Args:
+        pages (int): Number of search pages to scrape
+        workers (int): Number of concurrent downloads
+        latency (float): Simulated network latency of the fixture server in seconds
+
+    Returns:
+        (int, float): Number of games scraped and total pages (search + game) fetched per second
+    """
+
+    import scrape_steam
+
+    server, base_url = start_server(latency=latency)
+    try:
+        start = time.perf_counter()
+        game_dict = scrape_steam.scrape_pipeline(pages, workers, None, base_url)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    return len(game_dict), (len(game_dict) + pages) / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve saved Steam pages locally, or measure scraper throughput against them')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated round trip in seconds')
+    parser.add_argument('--bench', action='store_true', help='measure scraper throughput instead of serving')
+    parser.add_argument('--pages', type=int, default=4, help='search pages to scrape when benchmarking')
+    args = parser.parse_args()
+
+    if args.bench:
+        for workers in (1, 4, 16, 32):
+            games, rate = measure_throughput(args.pages, workers, args.latency)
+            print('workers={:<3} games={:<5} pages/sec={:.1f}'.format(workers, games, rate))
+    else:
+        server, base_url = start_server(args.port, latency=args.latency)
+        print('Serving fixtures on', base_url, '- run scrape_steam.py --base-url', base_url)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,328 @@
+""" Timing spans, counters and the peak memory of every stage of the pipeline, off unless switched on
+
+Stages wrap their work in `with instrument.span('similarity.cosine'):` and count things with
+`instrument.count('pages_fetched')`. While instrumentation is off, span() hands back one shared do-nothing context
+manager and count() returns straight away, so the calls cost about as much as an attribute lookup.
+
+Switch it on in code with enable(), or for any script by setting environment variables:
+    GAME_RECOMMENDER_METRICS=metrics.json python similarity.py       (.prom for Prometheus text)
+    GAME_RECOMMENDER_PROFILE=similarity.cosine,preprocess python ...  (cProfile those spans into *.prof files)
+
+Every run of a profiled span adds to one profile per span name, which is written when the process exits.
+
+A span's memory is the process's resident set size, sampled by a background thread every SAMPLE_INTERVAL seconds
+while any span is running, and once more when each span starts and ends. A spike shorter than the interval can be
+missed, and spans running at the same time on different threads all see each other's memory.
+"""
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+
+try:
+    import resource # peak resident memory, not available on Windows
+except ImportError:
+    resource = None
+
+_NULL_SPAN = contextlib.nullcontext()
+SAMPLE_INTERVAL = 0.005 # seconds between resident memory samples while a span is running
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError): # no sysconf on Windows
+    _PAGE_SIZE = None
+
+_enabled = False
+_profile = set() # span names to run under cProfile
+_profile_dir = '.'
+_lock = threading.Lock()
+_spans = {} # name -> {'count', 'seconds', 'max_seconds', 'peak_rss_mb', 'rss_growth_mb'}
+_counters = {}
+_profilers = {} # span name -> cProfile.Profile holding every profiled run of the span
+_profiling = set() # span names whose profiler is running, a profiler can only run on one thread at a time
+_dump_registered = False
+_local = threading.local() # cProfile can only profile one span at a time per thread
+_running = {} # id of each running span -> [resident MB when it started, most resident MB seen since]
+_sampler = None # thread updating _running, started by the first span
+
+def enable(profile=(), profile_dir='.'):
+    """ Starts recording spans and counters
+
+    Args:
+        profile (Iterable[str]): Span names to also run under cProfile, each is written to <profile_dir>/<name>.prof
+            when the process exits
+        profile_dir (str): Directory for the profiles
+    """
+
+    global _enabled, _profile, _profile_dir, _dump_registered
+    _profile = set(profile)
+    _profile_dir = profile_dir
+    _enabled = True
+    if _profile and not _dump_registered:
+        atexit.register(dump_profiles)
+        _dump_registered = True
+
+def disable():
+    """ Stops recording, keeping what has been recorded so far
+    """
+
+    global _enabled
+    _enabled = False
+
+def reset():
+    """ Forgets every recorded span and counter
+    """
+
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        for name in list(_profilers):
+            if name not in _profiling:
+                del _profilers[name]
+
+def peak_rss_mb():
+    """ Gets the most memory the process has held so far
+
+    Returns:
+        float: Peak resident set size in MB, None where it can't be measured
+    """
+
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # reported in KB on Linux
+
+def current_rss_mb():
+    """ Gets the memory the process holds right now
+
+    Returns:
+        float: Resident set size in MB, None where it can't be measured
+    """
+
+    if _PAGE_SIZE is None:
+        return None
+    try:
+        with open('/proc/self/statm') as fd: # Linux only, second field is resident pages
+            return int(fd.read().split()[1]) * _PAGE_SIZE / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _sample():
+    """ Raises the memory high-water mark of every running span to the current resident memory, until the process exits
+    """
+
+    while True:
+        time.sleep(SAMPLE_INTERVAL)
+        if not _running:
+            continue
+        rss = current_rss_mb()
+        with _lock:
+            for memory in _running.values():
+                memory[1] = max(memory[1], rss)
+
+def _start_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample, name='instrument-memory', daemon=True)
+            _sampler.start()
+
+class _Span:
+    """ Times one run of a stage and adds it to the stage's totals
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.profiler = None
+        self.memory = None
+
+    def __enter__(self):
+        if self.name in _profile and not getattr(_local, 'profiling', False):
+            with _lock:
+                if self.name not in _profiling: # a run on another thread at the same time goes unprofiled
+                    _profiling.add(self.name)
+                    self.profiler = _profilers.setdefault(self.name, cProfile.Profile())
+            if self.profiler is not None:
+                try:
+                    self.profiler.enable()
+                    _local.profiling = True
+                except ValueError: # newer Pythons allow only one running profiler per process
+                    self._release()
+
+        rss = current_rss_mb()
+        if rss is not None:
+            _start_sampler()
+            self.memory = [rss, rss]
+            with _lock:
+                _running[id(self)] = self.memory
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        if self.profiler is not None:
+            self.profiler.disable()
+            _local.profiling = False
+            self._release()
+
+        if self.memory is not None:
+            rss = current_rss_mb()
+            with _lock:
+                del _running[id(self)]
+                self.memory[1] = max(self.memory[1], rss)
+        _add(self.name, elapsed, self.memory)
+        return False
+
+    def _release(self):
+        with _lock:
+            _profiling.discard(self.name)
+        self.profiler = None
+
+def _add(name, elapsed, memory=None):
+    """ Adds one run of a stage to its totals
+
+    Args:
+        name (str): Stage name
+        elapsed (float): Duration of the run in seconds
+        memory (list[float]): Resident MB when the run started and the most seen during it, None if not measured
+    """
+
+    with _lock:
+        stats = _spans.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'peak_rss_mb': None, 'rss_growth_mb': None})
+        stats['count'] += 1
+        stats['seconds'] += elapsed
+        stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+        if memory is not None: # worst run so far
+            stats['peak_rss_mb'] = max(stats['peak_rss_mb'] or 0.0, memory[1]) # most memory the process held during the stage
+            stats['rss_growth_mb'] = max(stats['rss_growth_mb'] or 0.0, memory[1] - memory[0]) # how far the stage raised it
+
+def span(name):
+    """ Times a block of code as a stage, e.g. `with span('preprocess'):`
+
+    Args:
+        name (str): Stage name, dotted names group stages, e.g. 'store.write_table'
+
+    Returns:
+        contextlib.AbstractContextManager: Context manager timing the block, or one that does nothing while disabled
+    """
+
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+def timed(name):
+    """ Decorator that runs every call of a function inside span(name)
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe(name, seconds):
+    """ Records a duration measured elsewhere as one run of a stage, e.g. the time until a window first appears
+
+    Args:
+        name (str): Stage name
+        seconds (float): Duration
+    """
+
+    if _enabled:
+        _add(name, seconds)
+
+def count(name, value=1):
+    """ Adds to a counter, e.g. count('bytes_fetched', len(body))
+
+    Args:
+        name (str): Counter name
+        value (int/float): Amount to add
+    """
+
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def snapshot():
+    """ Gets everything recorded so far
+
+    Returns:
+        dict: Spans, counters and the process's peak memory
+    """
+
+    with _lock:
+        spans = {name: dict(stats) for name, stats in _spans.items()}
+        counters = dict(_counters)
+    for stats in spans.values():
+        stats['seconds'] = round(stats['seconds'], 6)
+        stats['max_seconds'] = round(stats['max_seconds'], 6)
+        for key in ('peak_rss_mb', 'rss_growth_mb'):
+            if stats[key] is not None:
+                stats[key] = round(stats[key], 1)
+    return {'spans': spans, 'counters': counters, 'process_peak_rss_mb': peak_rss_mb()}
+
+def to_json():
+    """ Formats everything recorded so far as JSON
+    """
+
+    return json.dumps(snapshot(), indent=2)
+
+def to_prometheus():
+    """ Formats everything recorded so far in the Prometheus text exposition format
+
+    Returns:
+        str: One sample per line, spans as game_recommender_span_* with a stage label
+    """
+
+    data = snapshot()
+    lines = ['# TYPE game_recommender_span_seconds_total counter', '# TYPE game_recommender_span_count_total counter',
+             '# TYPE game_recommender_span_max_seconds gauge', '# TYPE game_recommender_span_peak_rss_megabytes gauge',
+             '# TYPE game_recommender_span_rss_growth_megabytes gauge']
+    for name, stats in sorted(data['spans'].items()):
+        label = '{stage="%s"}' % name
+        lines.append('game_recommender_span_seconds_total' + label + ' ' + repr(stats['seconds']))
+        lines.append('game_recommender_span_count_total' + label + ' ' + str(stats['count']))
+        lines.append('game_recommender_span_max_seconds' + label + ' ' + repr(stats['max_seconds']))
+        if stats['peak_rss_mb'] is not None:
+            lines.append('game_recommender_span_peak_rss_megabytes' + label + ' ' + repr(stats['peak_rss_mb']))
+            lines.append('game_recommender_span_rss_growth_megabytes' + label + ' ' + repr(stats['rss_growth_mb']))
+    for name, value in sorted(data['counters'].items()):
+        lines.append('# TYPE game_recommender_%s_total counter' % name)
+        lines.append('game_recommender_%s_total %s' % (name, value))
+    if data['process_peak_rss_mb'] is not None:
+        lines.append('# TYPE game_recommender_process_peak_rss_megabytes gauge')
+        lines.append('game_recommender_process_peak_rss_megabytes ' + repr(data['process_peak_rss_mb']))
+    return '\n'.join(lines) + '\n'
+
+def dump_profiles():
+    """ Writes the profile of every profiled span to <profile_dir>/<name>.prof, covering all of its runs so far
+    """
+
+    with _lock: # a running profiler would be stopped by dump_stats, and none can start while the lock is held
+        for name, profiler in _profilers.items():
+            if name not in _profiling:
+                profiler.dump_stats(os.path.join(_profile_dir, name + '.prof'))
+
+def write(path):
+    """ Writes everything recorded so far, as Prometheus text for .prom/.txt files and JSON otherwise
+
+    Args:
+        path (str): File to write
+    """
+
+    with open(path, 'w', encoding='utf-8') as fd:
+        fd.write(to_prometheus() if path.endswith(('.prom', '.txt')) else to_json())
+
+if os.environ.get('GAME_RECOMMENDER_METRICS') or os.environ.get('GAME_RECOMMENDER_PROFILE'):
+    enable([name for name in os.environ.get('GAME_RECOMMENDER_PROFILE', '').split(',') if name])
+    if os.environ.get('GAME_RECOMMENDER_METRICS'):
+        atexit.register(write, os.environ['GAME_RECOMMENDER_METRICS'])
@@ -0,0 +1,189 @@
+import argparse
+import time
+
+import numpy as np
+
+import similarity
+import vocabulary
+
+PRIME = 2 ** 31 - 1 # hash values a * x + b stay below 2^62, so they never overflow int64
+
+def minhash_signatures(matrix, num_perm=128, seed=1, chunk_size=2000):
+    """ Calculates a MinHash signature for each game's set of attributes
+
+    The fraction of positions where two signatures agree is an unbiased estimate of the jaccard similarity of the
+    two sets, so games can be compared through short fixed-length signatures instead of their full sets.
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Binary game x attribute matrix from vocabulary.AttributeVocabulary.attribute_matrix
+        num_perm (int): Signature length, longer signatures give better estimates
+        seed (int): Seed of the random hash functions, signatures are only comparable with the same seed
+        chunk_size (int): Number of games hashed at once
+
+    Returns:
+        numpy.ndarray: n x num_perm signatures, games without attributes get PRIME in every position
+    """
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, PRIME, size=num_perm, dtype=np.int64)
+    b = rng.integers(0, PRIME, size=num_perm, dtype=np.int64)
+    attribute_hashes = (a[:, None] * np.arange(matrix.shape[1], dtype=np.int64)[None, :] + b[:, None]) % PRIME
+
+    n = matrix.shape[0]
+    signatures = np.full((n, num_perm), PRIME, dtype=np.int64)
+    for start in range(0, n, chunk_size):
+        chunk = matrix[start:start + chunk_size]
+        nonempty = np.diff(chunk.indptr) > 0
+        if not nonempty.any():
+            continue
+
+        hashes = attribute_hashes[:, chunk.indices] # num_perm x attributes of every game in the chunk
+        minimums = np.minimum.reduceat(hashes, chunk.indptr[:-1][nonempty], axis=1) # smallest hash within each game
+        signatures[start:start + chunk.shape[0]][nonempty] = minimums.T
+
+    return signatures
+
+class LSHIndex:
+    """ Locality-sensitive hashing index over MinHash signatures
+
+    Each signature is split into bands of rows_per_band values. Games whose signatures are identical within any
+    band land in the same bucket and become candidate neighbors. With b bands of r rows, a pair with jaccard
+    similarity s becomes a candidate with probability 1 - (1 - s^r)^b, so the bands and rows set where the
+    threshold between likely and unlikely candidates falls.
+    """
+
+    def __init__(self, signatures, bands=32, seed=1):
+        """
+        Args:
+            signatures (numpy.ndarray): n x num_perm signatures from minhash_signatures
+            bands (int): Number of bands, must divide num_perm, more bands find more candidates
+            seed (int): Seed used to hash bands into bucket keys
+        """
+
+        n, num_perm = signatures.shape
+        if num_perm % bands != 0:
+            raise ValueError('bands must divide the signature length (' + str(num_perm) + ')')
+
+        self.signatures = signatures
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self._multipliers = np.random.default_rng(seed).integers(1, 2 ** 63, size=self.rows_per_band, dtype=np.uint64) | np.uint64(1)
+
+        # one sorted array of bucket keys per band, with the games in each bucket found by binary search
+        self._keys = []
+        self._games = []
+        for band in range(bands):
+            keys = self._band_keys(signatures, band)
+            order = np.argsort(keys, kind='stable')
+            self._keys.append(keys[order])
+            self._games.append(order.astype(np.int32))
+
+    def _band_keys(self, signatures, band):
+        """ Hashes one band of each signature into a single 64-bit bucket key
+        """
+
+        band_values = signatures[:, band * self.rows_per_band:(band + 1) * self.rows_per_band].astype(np.uint64)
+        with np.errstate(over='ignore'): # keys are meant to wrap around
+            return (band_values * self._multipliers).sum(axis=1, dtype=np.uint64)
+
+    def candidates(self, game):
+        """ Finds games that share a bucket with a game in at least one band
+
+        Args:
+            game (int): Row index of the game
+
+        Returns:
+            numpy.ndarray: Row indices of candidate neighbors, not including the game itself
+        """
+
+        signature = self.signatures[game:game + 1]
+        found = []
+        for band in range(self.bands):
+            key = self._band_keys(signature, band)[0]
+            lo = np.searchsorted(self._keys[band], key, side='left')
+            hi = np.searchsorted(self._keys[band], key, side='right')
+            found.append(self._games[band][lo:hi])
+
+        found = np.unique(np.concatenate(found))
+        return found[found != game]
+
+    def query(self, game, matrix, k=3):
+        """ Finds the k most similar games among a game's candidates, ranked by their exact jaccard scores
+
+        Args:
+            game (int): Row index of the game
+            matrix (scipy.sparse.csr_matrix): Binary game x attribute matrix the signatures were made from
+            k (int): Number of neighbors to return
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): Row indices and jaccard scores of up to k neighbors, best first
+        """
+
+        found = self.candidates(game)
+        if len(found) == 0:
+            return found, np.zeros(0)
+
+        scores = similarity.jaccard_rows(matrix[found.tolist() + [game]], [len(found)])[0, :-1] # score candidates only
+        order = np.lexsort((-found, -scores))[:k] # score descending, then index descending like the exact index
+        return found[order], scores[order]
+
+def evaluate_recall(matrix, index, k=10, sample=500, seed=0):
+    """ Measures how many of the exact top-k jaccard neighbors the LSH index finds, on a random sample of games
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Binary game x attribute matrix
+        index (LSHIndex): Index built from the matrix's signatures
+        k (int): Number of neighbors compared
+        sample (int): Number of games queried
+        seed (int): Seed used to pick the games
+
+    Returns:
+        dict: Mean recall, mean candidates per query and mean query time in milliseconds
+    """
+
+    n = matrix.shape[0]
+    games = np.random.default_rng(seed).choice(n, size=min(sample, n), replace=False)
+    exact_scores = similarity.select_top_k(similarity.jaccard_rows(matrix, games), games, min(k, n - 1))[1]
+
+    recalls = []
+    candidates = 0
+    elapsed = 0.0
+    for row, game in enumerate(games):
+        start = time.perf_counter()
+        found, scores = index.query(game, matrix, k)
+        elapsed += time.perf_counter() - start
+        candidates += len(index.candidates(game))
+
+        # any returned game scoring at least the exact kth best score is a true top-k neighbor, whichever way ties fall
+        hits = np.count_nonzero(scores >= exact_scores[row, -1] - 1e-6)
+        recalls.append(min(hits, exact_scores.shape[1]) / exact_scores.shape[1])
+
+    return {'recall': float(np.mean(recalls)), 'candidates': candidates / len(games), 'query_ms': elapsed / len(games) * 1000}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Approximate jaccard neighbors with MinHash and LSH, and measure recall against exact scores')
+    parser.add_argument('--perm', type=int, default=128, help='signature length')
+    parser.add_argument('--bands', type=int, nargs='+', default=[16, 32, 64], help='band counts to evaluate, each must divide --perm')
+    parser.add_argument('-k', type=int, default=10, help='neighbors compared per game')
+    parser.add_argument('--sample', type=int, default=500, help='games queried')
+    parser.add_argument('--synthetic', type=int, default=None, help='use a synthetic catalog of this many games instead of the stored data')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from benchmarks.synthetic import preprocessed_catalog
+        vocab = vocabulary.build_vocabulary(preprocessed_catalog(args.synthetic))
+    else:
+        vocab = vocabulary.load_vocabulary()
+
+    matrix = vocab.attribute_matrix()
+    start = time.perf_counter()
+    signatures = minhash_signatures(matrix, args.perm)
+    print('games={} signatures={:.2f}s'.format(matrix.shape[0], time.perf_counter() - start))
+
+    for bands in args.bands:
+        start = time.perf_counter()
+        index = LSHIndex(signatures, bands)
+        build = time.perf_counter() - start
+        result = evaluate_recall(matrix, index, args.k, args.sample)
+        print('bands={:<3} rows={:<3} build={:.2f}s recall@{}={:.3f} candidates={:.0f} query={:.2f}ms'.format(
+            bands, index.rows_per_band, build, args.k, result['recall'], result['candidates'], result['query_ms']))
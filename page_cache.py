@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import instrument
+
+class PageCache:
+    """ On-disk cache of fetched store pages and their parsed game data, keyed by app id
+
+    Page HTML is stored compressed under the SHA-256 of its contents, so identical pages share one blob and a
+    re-fetched page that has not changed does not need to be parsed again. An SQLite index maps each app id to
+    its current blob and records when it was fetched and last used. Parsed data is stored with the version of the
+    parser that produced it, and data from any other version is never returned.
+    """
+
+    def __init__(self, path='page_cache', ttl=7 * 24 * 3600, max_bytes=512 * 1024 * 1024, parser_version=None):
+        """
+        Args:
+            path (str): Directory holding the index and page blobs
+            ttl (float): Seconds before a cached page is considered stale and is fetched again
+            max_bytes (int): Maximum total size of stored blobs, least recently used pages are evicted past this
+            parser_version (int): Version of the parser passed to put, e.g. extract.PARSER_VERSION
+        """
+
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.parser_version = parser_version
+        os.makedirs(os.path.join(path, 'blobs'), exist_ok=True)
+
+        self._lock = threading.Lock() # scraper worker threads share one connection
+        self._db = sqlite3.connect(os.path.join(path, 'index.sqlite'), check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (app_id TEXT PRIMARY KEY, digest TEXT, fetched_at REAL, accessed_at REAL);
+            CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, data TEXT, parser INTEGER);
+        ''')
+        if 'parser' not in [column[1] for column in self._db.execute('PRAGMA table_info(blobs)')]: # cache from before parser versions
+            self._db.execute('ALTER TABLE blobs ADD COLUMN parser INTEGER')
+            self._db.commit()
+
+    def _blob_path(self, digest):
+        return os.path.join(self.path, 'blobs', digest[:2], digest + '.html.z')
+
+    def is_fresh(self, app_id, now=None):
+        """ Checks whether an app id was fetched recently enough to skip fetching it again
+
+        Args:
+            app_id (str): Steam app id
+            now (float): Current time, defaults to time.time()
+
+        Returns:
+            bool: True if the page is cached and younger than the TTL
+        """
+
+        with self._lock:
+            row = self._db.execute('SELECT fetched_at FROM pages WHERE app_id = ?', (app_id,)).fetchone()
+        return row is not None and (now or time.time()) - row[0] < self.ttl
+
+    def get_data(self, app_id):
+        """ Gets the parsed game data of the page cached for an app id
+
+        Args:
+            app_id (str): Steam app id
+
+        Returns:
+            (str, list[str], list[str] str, str): Output of get_game_data, or None if the app id is not cached or was
+                parsed by another version of the parser
+        """
+
+        with self._lock:
+            row = self._db.execute('SELECT b.data, b.parser FROM pages p JOIN blobs b ON p.digest = b.digest WHERE p.app_id = ?', (app_id,)).fetchone()
+            if row is None or row[0] is None or row[1] != self.parser_version:
+                return None
+            self._db.execute('UPDATE pages SET accessed_at = ? WHERE app_id = ?', (time.time(), app_id))
+            self._db.commit()
+        return tuple(json.loads(row[0]))
+
+    def get_html(self, app_id):
+        """ Gets the cached HTML of an app id's store page
+
+        Args:
+            app_id (str): Steam app id
+
+        Returns:
+            str: Page HTML, or None if the app id is not cached
+        """
+
+        with self._lock:
+            row = self._db.execute('SELECT digest FROM pages WHERE app_id = ?', (app_id,)).fetchone()
+        if row is None:
+            return None
+
+        with open(self._blob_path(row[0]), 'rb') as fd:
+            return zlib.decompress(fd.read()).decode('utf-8')
+
+    def put(self, app_id, html, parse):
+        """ Stores a freshly fetched page, parsing it only if its contents have not been parsed by this parser version before
+
+        Args:
+            app_id (str): Steam app id
+            html (str): Page HTML
+            parse (Callable[[str], tuple]): Parser to run on new contents, e.g. scrape_steam.parse_game_data, its
+                version is parser_version
+
+        Returns:
+            (str, list[str], list[str] str, str): Parsed game data for the page
+        """
+
+        digest = hashlib.sha256(html.encode('utf-8')).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute('SELECT data FROM blobs WHERE digest = ? AND parser IS ?', (digest, self.parser_version)).fetchone()
+
+        if row is not None: # same contents as a page we already parsed
+            instrument.count('cache_parses_skipped')
+            data = tuple(json.loads(row[0]))
+        else:
+            data = parse(html)
+            blob = zlib.compress(html.encode('utf-8'))
+            os.makedirs(os.path.dirname(self._blob_path(digest)), exist_ok=True)
+            with open(self._blob_path(digest), 'wb') as fd:
+                fd.write(blob)
+
+        with self._lock:
+            if row is None:
+                self._db.execute('INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?)', (digest, len(blob), json.dumps(data), self.parser_version))
+            self._db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)', (app_id, digest, now, now))
+            self._db.commit()
+
+        return data
+
+    def evict(self):
+        """ Removes least recently used pages until the blobs fit in max_bytes, then deletes unreferenced blobs
+
+        Returns:
+            int: Number of pages evicted
+        """
+
+        evicted = 0
+        with self._lock:
+            total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+            if total > self.max_bytes:
+                references = dict(self._db.execute('SELECT digest, COUNT(*) FROM pages GROUP BY digest').fetchall())
+                pages = self._db.execute('SELECT p.app_id, p.digest, b.size FROM pages p JOIN blobs b ON p.digest = b.digest ORDER BY p.accessed_at').fetchall()
+                for app_id, digest, size in pages:
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute('DELETE FROM pages WHERE app_id = ?', (app_id,))
+                    evicted += 1
+                    references[digest] -= 1
+                    if references[digest] == 0: # a shared blob is only freed once its last page is gone
+                        total -= size
+
+            orphans = self._db.execute('SELECT digest FROM blobs WHERE digest NOT IN (SELECT digest FROM pages)').fetchall()
+            for (digest,) in orphans:
+                self._db.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+                if os.path.exists(self._blob_path(digest)):
+                    os.remove(self._blob_path(digest))
+            self._db.commit()
+
+        return evicted
+
+    def close(self):
+        """ Closes the index database
+        """
+
+        self._db.close()
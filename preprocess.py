@@ -1,7 +1,19 @@
+import argparse
+
+import numpy as np
 import pandas as pd
 
+import facets
+import instrument
+import storage
+import vocabulary
+from vocabulary import ATTRIBUTE_COLUMNS
+
+PCT_CUTOFFS = [20, 40, 60, 80] # upper bounds of the 1-4 star PosPercent ratings, see get_pct_label
+
+@instrument.timed('preprocess.write_data')
 def write_data(game_dict):  
-    """ Writes discretized data and combined column to an Excel sheet
+    """ Writes discretized data and combined column to the artifact store
 
     Args:
         game_dict (dict): Updated dictionary of game data
@@ -11,8 +23,20 @@ def write_data(game_dict):
     df.columns = ['Genre1', 'Genre2', 'Genre3', 'Tag1', 'Tag2', 'Tag3', 'Tag4', 'Tag5', 'Tag6', 'Tag7', 'Tag8', 'Tag9', 
                 'Tag10', 'Tag11', 'Tag12', 'Tag13', 'Tag14', 'Tag15', 'Tag16', 'Tag17', 'Tag18', 'Tag19', 'Tag20', 'PosPercentDiscrete', 'TotalReviewsDiscrete', 'CombinedData'] # rename dataframe columns
 
-    with pd.ExcelWriter("game_data.xlsx", engine="openpyxl", mode="a", if_sheet_exists="replace") as writer: # write to Excel
-        df.to_excel(writer, sheet_name='Preprocessed Data')
+    write_table(df)
+
+def review_counts(review_data):
+    """ Converts TotalReviews values such as '8,411' to integers, skipping blanks
+
+    Args:
+        review_data (pandas.core.series.Series): Column of TotalReviews
+
+    Returns:
+        numpy.ndarray: Review count of every game that has one
+    """
+
+    reviews = review_data[review_data.notna()] # do not convert when value is nan
+    return reviews.astype(str).str.replace(",", "", regex=False).astype(np.int64).to_numpy()
 
 def get_rev_rankings(review_data):
     """ Gets percentile cutoffs for the TotalReviews column
@@ -24,13 +48,7 @@ def get_rev_rankings(review_data):
         (int, int, int, int): Tuple of cutoffs to determine each game's 1-5 rating
     """
 
-    review_list = []
-
-    for i in range(len(review_data)): # convert each item in Series to an integer
-        if(type(review_data[i]) ) != float: #  do not append when value is nan
-            review_list.append(int(review_data[i].replace(",", "")))
-
-    review_list.sort()
+    review_list = np.sort(review_counts(review_data))
     num_ranks = len(review_list)
     
     # indices of 20th, 40th, 60th, and 80th percentile 
@@ -39,7 +57,7 @@ def get_rev_rankings(review_data):
     sixtieth = round(num_ranks * 0.6)
     eightieth = round(num_ranks * 0.8)
 
-    return (review_list[twentieth], review_list[fourtieth], review_list[sixtieth], review_list[eightieth]) # return cutoff values for each percentile
+    return (int(review_list[twentieth]), int(review_list[fourtieth]), int(review_list[sixtieth]), int(review_list[eightieth])) # return cutoff values for each percentile
 
 def get_pct_label(pos_pct):
     """ Helper function that discretizes the PosPercent value into its 1-5 star rating
@@ -75,7 +93,7 @@ def get_rev_label(tot_rev, rev_rankings):
         Literal[1, 2, 3, 4, 5, ''] | None: 1-5 rating based on total review count
     """
 
-    if type(tot_rev) != float: # ignore blank/nan values
+    if pd.notna(tot_rev): # ignore blank/nan/None values
         tot_rev = int(tot_rev.replace(",", ""))
 
         if tot_rev <= rev_rankings[0]: # return 1-5 popularity score based on percentile cutoffs
@@ -91,6 +109,7 @@ def get_rev_label(tot_rev, rev_rankings):
     else:
         return ''
 
+@instrument.timed('preprocess.discretize')
 def discretize():
     """ Dicretizes the PosPercent and TotalReviews columns and removes any ™ or ® symbols in game titles to simplify the recommendation process
 
@@ -99,9 +118,8 @@ def discretize():
     """
 
     game_dict = {}
-    raw_data = pd.read_excel('game_data.xlsx', sheet_name='Raw Data')
+    raw_data = storage.open_store().read_table('Raw Data') # first column is Title
     rows = raw_data.shape[0]
-    raw_data.rename(columns={'Unnamed: 0':'Title'}, inplace=True) # rename first column as Title
 
     rev_rankings = get_rev_rankings(raw_data['TotalReviews']) # tuple that stores popularity ranking cutoffs for TotalReviews
 
@@ -119,7 +137,8 @@ def discretize():
                                     raw_data['Tag12'][i], raw_data['Tag13'][i], raw_data['Tag14'][i], raw_data['Tag15'][i], raw_data['Tag16'][i], raw_data['Tag17'][i], raw_data['Tag18'][i],
                                     raw_data['Tag19'][i], raw_data['Tag20'][i] ])
 
-            pos_pct = str(raw_data['PosPercent'][i])[:-1] # get percent and remove '%' char
+            pos_pct = raw_data['PosPercent'][i]
+            pos_pct = str(pos_pct)[:-1] if pd.notna(pos_pct) else 'na' # get percent and remove '%' char, blank may be None or nan
             pct_label = get_pct_label(pos_pct)
             game_dict[title].append(pct_label) # append 1-5 rating 
 
@@ -129,6 +148,7 @@ def discretize():
     
     return game_dict
 
+@instrument.timed('preprocess.combine_columns')
 def combine_columns(game_dict):
     """ Loops through each game, concatenates data from each of its columns, cleans the resulting data string, then adds the data string as a new entry in game_dict
 
@@ -160,7 +180,145 @@ def combine_columns(game_dict):
 
     return game_dict
 
+def pct_labels(pos_pct):
+    """ Discretizes a whole PosPercent column at once, with the same 1-5 star ratings as get_pct_label
+
+    Args:
+        pos_pct (pandas.core.series.Series): Column of PosPercent values such as '97%'
+
+    Returns:
+        numpy.ndarray: 1-5 rating of each game, '' when the value is blank and None when it is over 100
+    """
+
+    labels = np.full(len(pos_pct), '', dtype=object)
+    known = pos_pct.notna().to_numpy()
+    values = pos_pct[known].astype(str).str[:-1].astype(np.int64).to_numpy() # remove '%' char
+    ratings = np.searchsorted(PCT_CUTOFFS, values) + 1 # number of cutoffs below the value, plus one
+    labels[known] = np.where(values <= 100, ratings, None)
+    return labels
+
+def rev_labels(tot_rev, rev_rankings):
+    """ Discretizes a whole TotalReviews column at once, with the same 1-5 popularity scores as get_rev_label
+
+    Args:
+        tot_rev (pandas.core.series.Series): Column of TotalReviews values such as '8,411'
+        rev_rankings (int, int, int, int): Tuple of cutoffs that determine each game's 1-5 rating
+
+    Returns:
+        numpy.ndarray: 1-5 rating of each game, '' when the value is blank
+    """
+
+    labels = np.full(len(tot_rev), '', dtype=object)
+    labels[tot_rev.notna().to_numpy()] = np.searchsorted(rev_rankings, review_counts(tot_rev)) + 1
+    return labels
+
+def combine_attributes(df):
+    """ Builds the CombinedData column of every game at once, one pass per column instead of one per value
+
+    Produces exactly the strings combine_columns does, including the extra space a blank rating leaves behind.
+
+    Args:
+        df (pandas.core.frame.DataFrame): Attribute and discretized rating columns of each game
+
+    Returns:
+        pandas.core.series.Series: Cleaned, space separated attributes of each game
+    """
+
+    combined = pd.Series('', index=df.index, dtype=object)
+    for col in ATTRIBUTE_COLUMNS + ['PosPercentDiscrete', 'TotalReviewsDiscrete']:
+        values = df[col].astype(object)
+        cleaned = values.astype(str).str.replace("-", "", regex=False).str.replace(" ", "", regex=False) + ' ' # remove whitespace/hyphens
+        combined += cleaned.where(values.notna(), '').astype(object) # skip null values, object + str fails on an empty block
+    return combined.str.lower().str.strip() # clean string after all attributes are concatenated
+
+def preprocess_rows(raw_data, rev_rankings):
+    """ Discretizes and combines a block of Raw Data rows without looping over them in Python
+
+    Args:
+        raw_data (pandas.core.frame.DataFrame): Raw Data rows, with the game titles in the 'Title' column
+        rev_rankings (int, int, int, int): TotalReviews cutoffs of the whole table, from get_rev_rankings
+
+    Returns:
+        pandas.core.frame.DataFrame: Preprocessed rows indexed by cleaned title, duplicate titles not yet merged
+    """
+
+    raw_data = raw_data[raw_data['Title'].notna()] # skip empty rows
+    titles = raw_data['Title'].str.replace(u"\u2122", '', regex=False).str.replace(u"\u00ae", '', regex=False) # remove ™ or ® symbols
+
+    df = raw_data[ATTRIBUTE_COLUMNS].set_axis(pd.Index(titles.to_numpy()))
+    df['PosPercentDiscrete'] = pct_labels(raw_data['PosPercent'])
+    df['TotalReviewsDiscrete'] = rev_labels(raw_data['TotalReviews'], rev_rankings)
+    df['CombinedData'] = combine_attributes(df)
+    return df
+
+def merge_rows(df):
+    """ Merges duplicate titles and drops games without attributes, the same way discretize's dict and combine_columns do
+
+    A title that appears more than once keeps the position of its first row and the values of its last row.
+
+    Args:
+        df (pandas.core.frame.DataFrame): Rows from preprocess_rows
+
+    Returns:
+        pandas.core.frame.DataFrame: Table in the Preprocessed Data layout
+    """
+
+    first = df.index[~df.index.duplicated(keep='first')]
+    df = df[~df.index.duplicated(keep='last')].loc[first]
+    df = df[df['CombinedData'] != ''] # remove games that do not have any attributes
+    instrument.count('games_preprocessed', len(df))
+
+    return df.infer_objects() # same column dtypes a DataFrame built from the dict gets, e.g. int64 when no rating is blank
+
+@instrument.timed('preprocess')
+def preprocess(chunk_size=None, store=None):
+    """ Discretizes and combines the Raw Data table column by column, optionally in bounded-memory blocks of rows
+
+    Gives the same table as discretize and combine_columns. With chunk_size, only the TotalReviews column is read
+    in full (its percentiles need every game), the rest is read and processed one block of rows at a time. The
+    processed blocks are still joined into one table, because a title repeated in different blocks is merged across
+    them and the vocabulary is built from the whole table.
+
+    Args:
+        chunk_size (int): Number of raw rows processed at once, None processes the whole table in one block
+        store (storage.BinaryStore): Store to read from, defaults to storage.open_store()
+
+    Returns:
+        pandas.core.frame.DataFrame: Table in the Preprocessed Data layout, indexed by title
+    """
+
+    store = store or storage.open_store()
+    if chunk_size is None:
+        raw_data = store.read_table('Raw Data')
+        return merge_rows(preprocess_rows(raw_data, get_rev_rankings(raw_data['TotalReviews'])))
+
+    rev_rankings = get_rev_rankings(store.read_table('Raw Data', columns=['TotalReviews'])['TotalReviews'])
+    return merge_rows(pd.concat([preprocess_rows(chunk, rev_rankings) for chunk in store.read_batches('Raw Data', chunk_size)]))
+
+@instrument.timed('preprocess.write_table')
+def write_table(df):
+    """ Writes the Preprocessed Data table, its attribute vocabulary and its facet bitsets to the artifact store
+
+    Args:
+        df (pandas.core.frame.DataFrame): Table in the Preprocessed Data layout
+    """
+
+    store = storage.open_store()
+    with store.run(): # the engine reloads once, after all three are written
+        store.write_table('Preprocessed Data', df)
+        vocab = vocabulary.build_vocabulary(df)
+        vocab.write(store) # integer attribute ids the similarity stages read instead of CombinedData
+        facets.build_facets(vocab).write(store) # genre, tag and rating filters for the engine
+
 if __name__ == "__main__":
-    game_dict = discretize() # discretize data columns
-    game_dict = combine_columns(game_dict) # add combined column to game_dict
-    write_data(game_dict) # write discretized data and combined column to new Excel sheet
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Discretize and combine the Raw Data table into the Preprocessed Data table')
+    parser.add_argument('--chunk-size', type=int, default=None, help='raw rows read and processed at once, default is the whole table')
+    parser.add_argument('--row-by-row', action='store_true', help='use the original row by row implementation')
+    args = parser.parse_args()
+
+    if args.row_by_row:
+        game_dict = discretize() # discretize data columns
+        game_dict = combine_columns(game_dict) # add combined column to game_dict
+        write_data(game_dict) # write discretized data and combined column to the Preprocessed Data table
+    else:
+        write_table(preprocess(args.chunk_size))
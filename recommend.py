@@ -0,0 +1,191 @@
+import time
+
+START = time.perf_counter() # launcher timings count from here, before anything else is imported
+
+import argparse
+import os
+import threading
+import tkinter as tk
+
+import instrument
+
+METRICS = ('cosine', 'jaccard')
+
+def launch(metrics, snapshot=None, timings=False):
+    """ Opens the recommender window right away and loads the engine in the background
+
+    The engine (and numpy with it) is imported and loaded from a snapshot on a background thread while the window
+    is drawn. Once it is ready the snapshot is checked against the store, and rewritten if the data has changed
+    since. Queries entered while it is loading are answered as soon as it is ready. Only a failure to load the engine
+    at all stops queries, if the check against the store fails the snapshot engine keeps serving and the error is
+    shown below the results.
+
+    Args:
+        metrics (list[str]): 'cosine' and/or 'jaccard', results of each are shown side by side
+        snapshot (str): Snapshot file, defaults to engine.SNAPSHOT_FILE
+        timings (bool): Print time to first window, engine ready and first result
+    """
+
+    loaded = {} # filled in by the loader thread: 'engine', 'source', 'error' or 'refresh_error'
+    ready = threading.Event()
+    refreshed = threading.Event() # set once the snapshot has been checked against the store, whether or not that worked
+    first = {} # query start of the first result, and whether it has been shown
+
+    def mark(name, seconds):
+        instrument.observe('launcher.' + name, seconds)
+        if timings:
+            print('{:<13} {:.3f}s'.format(name, seconds))
+
+    def load():
+        try:
+            import engine
+            path = snapshot or engine.SNAPSHOT_FILE
+            had_snapshot = os.path.exists(path)
+            loaded['engine'] = engine.RecommenderEngine(snapshot=path)
+            loaded['source'] = 'snapshot' if had_snapshot else 'store'
+        except Exception as e: # e.g. no data has been scraped yet, shown in the window instead of lost on this thread
+            loaded['error'] = e
+            ready.set()
+            refreshed.set()
+            return
+        ready.set()
+        mark('engine_ready', time.perf_counter() - START)
+
+        try:
+            # the snapshot may be older than the data, reload from the store if it has been rewritten since
+            if loaded['engine'].refresh():
+                loaded['source'] = 'store'
+                loaded['engine'].write_snapshot(path)
+            elif not had_snapshot:
+                loaded['engine'].write_snapshot(path)
+        except Exception as e: # the engine already loaded keeps answering queries from the snapshot
+            loaded['refresh_error'] = e
+        refreshed.set()
+
+    threading.Thread(target=load, daemon=True).start()
+
+    root = tk.Tk()
+    width = 400 * len(metrics) - 100 * (len(metrics) - 1)
+    root.title('Game Recommender - ' + ' / '.join(metric.capitalize() for metric in metrics) + ' Similarity')
+    canvas = tk.Canvas(root, width=width, height=250)
+    canvas.pack()
+
+    prompt = tk.Label(root, text='Enter a video game title:') # create prompt text
+    canvas.create_window(110, 30, window=prompt)
+
+    entry = tk.Entry(root) # create input text box
+    canvas.create_window(width // 2, 60, width=300, window=entry)
+
+    # initialize results to display later, one column per metric
+    results = {}
+    for column, metric in enumerate(metrics):
+        x = width * (2 * column + 1) // (2 * len(metrics))
+        if len(metrics) > 1:
+            canvas.create_window(x, 115, window=tk.Label(root, text=metric.capitalize()))
+        results[metric] = [tk.Label(root, text='') for _ in range(3)]
+        for row, label in enumerate(results[metric]):
+            canvas.create_window(x, 140 + 30 * row, window=label)
+
+    status = tk.Label(root, text='Loading games...', fg='gray')
+    canvas.create_window(width // 2, 232, window=status)
+
+    def find_recommendations():
+        """ Generates 3 games for each metric and prints them to screen
+        """
+
+        first.setdefault('start', time.perf_counter())
+        if not ready.is_set(): # answered by check_loaded once the engine is ready
+            first['pending'] = True
+            return
+        if 'error' in loaded:
+            return
+
+        title = entry.get() # get user input title
+        for metric in metrics:
+            try:
+                games = loaded['engine'].recommend(title, metric, 3)
+                names = [game for game, score in games]
+            except KeyError: # if game does not exist in database, use default values
+                names = []
+            names += ['None'] * (3 - len(names))
+
+            # show results on screen
+            for row, (label, name) in enumerate(zip(results[metric], names)):
+                label.config(text='Game {}: {}'.format(row + 1, name))
+
+        if 'shown' not in first:
+            root.update_idletasks()
+            first['shown'] = True
+            mark('first_result', time.perf_counter() - first['start'])
+
+    button = tk.Button(text='Enter', command=find_recommendations)
+    canvas.create_window(width // 2, 90, window=button)
+
+    # type-ahead suggestions, drawn over the results just below the input text box and hidden until there is input
+    suggestions = tk.Listbox(root, height=5)
+    suggestion_window = canvas.create_window(width // 2, 72, width=300, anchor='n', window=suggestions, state='hidden')
+
+    def show_suggestions(event):
+        """ Lists titles matching what the user has typed so far
+        """
+
+        if event.keysym == 'Return' or 'engine' not in loaded:
+            return
+        titles = loaded['engine'].suggest(entry.get(), 5) if entry.get().strip() else []
+        suggestions.delete(0, tk.END)
+        for title in titles:
+            suggestions.insert(tk.END, title)
+        canvas.itemconfigure(suggestion_window, state='normal' if titles else 'hidden')
+
+    def pick_suggestion(event):
+        """ Fills the input text box with the chosen suggestion
+        """
+
+        if suggestions.curselection():
+            entry.delete(0, tk.END)
+            entry.insert(0, suggestions.get(suggestions.curselection()[0]))
+        canvas.itemconfigure(suggestion_window, state='hidden')
+
+    def check_loaded():
+        """ Polls the loader thread from the Tk thread, which is the only one allowed to touch the widgets
+        """
+
+        if not ready.is_set():
+            root.after(20, check_loaded)
+        elif 'error' in loaded:
+            status.config(text='Could not load games: {}'.format(loaded['error']), fg='red')
+        else:
+            status.config(text='{} games loaded from the {}'.format(len(loaded['engine'].titles()), loaded['source']))
+            if first.pop('pending', False):
+                find_recommendations()
+            check_refreshed()
+
+    def check_refreshed():
+        """ Polls the snapshot check against the store, which finishes after the engine is ready
+        """
+
+        if not refreshed.is_set():
+            root.after(100, check_refreshed)
+        elif 'refresh_error' in loaded:
+            status.config(text='{} games loaded from the snapshot, could not check for newer data: {}'.format(
+                len(loaded['engine'].titles()), loaded['refresh_error']), fg='orange')
+        else:
+            status.config(text='{} games loaded from the {}'.format(len(loaded['engine'].titles()), loaded['source']))
+
+    entry.bind('<KeyRelease>', show_suggestions)
+    entry.bind('<Return>', lambda event: (canvas.itemconfigure(suggestion_window, state='hidden'), find_recommendations()))
+    suggestions.bind('<<ListboxSelect>>', pick_suggestion)
+
+    root.update() # draw the window before waiting on anything
+    mark('first_window', time.perf_counter() - START)
+    check_loaded()
+    root.mainloop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recommend games similar to a game you enjoyed')
+    parser.add_argument('--metric', choices=list(METRICS) + ['both'], default='both', help='similarity shown, both puts them side by side')
+    parser.add_argument('--snapshot', default=None, help='engine snapshot to start from, rewritten when the data has changed')
+    parser.add_argument('--timings', action='store_true', help='print time to first window, engine ready and first result')
+    args = parser.parse_args()
+
+    launch(list(METRICS) if args.metric == 'both' else [args.metric], args.snapshot, args.timings)
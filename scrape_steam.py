@@ -1,7 +1,24 @@
+import argparse
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 
+import extract
+import fetch
+import instrument
+import storage
+from checkpoint import Checkpoint, RetryQueue
+from page_cache import PageCache
+
+STEAM_URL = 'https://store.steampowered.com'
+PARSE_ERRORS = (AttributeError, IndexError, KeyError, TypeError, ValueError) # raised by pages that aren't laid out as expected
+
 def scrape_test():
     """ Scrapes data from a given URL and writes the output to a .txt. file (For testing purposes only)
     """
@@ -12,123 +29,340 @@ def scrape_test():
     with open(filename, 'w', encoding="utf-8") as fd:
         fd.write(soup.prettify())
 
-def get_app_ids():
-    """ Gets app ids from Steam
+def get_search_page(page, base_url=STEAM_URL, session=None, limiter=None):
+    """ Gets the app ids listed on a single page of Steam search results
+
+    Args:
+        page (int): Page number of the search results
+        base_url (str): Store URL to scrape, can be pointed at a local fixture server
+        session (requests.Session): Pooled session to reuse connections from
+        limiter (fetch.HostRateLimiter): Rate limiter shared by all fetching threads
+
+    Raises:
+        ValueError: If the page has no search results
 
     Returns:
-        [list]: List of app ids that are used to access a URL for a specific game
+        list[str]: App ids on the page, in the order they are listed
     """
 
-    app_ids = []
-    url = 'https://store.steampowered.com/search/?page=' # this url is used to page through all games on Steam
-                                                            # follow url with a number to get a new page of games
+    html = fetch.fetch(base_url + '/search/?page=' + str(page), session, limiter) # follow url with a number to get a new page of games
+    soup = BeautifulSoup(html, 'html.parser')
 
-    max_pages = 22 # loop through pages 1 - 22 (~500 games total)
-    for i in range(1, max_pages + 1):
-        r = requests.get(url + str(i)) 
-        soup = BeautifulSoup(r.text, 'html.parser')
+    container = soup.find(id="search_result_container")
+    if container is None: # e.g. an error page served instead of the results
+        raise ValueError('no search results on page ' + str(page))
 
-        for game in soup.find(id="search_result_container").find_all("a", {"class":"search_result_row ds_collapse_flag", "data-ds-appid": True}):
-            app_ids.append(game["data-ds-appid"])
+    app_ids = []
+    for game in container.find_all("a", {"class":"search_result_row ds_collapse_flag", "data-ds-appid": True}):
+        app_ids.append(game["data-ds-appid"])
 
     return app_ids
 
-def get_game_data(url):
+def get_game_data(url, session=None, limiter=None):
     """ Scrapes page for relevant game attributes
 
     Args:
         url (str): Steam URL corresponding to a single video game
+        session (requests.Session): Pooled session to reuse connections from
+        limiter (fetch.HostRateLimiter): Rate limiter shared by all fetching threads
 
     Returns:
         (str, list[str], list[str] str, str): Tuple of attributes for a single video game
     """
 
-    r = requests.get(url)
-    soup = BeautifulSoup(r.text, 'html.parser')
-    
-    # get game title
-    title = soup.find(itemprop="name")
-    if title == None: # if title not found, set to empty string
-        title = ''
-    else: # else get title text
-        title = title.get_text()
-    
-    # get genres    
-    genre_list = ['' for i in range(3)]
-    i = 0
-
-    if soup.find(id="genresAndManufacturer") != None: # error checking if any NoneTypes are returned
-        if soup.find(id="genresAndManufacturer").find("span") != None:
-            genres = soup.find(id="genresAndManufacturer").find("span").find_all("a")
-
-            for genre in genres:
-                if i == 3: # allowing three genres at most
-                    break
-                genre_list[i] = genre.get_text()
-                i += 1
-
-    # get user-defined tags (20 per game, ignore the 1st '' tag and the 21st '+' tag)
-    tag_list = ['' for i in range(20)]
-    i = 0
-
-    tags = soup.find("div", {"class":"glance_tags popular_tags"})
-    if tags != None:
-        for tag in tags:
-            if i == 20: # only 20 tags maximum
-                break
-            tag_ = tag.get_text().strip()
-            if tag_ != '+' and tag_ != '':
-                tag_list[i] = tag_
-                i += 1
-
-    # get percentage of positive reviews and total user reviews
-    review_desc = soup.find("span", {"class":"responsive_reviewdesc_short"})
-    
-    if review_desc == None: # no review description, set to empty string
-        pos_pct = ''
-        tot_rev = ''
-    else: 
-        review_desc = review_desc.get_text().strip() 
-        pos_idx = review_desc.index('%') 
-        rev_idx_start = review_desc.index('of ') + 3
-        rev_idx_end = review_desc.index(')')
-
-        pos_pct = review_desc[1:pos_idx+1] # extract percentage of positive reviews
-        tot_rev = review_desc[rev_idx_start:rev_idx_end] # extract total user reviews
-
-    return title, genre_list, tag_list, pos_pct, tot_rev
+    return parse_game_data(fetch.fetch(url, session, limiter))
+
+def get_cached_game_data(app_id, cache, base_url=STEAM_URL, session=None, limiter=None):
+    """ Scrapes a game's page and stores it in the page cache, reusing the parsed data if the page is unchanged
+
+    Args:
+        app_id (str): Steam app id of the game
+        cache (page_cache.PageCache): Cache of fetched pages and parsed game data
+        base_url (str): Store URL to scrape
+        session (requests.Session): Pooled session to reuse connections from
+        limiter (fetch.HostRateLimiter): Rate limiter shared by all fetching threads
+
+    Returns:
+        (str, list[str], list[str] str, str): Tuple of attributes for a single video game
+    """
+
+    html = fetch.fetch(base_url + '/app/' + app_id, session, limiter)
+    return cache.put(app_id, html, parse_game_data)
+
+@instrument.timed('scrape.parse')
+def parse_game_data(html):
+    """ Extracts relevant game attributes from the HTML of a game's store page, parsing only the elements that are needed
+
+    Args:
+        html (str): HTML of a Steam store page for a single video game
+
+    Returns:
+        (str, list[str], list[str] str, str): Tuple of attributes for a single video game
+    """
 
+    return extract.parse_fast(html)
+
+RAW_COLUMNS = ['Genre1', 'Genre2', 'Genre3', 'Tag1', 'Tag2', 'Tag3', 'Tag4', 'Tag5', 'Tag6', 'Tag7', 'Tag8', 'Tag9',
+                'Tag10', 'Tag11', 'Tag12', 'Tag13', 'Tag14', 'Tag15', 'Tag16', 'Tag17', 'Tag18', 'Tag19', 'Tag20', 'PosPercent', 'TotalReviews',
+                'AppId'] # app id last, it identifies a game across renames when merging
+
+@instrument.timed('scrape.write_data')
 def write_data(game_dict):  
-    """ Stores scraped raw data into an Excel file
+    """ Stores scraped raw data in the artifact store
 
     Args:
         game_dict (dict): Dictionary of game titles and attributes to be written
     """
 
     df = pd.DataFrame.from_dict(game_dict, orient='index') # convert to dataframe format
-    df.columns = ['Genre1', 'Genre2', 'Genre3', 'Tag1', 'Tag2', 'Tag3', 'Tag4', 'Tag5', 'Tag6', 'Tag7', 'Tag8', 'Tag9', 
-                'Tag10', 'Tag11', 'Tag12', 'Tag13', 'Tag14', 'Tag15', 'Tag16', 'Tag17', 'Tag18', 'Tag19', 'Tag20', 'PosPercent', 'TotalReviews'] # rename dataframe columns
+    df.columns = RAW_COLUMNS # rename dataframe columns
+
+    storage.open_store().write_table('Raw Data', df)
+
+@instrument.timed('scrape.write_rows')
+def write_rows(rows, batch_size=10000):
+    """ Streams scraped raw data into the artifact store a block of rows at a time
+
+    Unlike write_data, a title listed twice is written twice, preprocessing keeps one row per title.
+
+    Args:
+        rows (Iterable[(str, tuple)]): Title and Raw Data row of each game, in output order
+        batch_size (int): Number of rows held in memory at once
+    """
+
+    rows = iter(rows)
+
+    def batches():
+        for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+            titles, values = zip(*batch)
+            yield pd.DataFrame(list(values), index=list(titles), columns=RAW_COLUMNS)
+
+    storage.open_store().write_table_batches('Raw Data', batches())
+
+def to_row(data, app_id):
+    """ Flattens the output of get_game_data into a single row of the Raw Data sheet
+
+    Args:
+        data ((str, list[str], list[str] str, str)): Tuple of attributes for a single video game
+        app_id (str): Steam app id of the game
+
+    Returns:
+        tuple: Genres, tags, positive review percentage, total reviews and app id as separate entries
+    """
+
+    return tuple(data[1][:3]) + tuple(data[2][:20]) + (data[3], data[4], app_id) # separate genre_list and tag_list into separate entries
 
-    with pd.ExcelWriter("game_data.xlsx", engine="openpyxl", mode="a", if_sheet_exists="replace") as writer: # write to Excel
-        df.to_excel(writer, sheet_name='Raw Data')
+@instrument.timed('scrape')
+def scrape_pipeline(max_pages=22, workers=1, rate=None, base_url=STEAM_URL, cache=None, incremental=False, checkpoint=None, retry=None):
+    """ Fetches search pages and game pages concurrently, starting on a page's games as soon as the page arrives
+
+    Args:
+        max_pages (int): Number of search pages to loop through
+        workers (int): Number of pages downloaded at the same time
+        rate (float): Requests per second allowed for each host, None disables limiting
+        base_url (str): Store URL to scrape, can be pointed at a local fixture server
+        cache (page_cache.PageCache): Cache that fetched pages are stored in, None disables caching
+        incremental (bool): Skip fetching games whose cached page is still fresh and use the cached data instead
+        checkpoint (checkpoint.Checkpoint): Log that finished pages and games are streamed to instead of being kept in
+            memory, work already recorded in it by an earlier run is skipped
+        retry (checkpoint.RetryQueue): Queue that failed requests wait in before they are tried again
 
-def scrape_steam():
-    """ Loops through games on Steam, extracts relevant attributes for each game, and stores data in Excel
+    Returns:
+        dict: Dictionary of game titles and attributes, in the same order as the search results
+            (empty when a checkpoint is given, stream the games back with checkpoint.games())
     """
 
+    session = fetch.make_session(workers)
+    limiter = fetch.HostRateLimiter(rate)
+    retry = retry or RetryQueue()
+    results = {} # (page, position) -> (app id, game data), so output order does not depend on completion order, unused with a checkpoint
+    pages_done, completed = checkpoint.load_progress() if checkpoint is not None else ({}, set())
+    seen = completed # app ids already scraped or scheduled, games can appear on more than one page
+    queue = deque() # ((page, position), app id) of games waiting for a free worker
+    next_page = 1
+    max_in_flight = workers * 2 # only a bounded amount of work is queued at once, so memory stays flat
+
+    def add_page(page, app_ids):
+        for pos, app_id in enumerate(app_ids):
+            if app_id not in seen:
+                seen.add(app_id)
+                queue.append(((page, pos), app_id))
+
+    def add_game(key, app_id, data):
+        instrument.count('games_scraped')
+        if checkpoint is None:
+            results[key] = (app_id, data)
+        else:
+            checkpoint.add_game(app_id, key, data)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+
+        def submit(item, attempts):
+            kind, key, app_id = item
+            if kind == 'page':
+                future = pool.submit(get_search_page, key, base_url, session, limiter)
+            elif cache is None:
+                future = pool.submit(get_game_data, base_url + '/app/' + app_id, session, limiter) # get url for each game
+            else:
+                future = pool.submit(get_cached_game_data, app_id, cache, base_url, session, limiter)
+            pending[future] = (item, attempts + 1)
+
+        while True:
+            # fill free workers with retries whose backoff has passed, then search pages while few games are queued, then games
+            while len(pending) < max_in_flight:
+                ready = retry.pop_ready()
+                if ready is not None:
+                    submit(*ready)
+                elif len(queue) < max_in_flight and next_page <= max_pages:
+                    if next_page in pages_done: # page was fetched by an earlier run
+                        add_page(next_page, pages_done.pop(next_page))
+                    else:
+                        submit(('page', next_page, None), 0)
+                    next_page += 1
+                elif queue:
+                    key, app_id = queue.popleft()
+                    if incremental and cache.is_fresh(app_id): # only stale or new games cost a fetch
+                        data = cache.get_data(app_id)
+                        if data is not None:
+                            instrument.count('cache_hits')
+                            add_game(key, app_id, data)
+                            continue
+                    submit(('app', key, app_id), 0)
+                else:
+                    break
+
+            if not pending:
+                if len(retry) == 0:
+                    break
+                time.sleep(retry.next_delay()) # nothing to do until a retry is ready
+                continue
+
+            timeout = retry.next_delay() if len(pending) < max_in_flight else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, attempts = pending.pop(future)
+                kind, key, app_id = item
+                try:
+                    result = future.result()
+                except (requests.RequestException,) + PARSE_ERRORS as e:
+                    # a page that doesn't parse will most likely parse the same way again, so it is not retried in this run
+                    if isinstance(e, PARSE_ERRORS) or not retry.push(item, attempts):
+                        print('Failed to scrape', kind, key, '-', repr(e))
+                        if checkpoint is not None and kind == 'page':
+                            checkpoint.add_page_failure(key, repr(e))
+                        elif checkpoint is not None:
+                            checkpoint.add_failure(app_id, repr(e))
+                    continue
+
+                if kind == 'page':
+                    if checkpoint is not None:
+                        checkpoint.add_page(key, result)
+                    add_page(key, result)
+                else:
+                    add_game(key, app_id, result)
+
     game_dict = {}
-    app_ids = get_app_ids()
-    
-    for i in range(len(app_ids)): # loop through each app id
-        url = 'https://store.steampowered.com/app/' + app_ids[i] # get url for each game
-
-        data = get_game_data(url)
-        game_dict[data[0]] = (data[1][0], data[1][1], data[1][2], 
-                                data[2][0], data[2][1], data[2][2], data[2][3], data[2][4], data[2][5], data[2][6], data[2][7], data[2][8], data[2][9], 
-                                data[2][10], data[2][11], data[2][12], data[2][13], data[2][14], data[2][15], data[2][16], data[2][17], data[2][18], data[2][19], 
-                                data[3], data[4]) # separate genre_list and tag_list into separate entries
-    write_data(game_dict)
+    for key in sorted(results):
+        app_id, data = results[key]
+        game_dict[data[0]] = to_row(data, app_id)
+    return game_dict
+
+def merge_raw_data(game_dict):
+    """ Merges newly scraped games into the existing Raw Data sheet, replacing rows of games that were scraped again
+
+    Games are matched by app id, so a game that was renamed since it was last scraped replaces its old row instead
+    of being listed twice. Rows written before app ids were stored are matched by title.
+
+    Args:
+        game_dict (dict): Dictionary of game titles and attributes that were just scraped, app id last
+
+    Returns:
+        dict: Existing games followed by new games, with updated attributes for games in both
+    """
+
+    try:
+        raw_data = storage.open_store().read_table('Raw Data').set_index('Title')
+    except KeyError: # no existing data to merge into
+        return game_dict
+
+    raw_data = raw_data.reindex(columns=RAW_COLUMNS) # AppId is blank in rows written before it was stored
+
+    merged = {} # app id, or title if the row has none -> (title, row)
+    for title, row in zip(raw_data.index, raw_data.itertuples(index=False, name=None)):
+        if pd.isnull(title) == False: # skip empty rows
+            app_id = row[-1]
+            if pd.isnull(app_id):
+                app_id = None
+            else:
+                app_id = str(int(app_id)) if isinstance(app_id, float) else str(app_id) # a number when read back from Excel
+            merged[title if app_id is None else app_id] = (title, row[:-1] + (app_id,))
+
+    for title, row in game_dict.items():
+        key = title if row[-1] not in merged and title in merged else row[-1]
+        merged[key] = (title, row) # keeps the position of the row it replaces
+
+    return {title: row for title, row in merged.values()}
+
+def scrape_steam(max_pages=22, workers=1, rate=None, base_url=STEAM_URL, cache_dir=None, ttl=7 * 24 * 3600, incremental=False,
+                    checkpoint_path=None):
+    """ Loops through games on Steam, extracts relevant attributes for each game, and stores the raw data
+
+    Args:
+        max_pages (int): Number of search pages to loop through
+        workers (int): Number of pages downloaded at the same time
+        rate (float): Requests per second allowed for each host, None disables limiting
+        base_url (str): Store URL to scrape, can be pointed at a local fixture server
+        cache_dir (str): Directory of the page cache, None disables caching
+        ttl (float): Seconds before a cached page is fetched again
+        incremental (bool): Only fetch stale or new games and merge them into the existing Raw Data sheet
+        checkpoint_path (str): File that scraped games are streamed to, an interrupted run with the same file resumes
+            where it stopped and the file is removed once every page and game has been written
+    """
+
+    cache = None
+    if cache_dir is not None or incremental:
+        cache = PageCache(cache_dir or 'page_cache', ttl, parser_version=extract.PARSER_VERSION)
+
+    if checkpoint_path is None:
+        game_dict = scrape_pipeline(max_pages, workers, rate, base_url, cache, incremental)
+    else:
+        checkpoint = Checkpoint(checkpoint_path)
+        scrape_pipeline(max_pages, workers, rate, base_url, cache, incremental, checkpoint)
+        checkpoint.close()
+
+        rows = ((data[0], to_row(data, app_id)) for app_id, data in checkpoint.games())
+        game_dict = dict(rows) if incremental else None # merging needs the existing rows in memory anyway
+
+    if game_dict is None:
+        write_rows(rows) # streamed straight from the checkpoint
+    else:
+        if incremental:
+            game_dict = merge_raw_data(game_dict)
+        write_data(game_dict)
+
+    if cache is not None:
+        cache.evict()
+        cache.close()
+
+    if checkpoint_path is not None:
+        failed, failed_pages = checkpoint.failed_ids(), checkpoint.failed_pages()
+        if failed or failed_pages:
+            print(len(failed_pages), 'search pages and', len(failed), 'games failed, run again with the same checkpoint to retry them')
+        else:
+            os.remove(checkpoint_path) # run is complete, next run starts from scratch
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Scrape game data from the Steam store')
+    parser.add_argument('--pages', type=int, default=22, help='number of search pages to scrape')
+    parser.add_argument('--workers', type=int, default=1, help='number of concurrent downloads')
+    parser.add_argument('--rate', type=float, default=None, help='maximum requests per second to each host')
+    parser.add_argument('--base-url', default=STEAM_URL, help='store URL, e.g. a local fixture_server.py')
+    parser.add_argument('--cache-dir', default=None, help='directory to cache fetched pages in')
+    parser.add_argument('--ttl', type=float, default=7 * 24 * 3600, help='seconds before a cached page is stale')
+    parser.add_argument('--incremental', action='store_true', help='only fetch stale or new games and merge them into Raw Data')
+    parser.add_argument('--checkpoint', default=None, help='file to stream scraped games to and resume from')
+    args = parser.parse_args()
+
     #scrape_test() # testing purposes only
-    scrape_steam()
+    scrape_steam(args.pages, args.workers, args.rate, args.base_url, args.cache_dir, args.ttl, args.incremental, args.checkpoint)
@@ -0,0 +1,275 @@
+import argparse
+import json
+import math
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import instrument
+from engine import METRICS, RecommenderEngine, get_engine
+
+class LatencyStats:
+    """ Keeps the most recent query latencies and reports their percentiles
+    """
+
+    def __init__(self, size=10000):
+        """
+        Args:
+            size (int): Number of recent latencies kept
+        """
+
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.count += 1
+
+    def summary(self):
+        """ Gets the number of queries served and the p50/p99 latency of recent queries
+
+        Returns:
+            dict: Query count and latencies in microseconds
+        """
+
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return {'count': self.count}
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e6, 1)
+
+        return {'count': self.count, 'p50_us': percentile(0.50), 'p99_us': percentile(0.99), 'max_us': percentile(1.0)}
+
+def make_handler(engine, stats):
+    """ Creates a request handler class that answers JSON queries from a loaded engine
+
+    Args:
+        engine (engine.RecommenderEngine): Loaded engine shared by every request thread
+        stats (LatencyStats): Latency recorder for recommendation queries
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass for ThreadingHTTPServer
+    """
+
+    class RecommendHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True # headers and body are written separately, don't wait for an ACK in between
+
+        def send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def check_k(self, k):
+            """ Sends a 400 response unless k is between 1 and the number of other games
+
+            Returns:
+                bool: True if k is valid
+            """
+
+            if 1 <= k <= engine.num_games() - 1:
+                return True
+            self.send_json(400, {'error': 'k must be between 1 and ' + str(engine.num_games() - 1)})
+            return False
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+            if parts.path == '/recommend':
+                metric = query.get('metric', 'cosine')
+                if metric not in METRICS:
+                    self.send_json(400, {'error': 'metric must be one of ' + ', '.join(METRICS)})
+                    return
+                try:
+                    k = int(query.get('k', 3))
+                except ValueError:
+                    self.send_json(400, {'error': 'k must be an integer'})
+                    return
+                if not self.check_k(k):
+                    return
+
+                start = time.perf_counter()
+                matched = engine.resolve(query.get('title', '')) # stored title the query most likely meant
+                if matched is None:
+                    self.send_json(404, {'error': 'unknown title', 'title': query.get('title', '')})
+                    return
+                try:
+                    games = engine.recommend(matched, metric, k, query.get('where'))
+                except ValueError as e: # filter that can't be evaluated
+                    self.send_json(400, {'error': str(e)})
+                    return
+                stats.add(time.perf_counter() - start)
+
+                self.send_json(200, {'title': query['title'], 'matched': matched, 'metric': metric,
+                                     'results': [{'title': title, 'score': score} for title, score in games]})
+            elif parts.path == '/suggest':
+                try:
+                    limit = int(query.get('limit', 10))
+                except ValueError:
+                    self.send_json(400, {'error': 'limit must be an integer'})
+                    return
+                self.send_json(200, {'query': query.get('q', ''), 'suggestions': engine.suggest(query.get('q', ''), limit)})
+            elif parts.path == '/health':
+                self.send_json(200, {'games': engine.num_games(), 'version': engine.state['version']})
+            elif parts.path == '/stats':
+                self.send_json(200, dict(stats.summary(), cache=engine.cache.stats()))
+            elif parts.path == '/metrics':
+                data = instrument.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self.send_json(404, {'error': 'unknown path'})
+
+        def do_POST(self):
+            path = urlsplit(self.path).path
+            if path == '/recommend/profile':
+                self.recommend_profile()
+                return
+            if path != '/recommend/batch':
+                self.send_json(404, {'error': 'unknown path'})
+                return
+
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                titles = body['titles']
+                metric = body.get('metric', 'cosine')
+                k = int(body.get('k', 3))
+            except (ValueError, KeyError, TypeError):
+                self.send_json(400, {'error': 'body must be JSON like {"titles": [...], "metric": "cosine", "k": 3}'})
+                return
+            if metric not in METRICS:
+                self.send_json(400, {'error': 'metric must be one of ' + ', '.join(METRICS)})
+                return
+            if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles): # a string would be split into letters
+                self.send_json(400, {'error': 'titles must be a list of strings'})
+                return
+            if not self.check_k(k):
+                return
+
+            start = time.perf_counter()
+            batch = engine.recommend_batch(titles, metric, k)
+            stats.add(time.perf_counter() - start)
+
+            results = []
+            for title, games in zip(titles, batch):
+                results.append({'title': title, 'results': None if games is None else [{'title': game, 'score': score} for game, score in games]})
+            self.send_json(200, {'metric': metric, 'results': results})
+
+        def recommend_profile(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                liked = body['liked']
+                disliked = body.get('disliked', [])
+                metric = body.get('metric', 'cosine')
+                k = int(body.get('k', 3))
+                dislike_weight = float(body.get('dislike_weight', 1.0))
+                where = body.get('where')
+            except (ValueError, KeyError, TypeError):
+                self.send_json(400, {'error': 'body must be JSON like {"liked": [...], "disliked": [...], "metric": "cosine", "k": 3}'})
+                return
+            if metric not in METRICS:
+                self.send_json(400, {'error': 'metric must be one of ' + ', '.join(METRICS)})
+                return
+            if not isinstance(liked, list) or not isinstance(disliked, list) or not all(isinstance(title, str) for title in liked + disliked):
+                self.send_json(400, {'error': 'liked and disliked must be lists of titles'})
+                return
+            if not liked:
+                self.send_json(400, {'error': 'liked must list at least one title'})
+                return
+            if not math.isfinite(dislike_weight):
+                self.send_json(400, {'error': 'dislike_weight must be a finite number'})
+                return
+            if where is not None and not isinstance(where, str):
+                self.send_json(400, {'error': 'where must be a filter expression string'})
+                return
+            if not self.check_k(k):
+                return
+
+            start = time.perf_counter()
+            try:
+                games = engine.recommend_profile(liked, disliked, metric, k, dislike_weight, where)
+            except KeyError as e:
+                self.send_json(404, {'error': 'unknown title', 'title': e.args[0]})
+                return
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            stats.add(time.perf_counter() - start)
+            self.send_json(200, {'metric': metric, 'results': [{'title': title, 'score': score} for title, score in games]})
+
+        def log_message(self, format, *args): # queries are counted in /stats instead
+            pass
+
+    return RecommendHandler
+
+def start_server(port=8080, host='127.0.0.1', engine=None):
+    """ Starts the recommendation API on a background thread
+
+    Args:
+        port (int): Port to listen on, 0 picks a free port
+        host (str): Interface to listen on
+        engine (engine.RecommenderEngine): Engine to serve from, defaults to the shared engine
+
+    Returns:
+        (ThreadingHTTPServer, LatencyStats): Running server and its latency stats, call server.shutdown() to stop it
+    """
+
+    stats = LatencyStats()
+    server = ThreadingHTTPServer((host, port), make_handler(engine or get_engine(), stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+def refresh_loop(engine, interval):
+    """ Reloads the engine whenever the stored data is rewritten, which also drops its cached results
+
+    Args:
+        engine (engine.RecommenderEngine): Engine to keep up to date
+        interval (float): Seconds between checks
+    """
+
+    while True:
+        time.sleep(interval)
+        if engine.refresh():
+            print('Reloaded data version', engine.state['version'])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve recommendations as JSON over HTTP')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--metrics', action='store_true', help='record stage timings and counters, served at /metrics')
+    parser.add_argument('--cache-size', type=int, default=10000, help='recommendation results cached, 0 disables the cache')
+    parser.add_argument('--cache-ttl', type=float, default=None, help='seconds a cached result is kept')
+    parser.add_argument('--warm', default=None, help='file of titles, one per line, whose results are cached at startup')
+    parser.add_argument('--refresh', type=float, default=None, help='seconds between checks for rewritten data')
+    args = parser.parse_args()
+
+    if args.metrics:
+        instrument.enable()
+
+    engine = RecommenderEngine(cache_size=args.cache_size, cache_ttl=args.cache_ttl)
+    if args.warm:
+        with open(args.warm, encoding='utf-8') as fd:
+            print('Warmed', engine.warm([line.strip() for line in fd if line.strip()]), 'cached results')
+    if args.refresh:
+        threading.Thread(target=refresh_loop, args=(engine, args.refresh), daemon=True).start()
+
+    server, stats = start_server(args.port, args.host, engine)
+    print('Serving recommendations on http://{}:{}/recommend?title=...&metric=cosine&k=3'.format(args.host, server.server_address[1]))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
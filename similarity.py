@@ -1,20 +1,27 @@
+import argparse
+from collections import deque
+from concurrent import futures
+
+import numpy as np
 import pandas as pd
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
+import instrument
+import storage
+import vocabulary
+
 def write_data(sim_array, sheet):
-    """ Write the cosine/jaccard similarity matrix to Excel
+    """ Write the cosine/jaccard similarity matrix to the artifact store
 
     Args:
         sim_array (numpy.ndarray/list): Cosine/Jaccard similarity matrix 
-        sheet (string): Name of Excel sheet to write
+        sheet (string): Name of the matrix to write, e.g. 'Cosine Similarity'
     """
 
-    df = pd.DataFrame(sim_array) # convert to dataframe format
-
-    with pd.ExcelWriter("game_data.xlsx", engine="openpyxl", mode="a", if_sheet_exists="replace") as writer: # write to Excel
-        df.to_excel(writer, sheet_name=sheet)
+    storage.open_store().write_matrix(sheet, sim_array)
 
+@instrument.timed('similarity.calculate_cosine')
 def calculate_cosine(combined_data_col):
     """ Finds the cosine similarity between all games
 
@@ -43,6 +50,7 @@ def jaccard_similarity(set1, set2):
     jac_score = num/denom
     return jac_score
 
+@instrument.timed('similarity.calculate_jaccard')
 def calculate_jaccard(preprocessed_data):
     """ Finds the jaccard similarity between all games
 
@@ -53,7 +61,6 @@ def calculate_jaccard(preprocessed_data):
     game_dict = {}
     rows = preprocessed_data.shape[0]
     cols = preprocessed_data.shape[1]
-    preprocessed_data.rename(columns={'Unnamed: 0':'Title'}, inplace=True) # rename first column as Title
 
     # generate dict of sets, where each set contains attributes for a single game
     for i in range(rows):
@@ -80,7 +87,512 @@ def calculate_jaccard(preprocessed_data):
 
     write_data(jac_sim, 'Jaccard Similarity')
     
+def build_attribute_matrix(preprocessed_data):
+    """ Encodes the attributes calculate_jaccard compares as a sparse binary game x attribute matrix
+
+    Args:
+        preprocessed_data (pandas.core.frame.DataFrame): Dataframe containing attributes of each game
+
+    Returns:
+        scipy.sparse.csr_matrix: Matrix with a 1 where a game has an attribute, see vocabulary.AttributeVocabulary.attribute_matrix
+    """
+
+    return vocabulary.build_vocabulary(preprocessed_data).attribute_matrix()
+
+def jaccard_rows(matrix, rows=None, columns=None):
+    """ Calculates the jaccard similarity between selected games and all games with sparse matrix products
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Binary game x attribute matrix from build_attribute_matrix
+        rows (list[int]/numpy.ndarray/slice): Games to calculate rows for, None for every game
+        columns (numpy.ndarray): Games to compare them with, None for every game
+
+    Returns:
+        numpy.ndarray: Jaccard scores, one row per selected game and one column per compared game
+    """
+
+    sizes = np.asarray(matrix.sum(axis=1)).ravel() # number of attributes in each game's set
+    selected = matrix if rows is None else matrix[rows]
+    selected_sizes = sizes if rows is None else sizes[rows]
+    compared = matrix if columns is None else matrix[columns]
+    compared_sizes = sizes if columns is None else sizes[columns]
+
+    intersection = (selected @ compared.T).toarray() # shared attributes between each pair of games
+    union = selected_sizes[:, None] + compared_sizes[None, :] - intersection
+
+    # games without any attributes score 0 instead of dividing by zero
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+@instrument.timed('similarity.calculate_jaccard_sparse')
+def calculate_jaccard_sparse(preprocessed_data):
+    """ Finds the jaccard similarity between all games, giving the same scores as calculate_jaccard without looping over pairs
+
+    Args:
+        preprocessed_data (pandas.core.frame.DataFrame): Dataframe containing attributes of each game
+    """
+
+    write_data(jaccard_rows(build_attribute_matrix(preprocessed_data)), 'Jaccard Similarity')
+
+def cosine_rows(matrix, rows=None, columns=None):
+    """ Calculates the cosine similarity between selected games and all games
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Normalized count matrix from vocabulary.AttributeVocabulary.count_matrix
+        rows (list[int]/numpy.ndarray/slice): Games to calculate rows for, None for every game
+        columns (numpy.ndarray): Games to compare them with, None for every game
+
+    Returns:
+        numpy.ndarray: Cosine scores, one row per selected game and one column per compared game
+    """
+
+    selected = matrix if rows is None else matrix[rows]
+    compared = matrix if columns is None else matrix[columns]
+    return (selected @ compared.T).toarray()
+
+def pair_scores(matrix, rows, columns, metric):
+    """ Calculates the similarity of single pairs of games, e.g. of each game with each game in its neighbor list
+
+    The products are summed in the same order as the sparse products in cosine_rows and jaccard_rows, so the scores
+    are identical to theirs bit for bit.
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Normalized count matrix for cosine, binary attribute matrix for jaccard
+        rows (numpy.ndarray): First game of each pair
+        columns (numpy.ndarray): Second game of each pair, same shape as rows
+        metric (str): 'cosine' or 'jaccard'
+
+    Returns:
+        numpy.ndarray: Score of each pair, same shape as rows
+    """
+
+    shape = np.shape(rows)
+    rows, columns = np.ravel(rows), np.ravel(columns)
+    products = matrix[rows].multiply(matrix[columns]).tocsr()
+    intersection = products @ np.ones(matrix.shape[1]) # sums each row in index order, like a sparse product
+    if metric == 'jaccard':
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+        union = sizes[rows] + sizes[columns] - intersection
+        intersection = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+    return intersection.reshape(shape)
+
+def select_top_k(scores, row_ids, k):
+    """ Picks the k highest scores in each row, leaving out each game's score with itself
+
+    Games with equal scores are ordered by descending index, the same order find_recommendations sorts them in.
+
+    Args:
+        scores (numpy.ndarray): Block of similarity rows, one column per game
+        row_ids (numpy.ndarray): Game index of each row in the block
+        k (int): Number of neighbors to keep
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): Indices and scores of each row's neighbors, best first
+    """
+
+    scores = scores.astype(np.float64) # copy, the block is modified below
+    scores[np.arange(len(row_ids)), row_ids] = -np.inf # ignore comparing game to itself
+
+    # every score at least as high as the kth best is a candidate, ties at the cutoff can give a row more than k
+    kth = np.partition(scores, -k, axis=1)[:, -k]
+    rows, cols = np.nonzero(scores >= kth[:, None])
+    order = np.lexsort((-cols, -scores[rows, cols], rows)) # by row, then score descending, then index descending
+    rows, cols = rows[order], cols[order]
+
+    first = np.searchsorted(rows, np.arange(len(row_ids))) # position of each row's best candidate
+    take = (first[:, None] + np.arange(k)).ravel()
+    indices = cols[take].reshape(len(row_ids), k)
+    return indices.astype(np.int32), scores[np.arange(len(row_ids))[:, None], indices].astype(np.float32)
+
+def score_columns(matrix, row, columns, metric):
+    """ Calculates the similarity between one game and selected games, reading only the selected games' attributes
+
+    Slicing rows out of a sparse matrix costs more than scoring them when only a few games are selected, so the
+    selected rows' entries are gathered straight from the CSR arrays instead.
+
+    Args:
+        matrix (scipy.sparse.csr_matrix): Normalized count matrix for cosine, binary attribute matrix for jaccard
+        row (int): Game to compare with
+        columns (numpy.ndarray): Games to compare it with
+        metric (str): 'cosine' or 'jaccard'
+
+    Returns:
+        numpy.ndarray: Score of each selected game
+    """
+
+    query = np.zeros(matrix.shape[1])
+    query[matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]] = matrix.data[matrix.indptr[row]:matrix.indptr[row + 1]]
+
+    starts = matrix.indptr[columns]
+    lengths = matrix.indptr[columns + 1] - starts
+    offsets = np.cumsum(lengths) - lengths
+    positions = np.repeat(starts - offsets, lengths) + np.arange(lengths.sum()) # entries of the selected rows
+    dots = np.bincount(np.repeat(np.arange(len(columns)), lengths), weights=matrix.data[positions] * query[matrix.indices[positions]],
+                       minlength=len(columns))
+    if metric == 'cosine':
+        return dots
+
+    union = (matrix.indptr[row + 1] - matrix.indptr[row]) + lengths - dots # binary rows, so entries are attributes
+    return np.divide(dots, union, out=np.zeros_like(dots), where=union > 0)
+
+def select_top_k_columns(scores, columns, k):
+    """ Picks the k highest scores of one row that was only scored for some games
+
+    Args:
+        scores (numpy.ndarray): Score of each scored game
+        columns (numpy.ndarray): Game index of each score
+        k (int): Number of neighbors to keep
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): Indices and scores of up to k games, best first, ties in the order select_top_k gives
+    """
+
+    if len(scores) > k: # every score at least as high as the kth best is a candidate
+        keep = np.nonzero(scores >= np.partition(scores, -k)[-k])[0]
+        scores, columns = scores[keep], columns[keep]
+    order = np.lexsort((-columns, -scores))[:k] # score descending, then index descending
+    return columns[order].astype(np.int32), scores[order].astype(np.float32)
+
+def build_top_k(score_rows, n, k=10, block_size=1000):
+    """ Builds a top-k neighbor index one block of rows at a time, so the full n x n matrix is never held in memory
+
+    Args:
+        score_rows (Callable[[slice], numpy.ndarray]): Function returning the similarity rows of a block of games
+        n (int): Number of games
+        k (int): Number of neighbors to keep for each game
+        block_size (int): Number of rows scored at once, peak memory is about block_size x n scores
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): n x k neighbor indices and n x k scores, best first
+    """
+
+    k = min(k, n - 1)
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        indices[start:end], scores[start:end] = select_top_k(score_rows(slice(start, end)), np.arange(start, end), k)
+
+    return indices, scores
+
+_block_matrices = {} # metric -> feature matrix scored by score_block, set in each pool process by init_worker
+
+def init_worker(matrices):
+    """ Gives a pool worker the feature matrices to score blocks against, sent once instead of with every block
+
+    Args:
+        matrices (dict): Metric -> count matrix for 'cosine' and attribute matrix for 'jaccard'
+    """
+
+    _block_matrices.update(matrices)
+
+def score_block(metric, start, end, k=None):
+    """ Scores one block of rows in a pool worker
+
+    Args:
+        metric (str): 'cosine' or 'jaccard'
+        start (int): First game of the block
+        end (int): Game after the last one of the block
+        k (int): Number of neighbors to keep for each game, None to return the full rows
+
+    Returns:
+        numpy.ndarray/(numpy.ndarray, numpy.ndarray): Similarity rows, or their top-k indices and scores
+    """
+
+    matrix = _block_matrices[metric]
+    scores = cosine_rows(matrix, slice(start, end)) if metric == 'cosine' else jaccard_rows(matrix, slice(start, end))
+    return scores if k is None else select_top_k(scores, np.arange(start, end), k)
+
+def map_blocks(matrices, metric, n, k=None, block_size=1000, workers=1, processes=False):
+    """ Scores every block of rows on several cores, yielding the results in row order as they finish
+
+    Sparse products, partitions and sorts release the GIL, so threads already run blocks in parallel. Processes
+    avoid the GIL entirely at the cost of copying the feature matrices to each worker once. At most two blocks per
+    worker are in flight, so finished blocks are never piling up in memory while the caller writes them out.
+
+    Args:
+        matrices (dict): Metric -> feature matrix, see init_worker
+        metric (str): 'cosine' or 'jaccard'
+        n (int): Number of games
+        k (int): Number of neighbors to keep for each game, None for full similarity rows
+        block_size (int): Number of rows scored at once, peak memory is about workers x 2 x block_size x n scores
+        workers (int): Number of threads or processes
+        processes (bool): Use a process pool instead of threads
+
+    Yields:
+        numpy.ndarray/(numpy.ndarray, numpy.ndarray): Result of score_block for each block, in order
+    """
+
+    blocks = [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+    instrument.count('blocks_scored', len(blocks))
+    if workers <= 1:
+        init_worker(matrices)
+        for start, end in blocks:
+            yield score_block(metric, start, end, k)
+        return
+
+    if processes:
+        executor = futures.ProcessPoolExecutor(workers, initializer=init_worker, initargs=(matrices,))
+    else:
+        init_worker(matrices) # threads share this process's matrices
+        executor = futures.ThreadPoolExecutor(workers)
+
+    with executor:
+        pending = deque()
+        for start, end in blocks:
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+            pending.append(executor.submit(score_block, metric, start, end, k))
+        while pending:
+            yield pending.popleft().result()
+
+@instrument.timed('similarity.features')
+def feature_matrices(vocab):
+    """ Builds the matrices both metrics are calculated from
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Attribute ids of each game
+
+    Returns:
+        dict: 'cosine' -> normalized count matrix, 'jaccard' -> binary attribute matrix
+    """
+
+    return {'cosine': vocab.count_matrix(), 'jaccard': vocab.attribute_matrix()}
+
+def write_neighbors(metric, indices, scores):
+    """ Writes a top-k neighbor index to the artifact store
+
+    Args:
+        metric (str): 'cosine' or 'jaccard'
+        indices (numpy.ndarray): n x k neighbor indices
+        scores (numpy.ndarray): n x k neighbor scores
+    """
+
+    store = storage.open_store()
+    index_name, score_name = storage.NEIGHBORS[metric]
+    store.write_array(index_name, indices)
+    store.write_array(score_name, scores)
+
+def write_neighbor_games(titles, digests, removed):
+    """ Writes which game each row of the neighbor indexes belongs to
+
+    Args:
+        titles (list[str]): Title of each row
+        digests (numpy.ndarray): Attribute digest of each row, from vocabulary.AttributeVocabulary.digests
+        removed (numpy.ndarray): True for rows of games that are no longer in the data
+    """
+
+    storage.open_store().write_table(storage.NEIGHBOR_GAMES, pd.DataFrame({'Digest': digests, 'Removed': removed}, index=pd.Index(titles)))
+
+def calculate_neighbors(vocab, titles, k=10, block_size=1000, workers=1, processes=False):
+    """ Finds the k most similar games to each game by cosine and by jaccard similarity, without building n x n matrices
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Attribute ids of each game, both metrics are calculated from them
+        titles (list[str]): Title of each game
+        k (int): Number of neighbors to keep for each game
+        block_size (int): Number of rows scored at once
+        workers (int): Number of blocks scored in parallel
+        processes (bool): Score blocks in a process pool instead of threads
+    """
+
+    n = vocab.num_games
+    k = min(k, n - 1)
+    matrices = feature_matrices(vocab)
+
+    results = {}
+    for metric in matrices:
+        with instrument.span('similarity.' + metric):
+            indices = np.empty((n, k), dtype=np.int32)
+            scores = np.empty((n, k), dtype=np.float32)
+            for start, (block_indices, block_scores) in zip(range(0, n, block_size), map_blocks(matrices, metric, n, k, block_size, workers, processes)):
+                indices[start:start + len(block_indices)], scores[start:start + len(block_scores)] = block_indices, block_scores
+            results[metric] = (indices, scores)
+
+    with storage.open_store().run(): # both indexes and their rows are published under one data version
+        for metric, (indices, scores) in results.items():
+            write_neighbors(metric, indices, scores)
+        write_neighbor_games(titles, vocab.digests(), np.zeros(n, dtype=bool))
+
+def calculate_dense(vocab, block_size=1000, workers=1, processes=False):
+    """ Writes the full n x n cosine and jaccard similarity matrices, scoring row blocks in parallel
+
+    Gives the same matrices as calculate_cosine and calculate_jaccard. Each block is written to the store as soon as
+    it is finished, so the whole matrix is never held in memory.
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Attribute ids of each game
+        block_size (int): Number of rows scored at once
+        workers (int): Number of blocks scored in parallel
+        processes (bool): Score blocks in a process pool instead of threads
+    """
+
+    store = storage.open_store()
+    matrices = feature_matrices(vocab)
+    with store.run():
+        for metric, sheet in (('cosine', 'Cosine Similarity'), ('jaccard', 'Jaccard Similarity')):
+            with instrument.span('similarity.' + metric + '_dense'):
+                store.write_matrix_blocks(sheet, vocab.num_games, map_blocks(matrices, metric, vocab.num_games, None, block_size, workers, processes))
+
+def merge_top_k(indices, scores, new_indices, new_scores, k):
+    """ Merges extra candidates into existing neighbor lists, keeping the same order select_top_k gives
+
+    Scores are compared at the precision they are given in. Pass float64 scores, as select_top_k ranks them, and cast
+    only when storing, or games whose scores are equal at float32 may be ordered differently than in a full build.
+
+    Args:
+        indices (numpy.ndarray): Current neighbor indices, one row per game
+        scores (numpy.ndarray): Current neighbor scores
+        new_indices (numpy.ndarray): Candidate indices, one row per game, none already in that game's list
+        new_scores (numpy.ndarray): Candidate scores
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): Indices and scores of the k best of both, best first
+    """
+
+    all_indices = np.hstack([indices, new_indices])
+    all_scores = np.hstack([scores, new_scores])
+    order = np.lexsort((-all_indices, -all_scores))[:, :k] # score descending, then index descending
+    rows = np.arange(len(all_indices))[:, None]
+    return all_indices[rows, order].astype(np.int32), all_scores[rows, order]
+
+@instrument.timed('similarity.update')
+def update_neighbors(vocab, titles, block_size=1000):
+    """ Updates the stored neighbor indexes for games added, changed or removed since they were last written
+
+    Rows keep their place, new games get new rows at the end, and removed games are tombstoned: their rows stay but
+    they are never anyone's neighbor. Only these games' similarity rows are scored, which also gives their column
+    of every other game's row since both metrics are symmetric. Games that had a changed or removed neighbor are
+    rescored in full, because a game outside their list may now belong in it. With d changed games this costs about
+    O(d * k * n) instead of O(n^2). The neighbors and scores are identical to rebuilding from scratch in the same row
+    order: lists that gain candidates are merged at float64, with their current scores recalculated by pair_scores,
+    and only cast to float32 when stored.
+
+    Args:
+        vocab (vocabulary.AttributeVocabulary): Attribute ids of each game in the Preprocessed Data table
+        titles (list[str]): Title of each game in the Preprocessed Data table
+        block_size (int): Number of rows scored at once
+
+    Returns:
+        dict: Number of games added, changed and removed, and of rows rescored in full
+    """
+
+    store = storage.open_store()
+    games = store.read_table(storage.NEIGHBOR_GAMES)
+    old_titles = games['Title'].tolist()
+    old_rows = {title: row for row, title in enumerate(old_titles)}
+    was_removed = games['Removed'].to_numpy(dtype=bool)
+
+    # map every game in the new data to its row, adding rows for new titles
+    positions = np.full(len(old_titles), -1, dtype=np.int64) # position in the new data of each row's game, -1 if removed
+    added = [title for title in titles if title not in old_rows]
+    all_titles = old_titles + added
+    new_rows = {title: row for row, title in enumerate(all_titles)}
+    positions = np.concatenate([positions, np.full(len(added), -1, dtype=np.int64)])
+    positions[[new_rows[title] for title in titles]] = np.arange(len(titles))
+
+    n = len(all_titles)
+    removed = positions < 0
+    digests = np.zeros(n, dtype=np.int64)
+    digests[~removed] = vocab.digests()[positions[~removed]]
+    old_digests = np.concatenate([games['Digest'].to_numpy(dtype=np.int64), np.zeros(len(added), dtype=np.int64)])
+    old_removed = np.concatenate([was_removed, np.ones(len(added), dtype=bool)]) # a new game counts as previously removed
+
+    dirty = (removed != old_removed) | (~removed & (digests != old_digests))
+    dirty_rows = np.nonzero(dirty & ~removed)[0] # games whose similarity rows must be scored
+    summary = {'added': len(added), 'changed': int(np.sum(dirty & ~removed & ~old_removed)),
+               'removed': int(np.sum(dirty & removed)), 'rescored': 0}
+    if not dirty.any():
+        return summary
+
+    ordered = vocab.take(positions) # games in row order, tombstones without attributes
+    features = {'cosine': (ordered.count_matrix(), cosine_rows), 'jaccard': (ordered.attribute_matrix(), jaccard_rows)}
+    results = {}
+
+    for metric, (matrix, rows_function) in features.items():
+        index_name, score_name = storage.NEIGHBORS[metric]
+        old_indices = np.asarray(store.read_array(index_name, mmap=False))
+        old_scores = np.asarray(store.read_array(score_name, mmap=False))
+        k = old_indices.shape[1]
+
+        indices = np.full((n, k), -1, dtype=np.int32)
+        scores = np.zeros((n, k), dtype=np.float32)
+        indices[:len(old_indices)], scores[:len(old_scores)] = old_indices, old_scores
+
+        def score_rows(rows):
+            block = rows_function(matrix, rows)
+            block[:, removed] = -np.inf # tombstones are never a neighbor
+            return block
+
+        # rows with a changed or removed neighbor, their lists may need games from outside the list
+        rescore = np.zeros(n, dtype=bool)
+        rescore[dirty_rows] = True
+        rescore[:len(old_indices)] |= (dirty[np.maximum(old_indices, 0)] & (old_indices >= 0)).any(axis=1)
+        rescore &= ~removed
+        merge = ~rescore & ~removed # rows whose list stays valid, they only gain candidates from the dirty games
+        merge_rows = np.nonzero(merge)[0]
+        exact = np.full((n, k), np.nan) # float64 scores of merged lists, the stored float32 ones can't break ties like a full build
+        cutoffs = np.nextafter(scores[merge_rows, -1], np.float32(-np.inf)).astype(np.float64) # below the kth score at any precision
+
+        for start in range(0, len(dirty_rows), block_size):
+            block = dirty_rows[start:start + block_size]
+            block_scores = score_rows(block)
+            indices[block], scores[block] = select_top_k(block_scores, block, k)
+
+            candidates = block_scores[:, merge_rows].T # column of each merged row, by symmetry
+            gains = np.nonzero(candidates.max(axis=1) >= cutoffs)[0] # lists without a better candidate stay as they are
+            rows = merge_rows[gains]
+            missing = rows[np.isnan(exact[rows, 0])] # lists merged for the first time
+            if len(missing):
+                neighbors = indices[missing]
+                exact[missing] = np.where(neighbors >= 0, pair_scores(matrix, np.repeat(missing[:, None], k, axis=1), np.maximum(neighbors, 0), metric), -np.inf)
+
+            indices[rows], exact[rows] = merge_top_k(indices[rows], exact[rows], np.broadcast_to(block, (len(rows), len(block))), candidates[gains], k)
+            scores[rows] = exact[rows] # stored at float32
+            cutoffs[gains] = exact[rows, -1]
+
+        other_rows = np.nonzero(rescore & ~dirty)[0]
+        for start in range(0, len(other_rows), block_size):
+            block = other_rows[start:start + block_size]
+            indices[block], scores[block] = select_top_k(score_rows(block), block, k)
+
+        indices[removed], scores[removed] = -1, 0 # tombstoned rows are never looked up
+        results[metric] = (indices, scores)
+        summary['rescored'] += len(dirty_rows) + len(other_rows)
+
+    with store.run(): # both indexes and their rows are published under one data version
+        for metric, (indices, scores) in results.items():
+            write_neighbors(metric, indices, scores)
+        write_neighbor_games(all_titles, digests, removed)
+    return summary
+
 if __name__ == "__main__":
-    preprocessed_data = pd.read_excel('game_data.xlsx', sheet_name='Preprocessed Data')
-    calculate_cosine(preprocessed_data['CombinedData'])
-    calculate_jaccard(preprocessed_data)
+    parser = argparse.ArgumentParser(description='Calculate similarity between all games')
+    parser.add_argument('-k', type=int, default=10, help='number of neighbors kept for each game')
+    parser.add_argument('--block-size', type=int, default=1000, help='rows scored at once')
+    parser.add_argument('--dense', action='store_true', help='also write the full n x n similarity matrices')
+    parser.add_argument('--incremental', action='store_true', help='only rescore games added, changed or removed since the last run')
+    parser.add_argument('--workers', type=int, default=1, help='row blocks scored in parallel')
+    parser.add_argument('--processes', action='store_true', help='score blocks in a process pool instead of threads')
+    args = parser.parse_args()
+
+    store = storage.open_store()
+    vocab = vocabulary.load_vocabulary(store)
+    titles = store.read_table('Preprocessed Data', columns=['Title'])['Title'].tolist()
+    summary = None
+    if args.incremental:
+        try:
+            summary = update_neighbors(vocab, titles, args.block_size)
+        except KeyError: # nothing stored to update yet
+            pass
+
+    if summary is None:
+        calculate_neighbors(vocab, titles, args.k, args.block_size, args.workers, args.processes)
+    else:
+        print(summary)
+    if args.dense:
+        calculate_dense(vocab, args.block_size, args.workers, args.processes)
+
+    import engine # engine imports this module, so only the script needs it
+
+    engine.RecommenderEngine(store).write_snapshot() # lets the recommender windows start without reading the store
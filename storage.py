@@ -0,0 +1,439 @@
+import argparse
+import contextlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+EXCEL_FILE = 'game_data.xlsx'
+DATA_DIR = 'data'
+
+TABLES = ['Raw Data', 'Preprocessed Data'] # artifacts stored as tables, indexed by game title
+MATRICES = ['Cosine Similarity', 'Jaccard Similarity'] # artifacts stored as n x n arrays
+NEIGHBORS = {'cosine': ('Cosine Neighbors', 'Cosine Neighbor Scores'), # top-k index of each metric, n x k arrays of game
+             'jaccard': ('Jaccard Neighbors', 'Jaccard Neighbor Scores')} # indices and their similarity scores
+NEIGHBOR_GAMES = 'Neighbor Games' # title of each neighbor index row, with tombstones for games removed by incremental updates
+VOCABULARY = ('Attribute Vocabulary', 'Attribute Offsets', 'Attribute Ids') # id -> attribute table, then each game's ids, CSR-style
+FACETS = 'Facet Bitsets' # packed bitset of the games that have each vocabulary attribute
+
+def file_name(name):
+    """ Converts an artifact name such as 'Raw Data' into a file name stem such as 'raw_data'
+    """
+
+    return name.lower().replace(' ', '_')
+
+def table_columns(df):
+    """ Turns a table indexed by game title into plain columns, the way tables are stored in Parquet
+
+    Args:
+        df (pandas.core.frame.DataFrame): Table indexed by game title
+
+    Returns:
+        pandas.core.frame.DataFrame: Table with the titles in the first column and blank cells as None
+    """
+
+    df = df.rename_axis(df.index.name or 'Title').reset_index() # tables of games are indexed by an unnamed title index
+    for col in df.columns: # empty strings are blank cells in Excel, keep the same meaning here
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].mask(df[col] == '', None)
+    return df
+
+class ExcelStore:
+    """ Reads the sheets of an Excel workbook in the original game_data.xlsx layout, see BinaryStore.import_excel
+    """
+
+    def __init__(self, path=EXCEL_FILE):
+        """
+        Args:
+            path (str): Excel workbook to read
+        """
+
+        self.path = path
+
+    @instrument.timed('excel.read_table')
+    def read_table(self, name, columns=None):
+        """ Reads a table, with the game titles in the 'Title' column
+
+        Args:
+            name (str): Sheet name, e.g. 'Raw Data'
+            columns (list[str]): Columns to return, None for all
+
+        Raises:
+            KeyError: If the workbook has no such sheet
+
+        Returns:
+            pandas.core.frame.DataFrame: Table with one row per game
+        """
+
+        try:
+            df = pd.read_excel(self.path, sheet_name=name)
+        except (FileNotFoundError, ValueError):
+            raise KeyError(name)
+
+        df.rename(columns={'Unnamed: 0':'Title'}, inplace=True) # rename first column as Title
+        return df if columns is None else df[columns]
+
+    @instrument.timed('excel.read_matrix')
+    def read_matrix(self, name):
+        """ Reads a similarity matrix
+
+        Args:
+            name (str): Sheet name, e.g. 'Cosine Similarity'
+
+        Raises:
+            KeyError: If the workbook has no such sheet
+
+        Returns:
+            numpy.ndarray: Matrix with one row and column per game
+        """
+
+        return self.read_table(name).drop(columns='Title').to_numpy()
+
+class BinaryStore:
+    """ Stores tables as Parquet files and matrices as .npy files that are memory-mapped when read
+
+    A manifest.json in the directory lists every artifact and carries a data version, a new random stamp that
+    is written whenever any artifact changes, so readers can tell when cached results are out of date. Artifacts
+    written inside a run() block share one version, which is only published once the block ends.
+    """
+
+    def __init__(self, path=DATA_DIR):
+        """
+        Args:
+            path (str): Directory holding the artifacts, created if it does not exist
+        """
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._pending = None # artifact name -> manifest entry, written so far by the current run() block
+        self._depth = 0
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def manifest(self):
+        """ Reads the manifest
+
+        Returns:
+            dict: Data version and a description of each artifact
+        """
+
+        try:
+            with open(self._file('manifest.json'), encoding='utf-8') as fd:
+                return json.load(fd)
+        except FileNotFoundError:
+            return {'version': None, 'artifacts': {}}
+
+    def version(self):
+        """ Gets a stamp that changes whenever the data is rewritten
+
+        Returns:
+            str: Data version from the manifest
+        """
+
+        return self.manifest()['version']
+
+    @contextlib.contextmanager
+    def run(self):
+        """ Groups the artifacts written inside the block under one data version
+
+        The manifest is written once when the block ends, so the data version only changes after every artifact
+        of the run has been written, and a reader that reloads on a new version never reloads halfway through a
+        run. Blocks can be nested, the outermost one publishes.
+        """
+
+        if self._depth == 0:
+            self._pending = {}
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                pending, self._pending = self._pending, None
+                if pending:
+                    self._publish(pending)
+
+    def _entry(self, name):
+        """ Gets the manifest entry of an artifact, including ones written by the current run() but not yet published
+
+        Raises:
+            KeyError: If the artifact has not been written
+        """
+
+        entry = (self._pending or {}).get(name) or self.manifest()['artifacts'].get(name)
+        if entry is None:
+            raise KeyError(name)
+        return entry
+
+    def _record(self, name, entry):
+        """ Adds an artifact to the manifest, right away with a new data version, or at the end of the current run()
+        """
+
+        entry['written_at'] = time.time()
+        if self._pending is not None:
+            self._pending[name] = entry
+        else:
+            self._publish({name: entry})
+
+    def _publish(self, entries):
+        """ Writes artifacts to the manifest under one new data version
+        """
+
+        manifest = self.manifest()
+        manifest['version'] = uuid.uuid4().hex
+        for name, entry in entries.items():
+            entry['version'] = manifest['version'] # the run that wrote each artifact
+            manifest['artifacts'][name] = entry
+
+        tmp = self._file('manifest.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as fd:
+            json.dump(manifest, fd, indent=2)
+        os.replace(tmp, self._file('manifest.json')) # readers never see a partially written manifest
+
+    @instrument.timed('binary.write_table')
+    def write_table(self, name, df):
+        """ Writes a table indexed by game title
+
+        Args:
+            name (str): Artifact name, e.g. 'Raw Data'
+            df (pandas.core.frame.DataFrame): Table to write
+        """
+
+        df = table_columns(df)
+        file = file_name(name) + '.parquet'
+        df.to_parquet(self._file(file + '.tmp'), index=False)
+        os.replace(self._file(file + '.tmp'), self._file(file))
+        self._record(name, {'kind': 'table', 'file': file, 'rows': len(df), 'columns': list(df.columns)})
+
+    @instrument.timed('binary.write_table')
+    def write_table_batches(self, name, batches):
+        """ Writes a table that arrives a block of rows at a time, only the block being written is held in memory
+
+        Args:
+            name (str): Artifact name, e.g. 'Raw Data'
+            batches (Iterable[pandas.core.frame.DataFrame]): Consecutive blocks of the table, with the same columns
+        """
+
+        import pyarrow as pa # only needed for streaming, pandas writes whole tables itself
+        import pyarrow.parquet as pq
+
+        file = file_name(name) + '.parquet'
+        writer = None
+        rows = 0
+        for df in batches:
+            df = table_columns(df)
+            if writer is None:
+                # a column that is blank throughout the first block holds text like every other column of a game table
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema],
+                                    metadata=schema.metadata)
+                writer = pq.ParquetWriter(self._file(file + '.tmp'), schema)
+                columns = list(df.columns)
+            writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+            rows += len(df)
+
+        if writer is None: # no rows at all
+            self.write_table(name, pd.DataFrame())
+            return
+        writer.close()
+        os.replace(self._file(file + '.tmp'), self._file(file))
+        self._record(name, {'kind': 'table', 'file': file, 'rows': rows, 'columns': columns})
+
+    @instrument.timed('binary.read_table')
+    def read_table(self, name, columns=None):
+        """ Reads a table, with the game titles in the 'Title' column
+
+        Args:
+            name (str): Artifact name, e.g. 'Raw Data'
+            columns (list[str]): Columns to return, None for all, only these columns are read from disk
+
+        Raises:
+            KeyError: If the table has not been written
+
+        Returns:
+            pandas.core.frame.DataFrame: Table with one row per game
+        """
+
+        entry = self._entry(name)
+        return pd.read_parquet(self._file(entry['file']), columns=columns)
+
+    def read_batches(self, name, batch_size=10000):
+        """ Reads a table a block of rows at a time, only one block is held in memory
+
+        Args:
+            name (str): Artifact name, e.g. 'Raw Data'
+            batch_size (int): Number of rows in each block
+
+        Raises:
+            KeyError: If the table has not been written
+
+        Yields:
+            pandas.core.frame.DataFrame: Consecutive blocks of the table
+        """
+
+        import pyarrow.parquet as pq # only needed for streaming, pandas reads whole tables itself
+
+        entry = self._entry(name)
+
+        start = 0
+        for batch in pq.ParquetFile(self._file(entry['file'])).iter_batches(batch_size):
+            yield batch.to_pandas().set_axis(range(start, start + batch.num_rows)) # row labels continue across blocks
+            start += batch.num_rows
+
+    @instrument.timed('binary.write_matrix')
+    def write_matrix(self, name, array):
+        """ Writes a similarity matrix
+
+        Args:
+            name (str): Artifact name, e.g. 'Cosine Similarity'
+            array (numpy.ndarray/list): Matrix to write
+        """
+
+        self.write_array(name, np.asarray(array, dtype=np.float64))
+
+    def write_matrix_blocks(self, name, n, blocks):
+        """ Writes a similarity matrix that arrives a block of rows at a time, straight into a memory-mapped file
+
+        Only the block being written is held in memory, so matrices larger than memory can be written.
+
+        Args:
+            name (str): Artifact name, e.g. 'Cosine Similarity'
+            n (int): Number of games, the matrix is n x n
+            blocks (Iterable[numpy.ndarray]): Consecutive blocks of rows
+        """
+
+        file = file_name(name) + '.npy'
+        matrix = np.lib.format.open_memmap(self._file(file + '.tmp'), mode='w+', dtype=np.float64, shape=(n, n))
+        start = 0
+        for block in blocks:
+            matrix[start:start + len(block)] = block
+            start += len(block)
+        matrix.flush()
+        del matrix
+
+        os.replace(self._file(file + '.tmp'), self._file(file))
+        self._record(name, {'kind': 'array', 'file': file, 'shape': [n, n], 'dtype': 'float64'})
+
+    @instrument.timed('binary.read_matrix')
+    def read_matrix(self, name, mmap=True):
+        """ Reads a similarity matrix
+
+        Args:
+            name (str): Artifact name, e.g. 'Cosine Similarity'
+            mmap (bool): Map the file into memory instead of reading it, rows are only loaded when accessed
+
+        Raises:
+            KeyError: If the matrix has not been written
+
+        Returns:
+            numpy.ndarray: Matrix with one row and column per game
+        """
+
+        return self.read_array(name, mmap)
+
+    @instrument.timed('binary.write_array')
+    def write_array(self, name, array):
+        """ Writes an array of any dtype, e.g. a top-k neighbor index
+
+        Args:
+            name (str): Artifact name, e.g. 'Cosine Neighbors'
+            array (numpy.ndarray): Array to write
+        """
+
+        file = file_name(name) + '.npy'
+        with open(self._file(file + '.tmp'), 'wb') as fd:
+            np.save(fd, array)
+        os.replace(self._file(file + '.tmp'), self._file(file))
+        self._record(name, {'kind': 'array', 'file': file, 'shape': list(array.shape), 'dtype': str(array.dtype)})
+
+    @instrument.timed('binary.read_array')
+    def read_array(self, name, mmap=True):
+        """ Reads an array written by write_array or write_matrix
+
+        Args:
+            name (str): Artifact name, e.g. 'Cosine Neighbors'
+            mmap (bool): Map the file into memory instead of reading it, data is only loaded when accessed
+
+        Raises:
+            KeyError: If the array has not been written
+
+        Returns:
+            numpy.ndarray: Array as it was written
+        """
+
+        entry = self._entry(name)
+        return np.load(self._file(entry['file']), mmap_mode='r' if mmap else None)
+
+    def export_excel(self, path=EXCEL_FILE):
+        """ Writes every artifact to an Excel workbook in the original game_data.xlsx layout
+
+        Args:
+            path (str): Workbook to create or overwrite
+        """
+
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            for name, entry in self.manifest()['artifacts'].items():
+                if entry['kind'] == 'table':
+                    table = self.read_table(name)
+                    index = table.columns[0] # 'Title', or the index name the table was written with
+                    table.set_index(index).rename_axis(None if index == 'Title' else index).to_excel(writer, sheet_name=name)
+                else:
+                    pd.DataFrame(self.read_array(name, mmap=False)).to_excel(writer, sheet_name=name)
+
+    def import_excel(self, path=EXCEL_FILE):
+        """ Copies every sheet of an Excel workbook in the game_data.xlsx layout into the store
+
+        Args:
+            path (str): Workbook to read
+        """
+
+        excel = ExcelStore(path)
+        sheets = pd.ExcelFile(path).sheet_names
+        with self.run():
+            for name in TABLES:
+                if name in sheets:
+                    self.write_table(name, excel.read_table(name).set_index('Title'))
+            for name in MATRICES:
+                if name in sheets:
+                    self.write_matrix(name, excel.read_matrix(name))
+
+_stores = {} # directory -> the BinaryStore open_store returns for it
+
+def open_store():
+    """ Opens the store every stage reads and writes, the binary store in data/
+
+    The first time data/ is opened without a manifest, game_data.xlsx is imported into it if it exists, so a
+    checkout that only has the workbook works straight away. Otherwise the workbook is only read or written by an
+    explicit import or export. Every call in a process gets the same store, so a run() block covers the artifacts
+    written through it by every stage of that process.
+
+    Returns:
+        BinaryStore: Artifact store
+    """
+
+    key = os.path.abspath(DATA_DIR)
+    store = _stores.get(key)
+    if store is None:
+        store = _stores[key] = BinaryStore(DATA_DIR)
+        if store.version() is None and os.path.exists(EXCEL_FILE):
+            print('Importing {} into {}/, this is only done once'.format(EXCEL_FILE, DATA_DIR))
+            store.import_excel(EXCEL_FILE)
+    return store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert between game_data.xlsx and the binary artifact store')
+    parser.add_argument('command', choices=['import', 'export'], help='import: Excel -> data/, export: data/ -> Excel')
+    parser.add_argument('--excel', default=EXCEL_FILE, help='Excel workbook to import from or export to')
+    args = parser.parse_args()
+
+    store = BinaryStore(DATA_DIR)
+    if args.command == 'import':
+        store.import_excel(args.excel)
+    else:
+        store.export_excel(args.excel)
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # modules live at the repository root
+
+import storage
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """ Empty binary store in a temporary data/ that every stage's open_store() finds
+    """
+
+    monkeypatch.setattr(storage, 'DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setattr(storage, 'EXCEL_FILE', str(tmp_path / 'game_data.xlsx')) # not the repository's workbook
+    return storage.open_store()
+
+@pytest.fixture
+def recommender(store):
+    """ Engine over a small synthetic catalog, with 5 stored neighbors per game and no result cache
+    """
+
+    import engine as engine_module
+    import preprocess
+    import similarity
+    import vocabulary
+    from benchmarks.synthetic import raw_catalog
+
+    store.write_table('Raw Data', raw_catalog(300, seed=5).set_index('Title'))
+    preprocess.write_table(preprocess.preprocess())
+    titles = store.read_table('Preprocessed Data', columns=['Title'])['Title'].tolist()
+    similarity.calculate_neighbors(vocabulary.load_vocabulary(store), titles, k=5, block_size=100)
+    return engine_module.RecommenderEngine(store, cache_size=0)
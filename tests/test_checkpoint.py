@@ -0,0 +1,94 @@
+import pytest
+
+import checkpoint
+from checkpoint import Checkpoint, RetryQueue
+
+DATA = ['Game', ['Action', '', ''], ['FPS'] + [''] * 19, '90%', '1,000']
+
+def test_resume_finds_pages_and_games_of_an_earlier_run(tmp_path):
+    path = str(tmp_path / 'scrape.jsonl')
+    run = Checkpoint(path)
+    run.add_page(1, ['10', '11'])
+    run.add_game('10', (1, 0), DATA)
+    run.close()
+
+    pages, completed = Checkpoint(path).load_progress()
+    assert pages == {1: ['10', '11']}
+    assert completed == {'10'}
+
+def test_line_cut_off_by_a_crash_is_skipped_and_repaired(tmp_path):
+    path = tmp_path / 'scrape.jsonl'
+    run = Checkpoint(str(path))
+    run.add_page(1, ['10'])
+    run.close()
+    with open(path, 'a', encoding='utf-8') as fd:
+        fd.write('{"app_id": "10", "key": [1,') # crash halfway through a record
+
+    resumed = Checkpoint(str(path))
+    assert list(resumed.records()) == [{'page': 1, 'app_ids': ['10']}]
+    resumed.add_game('10', (1, 0), DATA)
+    resumed.close()
+    assert resumed.load_progress()[1] == {'10'}
+
+def test_failures_are_cleared_by_a_later_success(tmp_path):
+    run = Checkpoint(str(tmp_path / 'scrape.jsonl'))
+    run.add_failure('10', 'timeout')
+    run.add_failure('11', 'timeout')
+    run.add_page_failure(2, 'timeout')
+    assert run.failed_ids() == {'10', '11'}
+    assert run.failed_pages() == {2}
+
+    run.add_game('10', (1, 0), DATA)
+    run.add_page(2, ['20'])
+    run.close()
+    assert run.failed_ids() == {'11'}
+    assert run.failed_pages() == set()
+
+def test_games_are_streamed_in_search_order_with_their_latest_data(tmp_path):
+    run = Checkpoint(str(tmp_path / 'scrape.jsonl'))
+    run.add_game('20', (2, 0), DATA)
+    run.add_game('10', (1, 3), DATA)
+    run.add_game('20', (1, 0), ['Renamed'] + DATA[1:]) # scraped again by a resumed run
+    run.close()
+
+    assert [(app_id, data[0]) for app_id, data in run.games()] == [('20', 'Renamed'), ('10', 'Game')]
+
+def test_missing_checkpoint_has_no_progress(tmp_path):
+    run = Checkpoint(str(tmp_path / 'missing.jsonl'))
+    assert run.load_progress() == ({}, set())
+    assert list(run.games()) == []
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(checkpoint.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_retry_backoff_doubles_up_to_the_maximum(clock):
+    queue = RetryQueue(base_delay=1.0, max_delay=5.0, max_attempts=10)
+    delays = []
+    for attempts in range(1, 6):
+        queue.push(('app', None, '10'), attempts)
+        delays.append(queue.next_delay())
+        clock[0] += delays[-1]
+        assert queue.pop_ready() == (('app', None, '10'), attempts)
+    assert delays == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+def test_retry_item_is_not_ready_before_its_backoff(clock):
+    queue = RetryQueue(base_delay=2.0)
+    queue.push('late', 2)
+    queue.push('early', 1)
+    assert queue.pop_ready() is None
+    clock[0] += 2.0
+    assert queue.pop_ready() == ('early', 1)
+    assert queue.pop_ready() is None
+    clock[0] += 2.0
+    assert queue.pop_ready() == ('late', 2)
+    assert queue.next_delay() is None
+
+def test_retry_gives_up_after_max_attempts_or_when_full(clock):
+    queue = RetryQueue(maxlen=2, max_attempts=3)
+    assert not queue.push('a', 3)
+    assert queue.push('a', 2) and queue.push('b', 1)
+    assert not queue.push('c', 1)
+    assert len(queue) == 2
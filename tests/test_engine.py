@@ -0,0 +1,177 @@
+import numpy as np
+import pytest
+
+import engine
+from engine import ResultCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(engine.time, 'monotonic', lambda: now[0])
+    return now
+
+def test_hit_for_the_same_data_version():
+    cache = ResultCache()
+    assert cache.get(('Game', 'cosine', 3), 'v1') is None
+    cache.put(('Game', 'cosine', 3), 'v1', ('result',))
+    assert cache.get(('Game', 'cosine', 3), 'v1') == ('result',)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_new_data_version_empties_the_cache():
+    cache = ResultCache()
+    cache.get('a', 'v1')
+    cache.put('a', 'v1', 1)
+    cache.put('b', 'v1', 2)
+
+    assert cache.get('a', 'v2') is None
+    assert cache.invalidations == 1
+    assert cache.stats()['size'] == 0
+    assert cache.get('a', 'v1') is None # switching back does not bring old results back
+
+def test_result_of_older_data_is_not_stored():
+    cache = ResultCache()
+    cache.get('a', 'v2') # the engine has reloaded while the result below was being calculated
+    cache.put('a', 'v1', 1)
+    assert cache.get('a', 'v2') is None
+
+def test_least_recently_used_is_evicted():
+    cache = ResultCache(max_size=2)
+    cache.get('a', 'v1')
+    cache.put('a', 'v1', 1)
+    cache.put('b', 'v1', 2)
+    cache.get('a', 'v1')
+    cache.put('c', 'v1', 3)
+    assert cache.get('b', 'v1') is None
+    assert (cache.get('a', 'v1'), cache.get('c', 'v1'), cache.evictions) == (1, 3, 1)
+
+def test_results_expire_after_ttl(clock):
+    cache = ResultCache(ttl=10)
+    cache.get('a', 'v1')
+    cache.put('a', 'v1', 1)
+    clock[0] += 10
+    assert cache.get('a', 'v1') == 1
+    clock[0] += 1
+    assert cache.get('a', 'v1') is None
+    assert cache.expirations == 1
+
+def test_size_zero_disables_the_cache():
+    cache = ResultCache(max_size=0)
+    cache.get('a', 'v1')
+    cache.put('a', 'v1', 1)
+    assert cache.get('a', 'v1') is None
+
+def scores_of(recommender, metric, title):
+    """ Similarity of a game to every game, removed games and the game itself at -inf
+    """
+
+    row = recommender.find_row(title)
+    scores = recommender.score_rows(metric, np.array([row]))[0]
+    scores[row] = -np.inf
+    return scores
+
+@pytest.mark.parametrize('metric', ['cosine', 'jaccard'])
+def test_profile_of_one_game_scores_like_that_game(recommender, metric):
+    title = recommender.titles()[0]
+    games = recommender.recommend_profile([title], metric=metric, k=10)
+    expected = np.sort(scores_of(recommender, metric, title))[::-1][:10]
+    assert np.allclose([score for game, score in games], expected, atol=1e-6)
+    assert title not in [game for game, score in games]
+
+@pytest.mark.parametrize('metric', ['cosine', 'jaccard'])
+def test_disliked_games_count_against_a_game(recommender, metric):
+    liked, disliked = recommender.titles()[:2]
+    games = recommender.recommend_profile([liked], [disliked], metric, k=10, dislike_weight=0.5)
+    expected = scores_of(recommender, metric, liked) - 0.5 * scores_of(recommender, metric, disliked)
+    for game, score in games:
+        assert score == pytest.approx(expected[recommender.find_row(game)], abs=1e-6)
+    assert games[0][1] == pytest.approx(np.max(expected[np.isfinite(expected)]), abs=1e-6)
+
+def test_jaccard_profile_scores_each_game_against_the_attribute_shares(recommender):
+    titles = recommender.titles()[:4]
+    matrix = recommender.features('jaccard').toarray()
+    shares = matrix[[recommender.find_row(title) for title in titles]].mean(axis=0)
+    games = recommender.recommend_profile(titles, metric='jaccard', k=5)
+    for game, score in games:
+        row = matrix[recommender.find_row(game)]
+        assert score == pytest.approx(np.minimum(shares, row).sum() / np.maximum(shares, row).sum(), abs=1e-6)
+    assert not set(titles) & {game for game, score in games}
+
+def test_profile_that_cancels_out_is_empty(recommender):
+    title = recommender.titles()[0]
+    assert recommender.recommend_profile([title], [title], 'jaccard') == []
+
+@pytest.mark.parametrize('liked, disliked, options', [('Game 1', [], {}), (['Game 1'], 'Game 2', {}), ([1], [], {}), ([], [], {}),
+                                                      (['Game 1'], [], {'k': 0}), (['Game 1'], [], {'dislike_weight': float('nan')}),
+                                                      (['Game 1'], [], {'dislike_weight': float('inf')})])
+def test_invalid_profiles_are_rejected(recommender, liked, disliked, options):
+    with pytest.raises(ValueError):
+        recommender.recommend_profile(liked, disliked, **options)
+
+@pytest.mark.parametrize('metric', ['cosine', 'jaccard'])
+@pytest.mark.parametrize('k', [3, 8]) # from the stored neighbors, and scored beyond them
+def test_batch_matches_single_lookups(recommender, metric, k):
+    titles = recommender.titles()[:20] + ['No Such Game']
+    batch = recommender.recommend_batch(titles, metric, k)
+    assert batch[-1] is None
+    for title, games in zip(titles, batch[:-1]):
+        assert len(games) == k
+        expected = np.sort(scores_of(recommender, metric, title))[::-1][:k]
+        assert np.allclose([score for game, score in games], expected, atol=1e-6)
+        assert games == [(game, pytest.approx(score)) for game, score in recommender.recommend(title, metric, k)]
+
+def remove_all_but(recommender, count):
+    """ Removes all but the first few games from the data and updates the neighbor indexes, which tombstones their rows
+    """
+
+    import preprocess
+    import similarity
+    import vocabulary
+
+    store = recommender.store
+    raw_data = store.read_table('Raw Data').set_index('Title')
+    store.write_table('Raw Data', raw_data.iloc[:count])
+    preprocess.write_table(preprocess.preprocess())
+    titles = store.read_table('Preprocessed Data', columns=['Title'])['Title'].tolist()
+    similarity.update_neighbors(vocabulary.load_vocabulary(store), titles)
+    assert recommender.refresh()
+
+@pytest.mark.parametrize('k', [5, 50]) # all stored neighbors, and more than there are games
+def test_removed_games_are_never_recommended(recommender, k):
+    remove_all_but(recommender, 4)
+    assert recommender.num_games() == 4
+    for title, games in zip(recommender.titles(), recommender.recommend_batch(recommender.titles(), 'jaccard', k)):
+        assert sorted(game for game, score in games) == sorted(set(recommender.titles()) - {title})
+        assert recommender.recommend(title, 'jaccard', k) == games
+
+def best_matching(recommender, metric, title, where, k):
+    """ Scores of the k best games matching a filter, found by scoring every game
+    """
+
+    scores = scores_of(recommender, metric, title)
+    return np.sort(scores[recommender.allowed(where)])[::-1][:k]
+
+@pytest.mark.parametrize('metric', ['cosine', 'jaccard'])
+@pytest.mark.parametrize('where', ['rating>=1', 'Racing|Simulation, !Nudity', 'Racing, Simulation, Tag 0'],
+                         ids=['stored neighbors match', 'scored', 'fewer than k match'])
+def test_filtered_results_are_the_best_matching_games(recommender, metric, where):
+    title = recommender.titles()[2]
+    games = recommender.recommend(title, metric, 5, where)
+    allowed = recommender.allowed(where)
+    assert all(allowed[recommender.find_row(game)] for game, score in games)
+    assert title not in [game for game, score in games]
+    expected = best_matching(recommender, metric, title, where, 5)
+    assert np.allclose([score for game, score in games], expected[np.isfinite(expected)], atol=1e-6)
+
+def test_filter_over_every_game_gives_the_stored_neighbors(recommender):
+    title = recommender.titles()[0]
+    assert recommender.recommend(title, 'jaccard', 5, 'rating>=1') == recommender.recommend(title, 'jaccard', 5)
+
+def test_filtered_results_leave_out_removed_games(recommender):
+    remove_all_but(recommender, 4)
+    title = recommender.titles()[0]
+    games = recommender.recommend(title, 'cosine', 50, 'rating>=1')
+    assert {game for game, score in games} <= set(recommender.titles()) - {title}
+
+def test_unknown_filter_term_is_an_error(recommender):
+    with pytest.raises(ValueError):
+        recommender.recommend(recommender.titles()[0], 'cosine', 3, 'No Such Genre')
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+import extract
+from benchmarks.parse import page_variants
+from fixture_server import FIXTURE_FILE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+with open(os.path.join(ROOT, FIXTURE_FILE), encoding='utf-8') as fd:
+    VARIANTS = page_variants(fd.read())
+
+@pytest.mark.parametrize('name', sorted(VARIANTS))
+def test_fast_parse_matches_the_full_tree(name):
+    assert extract.parse_fast(VARIANTS[name]) == extract.parse_soup(VARIANTS[name])
+
+def test_fixture_page_attributes():
+    title, genres, tags, pos_pct, tot_rev = extract.parse_fast(VARIANTS['fixture'])
+    assert title and genres[0] and tags[0]
+    assert len(genres) == 3 and len(tags) == 20
+    assert pos_pct.endswith('%') and tot_rev
+
+def test_missing_elements_are_blank():
+    assert extract.parse_fast('<html><body></body></html>') == ('', [''] * 3, [''] * 20, '', '')
+
+def test_unclosed_element_falls_back_to_the_full_tree():
+    html = '<html><body><span itemprop="name">Half Open<div id="genresAndManufacturer"><span><a>RPG</a></span></div></body></html>'
+    with pytest.raises(extract.FragmentError):
+        extract.element_html(html, extract.TITLE_START)
+    assert extract.parse_fast(html) == extract.parse_soup(html)
+
+def test_nested_elements_of_the_same_tag_are_cut_out_whole():
+    html = '<div id="genresAndManufacturer"><div><span><a>RPG</a><a>Indie</a></span></div></div><div>after</div>'
+    assert extract.element_html(html, extract.GENRES_START) == html[:html.index('<div>after')]
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from facets import FacetIndex
+
+# games:           0      1      2      3      4      5      6      7      8      9 (no facets)
+RPG =           [True,  True,  False, False, True,  False, False, False, True,  False]
+ACTION =        [False, True,  True,  False, False, False, True,  False, False, False]
+HORROR =        [False, False, True,  True,  True,  False, False, False, False, False]
+RATING_4 =      [True,  False, True,  False, False, True,  False, False, False, False]
+RATING_5 =      [False, True,  False, False, True,  False, False, True,  False, False]
+
+@pytest.fixture
+def index():
+    keys = ['RPG', 'Action', 'Horror', 'PosPercentDiscrete=4', 'PosPercentDiscrete=5']
+    return FacetIndex(keys, np.packbits(np.array([RPG, ACTION, HORROR, RATING_4, RATING_5]), axis=1), 10)
+
+def games(flags):
+    return np.nonzero(flags)[0].tolist()
+
+def test_terms_are_matched_without_case(index):
+    assert games(index.matching('rpg')) == games(RPG)
+
+def test_alternatives_and_clauses(index):
+    expected = (np.array(RPG) | np.array(ACTION)) & ~np.array(HORROR)
+    assert games(index.matching('RPG|Action, !Horror')) == games(expected)
+
+def test_rating_comparisons_cover_their_buckets(index):
+    assert games(index.matching('rating>=4')) == games(np.array(RATING_4) | np.array(RATING_5))
+    assert games(index.matching('rating=5')) == games(RATING_5)
+    assert games(index.matching('PosPercentDiscrete < 5')) == games(RATING_4)
+
+def test_negation_never_sets_padding_bits(index):
+    assert index.count('!RPG') == 10 - sum(RPG)
+    assert games(index.matching('!RPG, !Action, !Horror, !rating>=1')) == [9]
+    assert index.count('') == 10
+
+def test_unknown_terms_are_errors(index):
+    with pytest.raises(ValueError, match='unknown genre or tag'):
+        index.mask('RPG, Racing')
+    with pytest.raises(ValueError, match='unknown rating'):
+        index.mask('stars>=4')
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+import pytest
+
+import instrument
+
+@pytest.fixture
+def enabled():
+    instrument.reset()
+    instrument.enable()
+    yield
+    instrument.disable()
+    instrument.reset()
+
+needs_rss = pytest.mark.skipif(instrument.current_rss_mb() is None, reason='resident memory is not measurable here')
+
+def allocate(mb):
+    block = np.ones(mb * 2 ** 20 // 8) # touched, so it is resident
+    time.sleep(2 * instrument.SAMPLE_INTERVAL)
+    return block
+
+def test_spans_are_timed_and_counted(enabled):
+    for i in range(3):
+        with instrument.span('stage'):
+            time.sleep(0.01)
+    instrument.count('things', 2)
+    data = instrument.snapshot()
+    assert data['spans']['stage']['count'] == 3
+    assert data['spans']['stage']['seconds'] >= 0.03
+    assert data['counters'] == {'things': 2}
+
+def test_nothing_is_recorded_while_disabled():
+    instrument.reset()
+    with instrument.span('stage'):
+        pass
+    instrument.count('things')
+    assert instrument.snapshot()['spans'] == {} and instrument.snapshot()['counters'] == {}
+
+@needs_rss
+def test_memory_is_measured_per_span_not_per_process(enabled):
+    with instrument.span('big'):
+        block = allocate(200)
+        del block
+    with instrument.span('small'):
+        block = allocate(10)
+        del block
+
+    spans = instrument.snapshot()['spans']
+    assert spans['big']['rss_growth_mb'] >= 150
+    assert spans['small']['rss_growth_mb'] < 100 # the earlier high-water mark of the process doesn't count
+    assert spans['big']['peak_rss_mb'] >= spans['big']['rss_growth_mb']
+
+@needs_rss
+def test_enclosing_span_sees_the_memory_of_nested_ones(enabled):
+    with instrument.span('outer'):
+        with instrument.span('inner'):
+            block = allocate(100)
+            del block
+    spans = instrument.snapshot()['spans']
+    assert spans['outer']['rss_growth_mb'] >= spans['inner']['rss_growth_mb'] >= 75
+
+def test_prometheus_lists_every_span(enabled):
+    with instrument.span('preprocess'):
+        pass
+    text = instrument.to_prometheus()
+    assert 'game_recommender_span_count_total{stage="preprocess"} 1' in text
+    if instrument.current_rss_mb() is not None:
+        assert 'game_recommender_span_rss_growth_megabytes{stage="preprocess"}' in text
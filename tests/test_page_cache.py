@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+from page_cache import PageCache
+
+PAGE = '<html><body>Game {}</body></html>'
+
+@pytest.fixture
+def parses():
+    """ Parser that records every page it is run on
+    """
+
+    seen = []
+
+    def parse(html):
+        seen.append(html)
+        return (html, ['Action'], ['Indie'], '90%', '10')
+
+    parse.seen = seen
+    return parse
+
+def test_unchanged_page_is_not_parsed_again(tmp_path, parses):
+    cache = PageCache(str(tmp_path), parser_version=1)
+    first = cache.put('1', PAGE.format(1), parses)
+    assert cache.put('2', PAGE.format(1), parses) == first # same contents under another app id
+    assert parses.seen == [PAGE.format(1)]
+    assert cache.get_data('2') == first
+    assert cache.get_html('2') == PAGE.format(1)
+    assert cache.get_data('3') is None
+
+def test_data_from_another_parser_version_is_not_returned(tmp_path, parses):
+    PageCache(str(tmp_path), parser_version=1).put('1', PAGE.format(1), parses)
+
+    cache = PageCache(str(tmp_path), parser_version=2)
+    assert cache.is_fresh('1')
+    assert cache.get_data('1') is None
+    cache.put('1', PAGE.format(1), parses) # fetched again, so parsed again by the new version
+    assert len(parses.seen) == 2
+    assert cache.get_data('1') is not None
+
+def test_cache_from_before_parser_versions_is_migrated(tmp_path, parses):
+    db = sqlite3.connect(str(tmp_path / 'index.sqlite'))
+    db.execute('CREATE TABLE blobs (digest TEXT PRIMARY KEY, size INTEGER, data TEXT)')
+    db.execute('INSERT INTO blobs VALUES (?, ?, ?)', ('old', 1, '[]'))
+    db.commit()
+    db.close()
+
+    cache = PageCache(str(tmp_path), parser_version=1)
+    cache.put('1', PAGE.format(1), parses)
+    assert cache.get_data('1') is not None
+
+def test_stale_pages_are_not_fresh(tmp_path, parses):
+    cache = PageCache(str(tmp_path), ttl=60)
+    cache.put('1', PAGE.format(1), parses)
+    assert cache.is_fresh('1')
+    assert not cache.is_fresh('1', now=cache._db.execute('SELECT fetched_at FROM pages').fetchone()[0] + 61)
+
+def test_evicting_a_page_that_shares_its_blob_frees_nothing(tmp_path, parses):
+    cache = PageCache(str(tmp_path))
+    for app_id, page in [('1', 1), ('2', 2), ('3', 1), ('4', 3)]: # 1 and 3 share a blob
+        cache.put(app_id, PAGE.format(page), parses)
+    size = cache._db.execute('SELECT MAX(size) FROM blobs').fetchone()[0]
+
+    cache.max_bytes = 2 * size # one of the three blobs has to go
+    assert cache.evict() == 2 # evicting 1 alone leaves its blob to 3, 2 goes next
+    assert cache.get_data('1') is None and cache.get_data('2') is None
+    assert cache.get_data('3') is not None and cache.get_data('4') is not None
+    assert cache._db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0] <= cache.max_bytes
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+import preprocess
+from benchmarks.synthetic import raw_catalog
+
+def row_by_row():
+    """ Preprocessed Data table of the original discretize and combine_columns, as write_data builds it
+    """
+
+    df = pd.DataFrame.from_dict(preprocess.combine_columns(preprocess.discretize()), orient='index')
+    df.columns = preprocess.ATTRIBUTE_COLUMNS + ['PosPercentDiscrete', 'TotalReviewsDiscrete', 'CombinedData']
+    return df
+
+@pytest.fixture
+def raw(store):
+    raw = raw_catalog(300, seed=4)
+    raw.loc[3, 'Title'] = raw.loc[7, 'Title'] # duplicate titles are merged
+    raw.loc[5, 'Title'] = 'Trademarked™ Game®'
+    raw.loc[[9, 11], 'TotalReviews'] = None # unreviewed games
+    raw.loc[[9, 13], 'PosPercent'] = None
+    raw.loc[15, 'Title'] = None # empty row
+    store.write_table('Raw Data', raw.set_index('Title'))
+    return raw
+
+def test_column_wise_matches_row_by_row(raw):
+    pd.testing.assert_frame_equal(preprocess.preprocess(), row_by_row())
+
+@pytest.mark.parametrize('chunk_size', [16, 64, 299, 10000])
+def test_chunked_matches_one_block(raw, chunk_size):
+    pd.testing.assert_frame_equal(preprocess.preprocess(chunk_size), preprocess.preprocess())
+
+def test_block_of_only_empty_rows(raw):
+    rev_rankings = preprocess.get_rev_rankings(raw['TotalReviews'])
+    block = preprocess.preprocess_rows(raw.iloc[[15]], rev_rankings) # a chunk can hold nothing but empty rows
+    assert len(block) == 0
+    pd.testing.assert_frame_equal(preprocess.merge_rows(pd.concat([block, preprocess.preprocess_rows(raw, rev_rankings)])),
+                                  preprocess.preprocess())
+
+def test_ratings_and_titles(raw):
+    df = preprocess.preprocess()
+    assert 'Trademarked Game' in df.index
+    assert df.index.is_unique and None not in df.index
+    assert set(df['PosPercentDiscrete']) <= {1, 2, 3, 4, 5, ''}
+    assert set(df['TotalReviewsDiscrete']) <= {1, 2, 3, 4, 5, ''}
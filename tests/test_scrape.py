@@ -0,0 +1,29 @@
+import pandas as pd
+
+from scrape_steam import RAW_COLUMNS, merge_raw_data, write_data
+
+def row(genre, app_id):
+    return (genre,) + (None,) * (len(RAW_COLUMNS) - 2) + (app_id,)
+
+def test_new_games_are_merged_after_existing_ones(store):
+    write_data({'A': row('RPG', '1'), 'B': row('Action', '2')})
+    merged = merge_raw_data({'B': row('Indie', '2'), 'C': row('RPG', '3')})
+    assert list(merged) == ['A', 'B', 'C']
+    assert merged['B'][0] == 'Indie'
+
+def test_renamed_game_replaces_its_old_row(store):
+    write_data({'Old Name': row('RPG', '1'), 'B': row('Action', '2')})
+    merged = merge_raw_data({'New Name': row('RPG', '1')})
+    assert list(merged) == ['New Name', 'B'] # in the position of the row it replaces
+
+def test_rows_without_app_ids_are_matched_by_title(store):
+    raw_data = pd.DataFrame([row('RPG', None), row('Action', 2.0)], index=['A', 'B'], columns=RAW_COLUMNS) # as read back from Excel
+    store.write_table('Raw Data', raw_data)
+    merged = merge_raw_data({'A': row('Indie', '1')})
+    assert list(merged) == ['A', 'B']
+    assert merged['A'] == row('Indie', '1')
+    assert merged['B'][-1] == '2'
+
+def test_nothing_to_merge_into(store):
+    game_dict = {'A': row('RPG', '1')}
+    assert merge_raw_data(game_dict) is game_dict
@@ -0,0 +1,124 @@
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+import server
+
+@pytest.fixture
+def api(recommender):
+    """ Server on a free port, returns a function that sends a request and gives back the status and JSON body
+    """
+
+    http, stats = server.start_server(0, engine=recommender)
+
+    def request(path, body=None):
+        data = None if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode('utf-8'))
+        try:
+            with urllib.request.urlopen('http://127.0.0.1:{}{}'.format(http.server_address[1], path), data, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    yield request
+    http.shutdown()
+    http.server_close()
+
+def get(path, **query):
+    return path + '?' + urllib.parse.urlencode(query)
+
+def test_recommend(api, recommender):
+    title = recommender.titles()[7]
+    status, body = api(get('/recommend', title=title.upper(), metric='jaccard', k=4)) # matched without case
+    assert status == 200
+    assert (body['title'], body['matched'], body['metric']) == (title.upper(), title, 'jaccard')
+    assert [(game['title'], game['score']) for game in body['results']] == [
+        (game, pytest.approx(score)) for game, score in recommender.recommend(title, 'jaccard', 4)]
+
+def test_recommend_with_filter(api, recommender):
+    status, body = api(get('/recommend', title=recommender.titles()[0], k=3, where='Racing|Simulation'))
+    assert status == 200
+    allowed = recommender.allowed('Racing|Simulation')
+    assert all(allowed[recommender.find_row(game['title'])] for game in body['results'])
+
+@pytest.mark.parametrize('query', [{'metric': 'euclidean'}, {'k': 'three'}, {'k': 0}, {'k': 300}, {'where': 'No Such Genre'}],
+                         ids=['unknown metric', 'k not an integer', 'k zero', 'k beyond other games', 'unknown filter term'])
+def test_invalid_recommend_is_a_bad_request(api, recommender, query):
+    assert api(get('/recommend', title=recommender.titles()[0], **query))[0] == 400
+
+def test_unknown_title_is_not_found(api):
+    status, body = api(get('/recommend', title='No Such Game Anywhere 123'))
+    assert (status, body['title']) == (404, 'No Such Game Anywhere 123')
+
+@pytest.mark.parametrize('query', ['Game 1', 'game 2', 'z', ''])
+def test_suggest(api, recommender, query):
+    status, body = api(get('/suggest', q=query, limit=4))
+    assert status == 200
+    assert (body['query'], body['suggestions']) == (query, recommender.suggest(query, 4))
+
+def test_suggest_limit_must_be_an_integer(api):
+    assert api(get('/suggest', q='Game', limit='four'))[0] == 400
+
+def test_health(api, recommender):
+    assert api('/health') == (200, {'games': 300, 'version': recommender.state['version']})
+
+def test_stats_count_served_queries(api, recommender):
+    status, body = api('/stats')
+    assert (status, body['count']) == (200, 0)
+    api(get('/recommend', title=recommender.titles()[0]))
+    api('/recommend/batch', {'titles': recommender.titles()[:2]})
+    status, body = api('/stats')
+    assert body['count'] == 2
+    assert body['p50_us'] <= body['p99_us'] <= body['max_us']
+    assert body['cache']['size'] == 0 # the test engine has no result cache
+
+def test_unknown_path_is_not_found(api):
+    assert api('/recommendations')[0] == 404
+    assert api('/recommendations', {})[0] == 404
+
+def test_profile(api, recommender):
+    liked = recommender.titles()[:3]
+    status, body = api('/recommend/profile', {'liked': liked, 'disliked': recommender.titles()[3:4], 'metric': 'jaccard', 'k': 4})
+    assert status == 200
+    assert [game['title'] for game in body['results']] == [game for game, score in recommender.recommend_profile(
+        liked, recommender.titles()[3:4], 'jaccard', 4)]
+
+@pytest.mark.parametrize('body', [lambda title: {'liked': title}, lambda title: {'liked': [title], 'disliked': title},
+                                  lambda title: {'liked': [1]}, lambda title: {'liked': []}, lambda title: {'disliked': [title]},
+                                  lambda title: {'liked': [title], 'dislike_weight': 'nan'},
+                                  lambda title: {'liked': [title], 'dislike_weight': 'inf'},
+                                  lambda title: {'liked': [title], 'where': 5}, lambda title: {'liked': [title], 'metric': 'euclidean'},
+                                  lambda title: {'liked': [title], 'k': 0}],
+                         ids=['liked string', 'disliked string', 'non-string title', 'no liked', 'liked missing', 'nan weight',
+                              'inf weight', 'where not a string', 'unknown metric', 'k zero'])
+def test_invalid_profile_is_a_bad_request(api, recommender, body):
+    assert api('/recommend/profile', body(recommender.titles()[0]))[0] == 400
+
+def test_unknown_profile_title_is_not_found(api):
+    status, body = api('/recommend/profile', {'liked': ['No Such Game Anywhere 123']})
+    assert (status, body['title']) == (404, 'No Such Game Anywhere 123')
+
+def test_batch(api, recommender):
+    titles = recommender.titles()[:5] + ['No Such Game Anywhere 123']
+    status, body = api('/recommend/batch', {'titles': titles, 'metric': 'jaccard', 'k': 8})
+    assert status == 200
+    expected = recommender.recommend_batch(titles, 'jaccard', 8)
+    assert [entry['title'] for entry in body['results']] == titles
+    assert body['results'][-1]['results'] is None
+    for entry, games in zip(body['results'][:-1], expected[:-1]):
+        assert [game['title'] for game in entry['results']] == [game for game, score in games]
+
+def test_batch_of_every_other_game(api, recommender):
+    k = recommender.num_games() - 1
+    status, body = api('/recommend/batch', {'titles': recommender.titles()[:1], 'k': k})
+    assert status == 200
+    assert len(body['results'][0]['results']) == k
+    assert api('/recommend/batch', {'titles': recommender.titles()[:1], 'k': k + 1})[0] == 400
+
+@pytest.mark.parametrize('body', [{'titles': 'Game 1'}, {'titles': [1]}, {'metric': 'cosine'}, {'titles': [], 'k': 'three'},
+                                  {'titles': [], 'metric': 'euclidean'}, {'titles': [], 'k': 0}],
+                         ids=['titles string', 'non-string title', 'titles missing', 'k not an integer', 'unknown metric', 'k zero'])
+def test_invalid_batch_is_a_bad_request(api, body):
+    assert api('/recommend/batch', body)[0] == 400
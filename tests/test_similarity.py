@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+import preprocess
+import similarity
+import storage
+import vocabulary
+from benchmarks.synthetic import preprocessed_catalog, raw_catalog
+
+def test_merge_keeps_the_k_best_by_score_then_descending_index():
+    indices = np.array([[4, 2, 7]])
+    scores = np.array([[0.9, 0.5, 0.5]])
+    new_indices = np.array([[3, 9]])
+    new_scores = np.array([[0.5, 0.95]])
+
+    merged_indices, merged_scores = similarity.merge_top_k(indices, scores, new_indices, new_scores, 3)
+    assert merged_indices.tolist() == [[9, 4, 7]]
+    assert merged_scores.tolist() == [[0.95, 0.9, 0.5]]
+
+def test_merge_compares_scores_at_float64():
+    # equal at float32, so only the float64 scores put game 1 first
+    indices = np.array([[1]])
+    scores = np.array([[0.5 + 1e-12]])
+    merged_indices, merged_scores = similarity.merge_top_k(indices, scores, np.array([[8]]), np.array([[0.5]]), 1)
+    assert merged_indices.tolist() == [[1]]
+    assert merged_scores.dtype == np.float64
+
+def test_pair_scores_are_bit_identical_to_full_rows():
+    raw = raw_catalog(300, seed=2)
+    vocab = vocabulary.build_vocabulary(preprocess.merge_rows(preprocess.preprocess_rows(raw, preprocess.get_rev_rankings(raw['TotalReviews']))))
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, vocab.num_games, 50)
+    columns = rng.integers(0, vocab.num_games, (50, 20))
+    for metric, matrix, rows_function in [('cosine', vocab.count_matrix(), similarity.cosine_rows),
+                                          ('jaccard', vocab.attribute_matrix(), similarity.jaccard_rows)]:
+        expected = rows_function(matrix, rows)[np.arange(50)[:, None], columns]
+        pairs = similarity.pair_scores(matrix, np.repeat(rows[:, None], 20, axis=1), columns, metric)
+        assert np.array_equal(pairs, expected)
+
+def load(store):
+    vocab = vocabulary.load_vocabulary(store)
+    titles = store.read_table('Preprocessed Data', columns=['Title'])['Title'].tolist()
+    return vocab, titles
+
+def test_incremental_update_matches_a_full_rebuild(store):
+    raw = raw_catalog(600, seed=1)
+    store.write_table('Raw Data', raw.set_index('Title'))
+    preprocess.write_table(preprocess.preprocess())
+    similarity.calculate_neighbors(*load(store), k=8, block_size=200)
+
+    # add 40 games, change 15 and remove 10
+    new = raw_catalog(40, seed=7)
+    new['Title'] = ['New %d' % i for i in range(40)]
+    updated = pd.concat([raw.iloc[10:], new], ignore_index=True)
+    for i in np.random.default_rng(3).choice(len(raw) - 10, 15, replace=False):
+        updated.loc[i, 'Tag1'] = 'Changed %d' % (i % 4)
+    store.write_table('Raw Data', updated.set_index('Title'))
+    preprocess.write_table(preprocess.preprocess())
+    vocab, titles = load(store)
+    summary = similarity.update_neighbors(vocab, titles, block_size=200)
+    assert (summary['added'], summary['removed']) == (40, 10)
+
+    games = store.read_table(storage.NEIGHBOR_GAMES)
+    removed = games['Removed'].to_numpy(dtype=bool)
+    positions = {title: i for i, title in enumerate(titles)}
+    ordered = vocab.take(np.array([-1 if gone else positions[title] for title, gone in zip(games['Title'], removed)]))
+    for metric, matrix, rows_function in [('cosine', ordered.count_matrix(), similarity.cosine_rows),
+                                          ('jaccard', ordered.attribute_matrix(), similarity.jaccard_rows)]:
+        def score_rows(rows):
+            block = rows_function(matrix, rows)
+            block[:, removed] = -np.inf
+            return block
+
+        indices, scores = similarity.build_top_k(score_rows, len(removed), 8, 200)
+        index_name, score_name = storage.NEIGHBORS[metric]
+        assert np.array_equal(np.asarray(store.read_array(index_name))[~removed], indices[~removed])
+        assert np.array_equal(np.asarray(store.read_array(score_name))[~removed], scores[~removed])
+
+def test_sparse_jaccard_matches_the_pairwise_loop(monkeypatch):
+    written = {}
+    monkeypatch.setattr(similarity, 'write_data', lambda sim_array, sheet: written.update({sheet: np.asarray(sim_array)}))
+    data = preprocessed_catalog(60)
+    similarity.calculate_jaccard(data.copy())
+    loop = written.pop('Jaccard Similarity')
+    similarity.calculate_jaccard_sparse(data)
+    assert np.array_equal(written['Jaccard Similarity'], loop)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+
+TABLE = pd.DataFrame({'Genre1': ['RPG', 'Action'], 'Genre2': ['', 'Indie'], 'TotalReviews': [10, 20]}, index=['A', 'B'])
+
+def test_table_round_trip_with_blank_cells_as_missing(store):
+    store.write_table('Raw Data', TABLE)
+    table = store.read_table('Raw Data')
+    assert table.columns.tolist() == ['Title', 'Genre1', 'Genre2', 'TotalReviews']
+    assert table['Title'].tolist() == ['A', 'B']
+    assert table['Genre2'].isna().tolist() == [True, False]
+    assert store.read_table('Raw Data', columns=['TotalReviews'])['TotalReviews'].tolist() == [10, 20]
+
+def test_streamed_table_matches_one_written_whole(store):
+    rows = pd.DataFrame({'Genre1': ['RPG', 'Action', 'Indie'], 'Tag1': [None, None, 'FPS']}, index=['A', 'B', 'C'])
+    store.write_table_batches('Raw Data', [rows.iloc[:2], rows.iloc[2:]]) # Tag1 is blank throughout the first block
+    streamed = store.read_table('Raw Data')
+    store.write_table('Raw Data', rows)
+    pd.testing.assert_frame_equal(streamed, store.read_table('Raw Data'))
+
+    blocks = list(store.read_batches('Raw Data', 2))
+    assert [len(block) for block in blocks] == [2, 1]
+    assert blocks[1].index.tolist() == [2]
+
+def test_arrays_round_trip_memory_mapped(store):
+    array = np.arange(12, dtype=np.int32).reshape(3, 4)
+    store.write_array('Cosine Neighbors', array)
+    mapped = store.read_array('Cosine Neighbors')
+    assert isinstance(mapped, np.memmap) and mapped.dtype == np.int32
+    assert np.array_equal(mapped, array)
+
+    store.write_matrix_blocks('Cosine Similarity', 3, [np.eye(3)[:2], np.eye(3)[2:]])
+    assert np.array_equal(store.read_matrix('Cosine Similarity', mmap=False), np.eye(3))
+
+def test_missing_artifacts_are_key_errors(store):
+    assert store.version() is None
+    with pytest.raises(KeyError):
+        store.read_table('Raw Data')
+    with pytest.raises(KeyError):
+        store.read_array('Cosine Neighbors')
+
+def test_every_write_outside_a_run_is_a_new_version(store):
+    store.write_table('Raw Data', TABLE)
+    first = store.version()
+    store.write_array('Cosine Neighbors', np.zeros(2))
+    assert store.version() not in (None, first)
+
+def test_a_run_publishes_its_artifacts_once_under_one_version(store):
+    store.write_table('Raw Data', TABLE)
+    before = store.version()
+    with store.run():
+        store.write_array('Cosine Neighbors', np.zeros(2))
+        with store.run(): # nested, still published by the outer block
+            store.write_array('Jaccard Neighbors', np.ones(2))
+        assert store.version() == before
+        assert store.read_array('Jaccard Neighbors').tolist() == [1, 1] # readable by the run that wrote it
+
+    artifacts = store.manifest()['artifacts']
+    assert store.version() != before
+    assert artifacts['Cosine Neighbors']['version'] == artifacts['Jaccard Neighbors']['version'] == store.version()
+    assert artifacts['Raw Data']['version'] == before
+
+def test_open_store_imports_the_workbook_into_an_empty_data_directory(tmp_path, monkeypatch):
+    workbook = str(tmp_path / 'game_data.xlsx')
+    with pd.ExcelWriter(workbook, engine='openpyxl') as writer:
+        TABLE.to_excel(writer, sheet_name='Raw Data')
+        pd.DataFrame(np.eye(2)).to_excel(writer, sheet_name='Cosine Similarity')
+    monkeypatch.setattr(storage, 'DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setattr(storage, 'EXCEL_FILE', workbook)
+
+    store = storage.open_store()
+    assert storage.open_store() is store
+    assert store.read_table('Raw Data')['Genre1'].tolist() == ['RPG', 'Action']
+    assert np.array_equal(store.read_matrix('Cosine Similarity'), np.eye(2))
+    assert set(store.manifest()['artifacts']) == {'Raw Data', 'Cosine Similarity'}
+
+def test_excel_export_and_import_round_trip(store, tmp_path):
+    store.write_table('Raw Data', TABLE)
+    store.write_matrix('Jaccard Similarity', np.eye(2))
+    store.export_excel(str(tmp_path / 'export.xlsx'))
+
+    copy = storage.BinaryStore(str(tmp_path / 'copy'))
+    copy.import_excel(str(tmp_path / 'export.xlsx'))
+    pd.testing.assert_frame_equal(copy.read_table('Raw Data'), store.read_table('Raw Data'))
+    assert np.array_equal(copy.read_matrix('Jaccard Similarity'), np.eye(2))
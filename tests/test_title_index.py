@@ -0,0 +1,40 @@
+import pytest
+
+from title_index import TitleIndex, normalize_title
+
+TITLES = ['The Witcher® 3: Wild Hunt', 'Stardew Valley', 'Portal 2', 'Portal', 'Pokémon Legends', 'XCOM 2',
+          'Yakuza 0', 'Zombie Army 4', 'Zoo Tycoon', None]
+
+@pytest.fixture
+def index():
+    return TitleIndex(TITLES)
+
+def test_symbols_accents_and_punctuation_are_normalized_away():
+    assert normalize_title('The Witcher® 3: Wild Hunt') == 'the witcher 3 wild hunt'
+    assert normalize_title('  POKÉMON_legends ') == 'pokemon legends'
+
+def test_prefix_matches_are_alphabetical_and_limited(index):
+    assert [TITLES[row] for row in index.prefix('portal')] == ['Portal', 'Portal 2']
+    assert [TITLES[row] for row in index.prefix('portal', limit=1)] == ['Portal']
+    assert index.prefix('') == []
+    assert index.prefix('half life') == []
+
+@pytest.mark.parametrize('query, expected', [('z', ['Zombie Army 4', 'Zoo Tycoon']), ('zo', ['Zombie Army 4', 'Zoo Tycoon']),
+                                             ('Zoo', ['Zoo Tycoon']), ('xcom', ['XCOM 2']), ('yakuza', ['Yakuza 0']),
+                                             ('zz', [])])
+def test_prefix_of_titles_at_the_end_of_the_sorted_keys(index, query, expected):
+    assert [TITLES[row] for row in index.prefix(query)] == expected
+
+def test_resolve_exact_then_fuzzy(index):
+    assert index.resolve('the witcher 3 wild hunt') == 0
+    assert index.resolve('Stardw Valley') == 1
+    assert index.resolve('Completely Different') is None
+
+def test_removed_games_are_never_found(index):
+    assert all(TITLES[row] is not None for row, score in index.fuzzy('None'))
+
+def test_suggest_fills_up_with_fuzzy_matches_after_prefix_matches(index):
+    assert index.suggest('z', 2) == ['Zombie Army 4', 'Zoo Tycoon']
+    suggestions = index.suggest('Portal 3', 3) # no title starts with it, so every suggestion is a fuzzy match
+    assert set(suggestions[:2]) == {'Portal', 'Portal 2'}
+    assert len(suggestions) == len(set(suggestions)) <= 3
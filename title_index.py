@@ -0,0 +1,155 @@
+import bisect
+import re
+import unicodedata
+
+import numpy as np
+
+def normalize_title(title):
+    """ Reduces a title to lowercase letters and digits separated by single spaces
+
+    Removes ™ / ® / © symbols, accents, and punctuation so 'The Witcher® 3: Wild Hunt' and 'the witcher 3 wild hunt'
+    normalize to the same string.
+
+    Args:
+        title (str): Game title or user input
+
+    Returns:
+        str: Normalized title
+    """
+
+    title = unicodedata.normalize('NFKD', str(title)).casefold()
+    title = ''.join(c for c in title if not unicodedata.combining(c)) # drop accents left over by NFKD
+    return ' '.join(re.sub(r'[^\w]+|_', ' ', title).split())
+
+def trigrams(normalized):
+    """ Splits a normalized title into overlapping three character pieces, padded so short words still have some
+
+    Args:
+        normalized (str): Title from normalize_title
+
+    Returns:
+        set[str]: Character trigrams of the title
+    """
+
+    padded = '  ' + normalized + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TitleIndex:
+    """ Finds games by title despite typos, case differences and ™ / ® symbols
+
+    Exact matches use a dict of normalized titles, prefix matches use binary search over the sorted normalized
+    titles, and fuzzy matches use an inverted index from each character trigram to the games containing it. No
+    lookup scans every title, so suggestions stay fast as the user types on catalogs of 100k+ games.
+    """
+
+    def __init__(self, titles):
+        """
+        Args:
+            titles (list[str]): Game titles in row order, None for rows that can't be found, e.g. removed games
+        """
+
+        self.titles = list(titles)
+        normalized = [None if title is None else normalize_title(title) for title in self.titles]
+
+        self._exact = {}
+        for i, key in enumerate(normalized):
+            if key is not None:
+                self._exact.setdefault(key, i) # first game wins when two titles normalize the same way
+
+        order = sorted((i for i, key in enumerate(normalized) if key is not None), key=lambda i: normalized[i])
+        self._sorted_keys = [normalized[i] for i in order]
+        self._sorted_rows = order
+
+        postings = {}
+        self._trigram_counts = np.zeros(len(normalized), dtype=np.int32)
+        for i, key in enumerate(normalized):
+            if key is None:
+                continue
+            grams = trigrams(key)
+            self._trigram_counts[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+    def prefix(self, query, limit=10):
+        """ Finds games whose normalized title starts with the query
+
+        Args:
+            query (str): Start of a title
+            limit (int): Maximum number of games to return
+
+        Returns:
+            list[int]: Row indices of matching games in alphabetical order
+        """
+
+        key = normalize_title(query)
+        if not key:
+            return []
+
+        start = bisect.bisect_left(self._sorted_keys, key)
+        end = bisect.bisect_left(self._sorted_keys, key + '\uffff', start) # first title past the prefix
+        return self._sorted_rows[start:min(end, start + limit)]
+
+    def fuzzy(self, query, limit=10, min_score=0.0):
+        """ Ranks games by how many character trigrams their title shares with the query
+
+        Args:
+            query (str): Title with possible typos
+            limit (int): Maximum number of games to return
+            min_score (float): Smallest trigram jaccard score to return
+
+        Returns:
+            list[(int, float)]: Row indices and trigram jaccard scores, best first
+        """
+
+        grams = [gram for gram in trigrams(normalize_title(query)) if gram in self._postings]
+        if not grams:
+            return []
+
+        rows, shared = np.unique(np.concatenate([self._postings[gram] for gram in grams]), return_counts=True)
+        query_count = len(trigrams(normalize_title(query)))
+        scores = shared / (query_count + self._trigram_counts[rows] - shared)
+
+        keep = scores >= min_score
+        rows, scores = rows[keep], scores[keep]
+        best = np.lexsort((rows, -scores))[:limit] # best score first, earlier rows first on ties
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def resolve(self, query, min_score=0.5):
+        """ Finds the single game a user most likely meant
+
+        Args:
+            query (str): Title typed by the user
+            min_score (float): Smallest trigram jaccard score accepted as a fuzzy match
+
+        Returns:
+            int: Row index of the game, or None if nothing is close enough
+        """
+
+        key = normalize_title(query)
+        if key in self._exact:
+            return self._exact[key]
+
+        matches = self.fuzzy(query, 1, min_score)
+        return matches[0][0] if matches else None
+
+    def suggest(self, query, limit=10):
+        """ Gets type-ahead suggestions, titles starting with the query first and then fuzzy matches
+
+        Args:
+            query (str): Partial title typed by the user
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            list[str]: Suggested titles
+        """
+
+        rows = self.prefix(query, limit)
+        if len(rows) < limit:
+            for row, score in self.fuzzy(query, limit):
+                if row not in rows:
+                    rows.append(row)
+                if len(rows) == limit:
+                    break
+
+        return [self.titles[row] for row in rows]
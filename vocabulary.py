@@ -0,0 +1,224 @@
+import argparse
+import hashlib
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+import storage
+
+ATTRIBUTE_COLUMNS = ['Genre1', 'Genre2', 'Genre3', 'Tag1', 'Tag2', 'Tag3', 'Tag4', 'Tag5', 'Tag6', 'Tag7', 'Tag8', 'Tag9', 'Tag10',
+                     'Tag11', 'Tag12', 'Tag13', 'Tag14', 'Tag15', 'Tag16', 'Tag17', 'Tag18', 'Tag19', 'Tag20']
+RATING_COLUMNS = ['PosPercentDiscrete', 'TotalReviewsDiscrete']
+
+class AttributeVocabulary:
+    """ Gives every genre, tag and 1-5 rating an integer id and stores each game as the ids of its attributes
+
+    The ids of all games are kept in one int32 array, CSR-style: game i's attributes are ids[indptr[i]:indptr[i + 1]],
+    in column order. A genre and a tag with the same name share an id, like in calculate_jaccard's sets. Ratings get
+    ids of their own (e.g. 'PosPercentDiscrete=5') so every attribute lives in the same vocabulary, but only genres
+    and tags are compared by jaccard, the same columns calculate_jaccard uses.
+    """
+
+    def __init__(self, kinds, texts, indptr, ids):
+        """
+        Args:
+            kinds (numpy.ndarray): Column each attribute comes from, 'Attribute' for genres and tags or a rating column
+            texts (numpy.ndarray): Attribute as it appears in the Preprocessed Data table, e.g. 'Co-op' or '5'
+            indptr (numpy.ndarray): Start of each game's ids, plus the end of the last game's
+            ids (numpy.ndarray): Attribute ids of every game, one game after another
+        """
+
+        self.kinds = np.asarray(kinds, dtype=object)
+        self.texts = np.array([str(text) for text in texts], dtype=object)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.ids = np.asarray(ids, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    @property
+    def num_games(self):
+        return len(self.indptr) - 1
+
+    def game_attributes(self, game):
+        """ Gets the attributes of one game
+
+        Args:
+            game (int): Row index of the game
+
+        Returns:
+            list[str]: Text of each attribute, in column order
+        """
+
+        return self.texts[self.ids[self.indptr[game]:self.indptr[game + 1]]].tolist()
+
+    def take(self, rows):
+        """ Picks games by row, e.g. to put them in the order of a neighbor index
+
+        Args:
+            rows (numpy.ndarray): Row of each game to keep, -1 gives a game without attributes
+
+        Returns:
+            AttributeVocabulary: Vocabulary with the same attribute ids and one game per entry of rows
+        """
+
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[:-1][rows]
+        lengths = np.where(rows >= 0, np.diff(self.indptr)[rows], 0)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1]) # where each kept id sits in self.ids
+        return AttributeVocabulary(self.kinds, self.texts, indptr, self.ids[positions])
+
+    def digests(self):
+        """ Fingerprints each game's attributes, so games whose attributes changed can be found without comparing them
+
+        Attribute order does not matter, how many times an attribute appears does, the same things the count and
+        attribute matrices depend on.
+
+        Returns:
+            numpy.ndarray: 53-bit digest of each game
+        """
+
+        hashes = np.array([int.from_bytes(hashlib.blake2b((kind + '=' + text).encode('utf-8'), digest_size=8).digest(), 'little')
+                           for kind, text in zip(self.kinds, self.texts)], dtype=np.uint64)
+        sums = np.concatenate([np.zeros(1, dtype=np.uint64), np.cumsum(hashes[self.ids], dtype=np.uint64)]) # wraps around, which is fine for a digest
+        return ((sums[self.indptr[1:]] - sums[self.indptr[:-1]]) >> np.uint64(11)).astype(np.int64) # 53 bits, exact as an Excel number
+
+    def attribute_matrix(self):
+        """ Builds the binary game x attribute matrix jaccard similarity is calculated from
+
+        Returns:
+            scipy.sparse.csr_matrix: Matrix with a 1 where a game has a genre or tag, rating columns are left empty
+        """
+
+        matrix = csr_matrix((np.ones(len(self.ids)), self.ids, self.indptr), shape=(self.num_games, len(self)), copy=True) # sorted in place below
+        matrix.sum_duplicates() # a genre that is also a tag only counts once, like in a set
+        matrix.data[:] = self.kinds[matrix.indices] == 'Attribute'
+        matrix.eliminate_zeros()
+        return matrix
+
+    def count_matrix(self):
+        """ Builds the normalized count matrix cosine similarity is calculated from
+
+        Each attribute is split into words once with CountVectorizer's analyzer, after the same cleaning
+        combine_columns does, instead of tokenizing every game's CombinedData string. The result is the count matrix
+        similarity.calculate_cosine builds from CombinedData with unit length rows, single character ratings are dropped
+        by the analyzer just like before.
+
+        Returns:
+            scipy.sparse.csr_matrix: Normalized game x word count matrix, words in alphabetical order
+        """
+
+        analyzer = CountVectorizer().build_analyzer()
+        words = [analyzer(text.replace("-", "").replace(" ", "")) for text in self.texts] # remove whitespace/hyphens
+        vocab = {word: i for i, word in enumerate(sorted({word for attribute in words for word in attribute}))}
+
+        # attribute x word counts, then each game's word counts are the sum over its attributes
+        lengths = [len(attribute) for attribute in words]
+        word_ids = [vocab[word] for attribute in words for word in attribute]
+        attribute_words = csr_matrix((np.ones(len(word_ids)), word_ids, np.concatenate([[0], np.cumsum(lengths)])),
+                                     shape=(len(self), len(vocab)))
+        games = csr_matrix((np.ones(len(self.ids)), self.ids, self.indptr), shape=(self.num_games, len(self)))
+
+        counts = games @ attribute_words
+        counts.sort_indices()
+        return normalize(counts)
+
+    def write(self, store=None):
+        """ Writes the vocabulary and every game's attribute ids to the artifact store
+
+        Args:
+            store (storage.BinaryStore): Store to write to, defaults to storage.open_store()
+        """
+
+        store = store or storage.open_store()
+        table_name, indptr_name, ids_name = storage.VOCABULARY
+        with store.run():
+            store.write_table(table_name, pd.DataFrame({'Kind': self.kinds, 'Text': self.texts}).rename_axis('Id'))
+            store.write_array(indptr_name, self.indptr)
+            store.write_array(ids_name, self.ids)
+
+def build_vocabulary(preprocessed_data):
+    """ Encodes the attributes of every game in a Preprocessed Data table as integer ids
+
+    Args:
+        preprocessed_data (pandas.core.frame.DataFrame): Dataframe containing attributes of each game
+
+    Returns:
+        AttributeVocabulary: Vocabulary and attribute ids of each game, ids numbered in order of first appearance
+    """
+
+    columns = [preprocessed_data[col].to_numpy(dtype=object) for col in ATTRIBUTE_COLUMNS]
+    kinds = ['Attribute'] * len(ATTRIBUTE_COLUMNS)
+    for col in RATING_COLUMNS:
+        ratings = preprocessed_data[col].to_numpy(dtype=object, copy=True)
+        present = pd.notnull(ratings) & (ratings != '') # blank ratings are not attributes
+        ratings[present] = [str(int(rating)) for rating in ratings[present]] # 5.0 when read back from Excel
+        ratings[~present] = None
+        columns.append(ratings)
+        kinds.append(col)
+
+    values = np.column_stack(columns)
+    present = pd.notnull(values)
+    cell_kinds = np.broadcast_to(np.array(kinds, dtype=object), values.shape)[present] # row by row, in column order
+    cell_values = values[present]
+
+    # genres and tags are keyed by their value, so the same name in any column gets the same id
+    is_attribute = cell_kinds == 'Attribute'
+    keys = cell_values.copy()
+    keys[~is_attribute] = cell_kinds[~is_attribute] + '=' + cell_values[~is_attribute]
+
+    ids, unique_keys = pd.factorize(keys)
+    first = np.unique(ids, return_index=True)[1] # a cell where each id appears, to look up its kind and text
+    indptr = np.concatenate([[0], np.cumsum(present.sum(axis=1))])
+    return AttributeVocabulary(cell_kinds[first], cell_values[first], indptr, ids)
+
+def read_vocabulary(store=None):
+    """ Reads the vocabulary written by preprocess.py
+
+    Args:
+        store (storage.BinaryStore): Store to read from, defaults to storage.open_store()
+
+    Raises:
+        KeyError: If the vocabulary has not been written
+
+    Returns:
+        AttributeVocabulary: Vocabulary and attribute ids of each game
+    """
+
+    store = store or storage.open_store()
+    table_name, indptr_name, ids_name = storage.VOCABULARY
+    table = store.read_table(table_name)
+    return AttributeVocabulary(table['Kind'].to_numpy(dtype=object), table['Text'].to_numpy(dtype=object),
+                               np.asarray(store.read_array(indptr_name, mmap=False)).ravel(), np.asarray(store.read_array(ids_name, mmap=False)).ravel())
+
+def load_vocabulary(store=None, preprocessed_data=None):
+    """ Reads the stored vocabulary, or builds it from the Preprocessed Data table if it was written before vocabularies existed
+
+    Args:
+        store (storage.BinaryStore): Store to read from, defaults to storage.open_store()
+        preprocessed_data (pandas.core.frame.DataFrame): Table to build from when nothing is stored, read if not given
+
+    Returns:
+        AttributeVocabulary: Vocabulary and attribute ids of each game
+    """
+
+    store = store or storage.open_store()
+    try:
+        return read_vocabulary(store)
+    except KeyError:
+        if preprocessed_data is None:
+            preprocessed_data = store.read_table('Preprocessed Data')
+        return build_vocabulary(preprocessed_data)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the attribute vocabulary from the Preprocessed Data table')
+    parser.parse_args()
+
+    store = storage.open_store()
+    vocab = build_vocabulary(store.read_table('Preprocessed Data'))
+    vocab.write(store)
+    print('{} attributes, {} games, {:.1f} bytes of ids per game'.format(len(vocab), vocab.num_games, vocab.ids.nbytes / max(vocab.num_games, 1)))